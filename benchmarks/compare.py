@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the results of two benchmarks saved by `benchmarks.run`, run by
+run, and exit with status 1 if any metric of the new results regressed by
+more than the threshold.  Example:
+
+    python -m benchmarks.compare base.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+# Metrics compared; for all of them, lower is better
+METRICS: List[str] = ['wallSeconds', 'cpuSeconds', 'httpRequests',
+                      'httpBytes', 'dbQueries', 'peakRssKiB']
+
+
+def load(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        result: dict = json.load(f)
+    return result
+
+
+def compare(base: dict, new: dict, threshold: float) -> List[str]:
+    """
+    Print a table comparing the runs of both results.
+
+    :return: Descriptions of the metrics that regressed
+    """
+    regressions: List[str] = []
+    if base['data'] != new['data'] or \
+            base['settings'] != new['settings'] or \
+            base.get('latency') != new.get('latency'):
+        print('Warning: The benchmarks used different data or settings.',
+              file=sys.stderr)
+
+    print(f'{"run":>3}  {"metric":<12} {"base":>12} {"new":>12} '
+          f'{"change":>8}')
+    for baseRun, newRun in zip(base['runs'], new['runs']):
+        for metric in METRICS:
+            baseValue: float = baseRun[metric]
+            newValue: float = newRun[metric]
+            change: float = (newValue - baseValue) / baseValue \
+                if baseValue else 0.0
+            flag: str = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append(f'Run {baseRun["run"]} {metric}: '
+                                   f'{baseValue} → {newValue}')
+            print(f'{baseRun["run"]:>3}  {metric:<12} {baseValue:>12} '
+                  f'{newValue:>12} {change:>+8.1%}{flag}')
+
+    if base['rows'] != new['rows']:
+        regressions.append(f'Rows saved differ: {base["rows"]} → '
+                           f'{new["rows"]}')
+    return regressions
+
+
+def main(args: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('base', help='Results to compare against')
+    parser.add_argument('new', help='Results of the change')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Largest relative increase of a metric that '
+                             'is not a regression.  Defaults to 0.1 (10%%).')
+    arguments: argparse.Namespace = parser.parse_args(args)
+
+    regressions: List[str] = compare(load(arguments.base),
+                                     load(arguments.new),
+                                     arguments.threshold)
+    for regression in regressions:
+        print(regression, file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if '__main__' == __name__:
+    main()
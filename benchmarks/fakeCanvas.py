@@ -0,0 +1,587 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Canvas API endpoints used by this app, serving
+synthetic data of a configurable size, or responses recorded in a Canvas
+response cache directory (see `CANVAS_CACHE_DIR`).
+
+Run it alone with `python -m benchmarks.fakeCanvas --help`.  It prints
+the URL it listens on, then serves until interrupted.  `GET /__stats`
+returns the number of requests served, and `GET /__stats?reset=1` also
+resets the counts.
+"""
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, FrozenSet, Iterator, List, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from canvasCache import CachingAdapter, endpointType
+
+LOGGER = logging.getLogger(__name__)
+
+# Canvas' page size when the request doesn't give `per_page`
+DEFAULT_PER_PAGE: int = 10
+MAX_PER_PAGE: int = 100
+
+RATE_LIMIT_REMAINING: str = '700.0'
+SUBMITTED_AT: str = '2020-01-01T00:00:00Z'
+
+# A response: status, headers and body
+Reply = Tuple[int, Dict[str, str], bytes]
+
+# Values of the `include` parameter of rubrics that Canvas accepts.  It
+# takes only one.
+RUBRIC_INCLUDES: FrozenSet[str] = frozenset({
+    'assessments', 'graded_assessments', 'peer_assessments',
+    'associations', 'assignment_associations', 'course_associations',
+    'account_associations'})
+
+
+class BadRequest(Exception):
+    """
+    Raised for a request that Canvas would reject with status 400
+    """
+
+
+class SyntheticCanvas(object):
+    """
+    Generate the Canvas data of `courses` courses, each with `assignments`
+    peer reviewed assignments and the same `students` students.  Every
+    student submits every assignment, and each submission gets `reviews`
+    peer reviews, with a comment for each of the `criteria` criteria of
+    the assignment's rubric.  Each run of `assignmentsPerRubric`
+    assignments of a course shares one rubric, which returns the
+    assessments of all of them, like Canvas does.
+
+    IDs are assigned sequentially, so they stay within the 32-bit columns
+    of the DB at any reasonable size.  Rubric association IDs follow the
+    assignment IDs, so they can't be mistaken for them.
+    """
+
+    def __init__(self, courses: int = 2, assignments: int = 5,
+                 students: int = 50, reviews: int = 2, criteria: int = 3,
+                 assignmentsPerRubric: int = 1):
+        self.courses: int = courses
+        self.assignments: int = assignments
+        self.students: int = students
+        self.reviews: int = min(reviews, students - 1)
+        self.criteria: int = criteria
+        self.assignmentsPerRubric: int = max(1, assignmentsPerRubric)
+        self.rubrics: int = -(-assignments // self.assignmentsPerRubric)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: {self.courses} course(s) × ' \
+               f'{self.assignments} assignment(s) × ' \
+               f'{self.students} student(s) × {self.reviews} review(s)'
+
+    @property
+    def courseIds(self) -> List[int]:
+        return [c + 1 for c in range(self.courses)]
+
+    def sizes(self) -> dict:
+        return {'courses': self.courses, 'assignments': self.assignments,
+                'students': self.students, 'reviews': self.reviews,
+                'criteria': self.criteria,
+                'assignmentsPerRubric': self.assignmentsPerRubric}
+
+    def userId(self, student: int) -> int:
+        return student + 1
+
+    def assignmentIndex(self, assignmentId: int) -> Tuple[int, int]:
+        """
+        :return: Indices of the course and the assignment in the course
+        """
+        return divmod(assignmentId - 1, self.assignments)
+
+    def rubricId(self, assignmentId: int) -> int:
+        courseIndex, index = self.assignmentIndex(assignmentId)
+        return courseIndex * self.rubrics + \
+            index // self.assignmentsPerRubric + 1
+
+    def rubricAssignmentIds(self, rubricId: int) -> List[int]:
+        courseIndex, index = divmod(rubricId - 1, self.rubrics)
+        first: int = courseIndex * self.assignments + \
+            index * self.assignmentsPerRubric + 1
+        return list(range(first, min(first + self.assignmentsPerRubric,
+                                     (courseIndex + 1) * self.assignments
+                                     + 1)))
+
+    def associationId(self, assignmentId: int) -> int:
+        return self.courses * self.assignments + assignmentId
+
+    def submissionId(self, assignmentId: int, student: int) -> int:
+        return (assignmentId - 1) * self.students + student + 1
+
+    def assessmentId(self, submissionId: int, review: int) -> int:
+        return (submissionId - 1) * self.reviews + review + 1
+
+    def criterionId(self, rubricId: int, criterion: int) -> str:
+        return f'_{(rubricId - 1) * self.criteria + criterion + 1}'
+
+    def course(self, courseId: int) -> dict | None:
+        if courseId not in self.courseIds:
+            return None
+        return {'id': courseId, 'name': f'Course {courseId}',
+                'course_code': f'COURSE {courseId}'}
+
+    def users(self, userIds: List[int] | None = None) -> List[dict]:
+        return [{'id': self.userId(s), 'name': f'Student {s}',
+                 'sortable_name': f'{s}, Student',
+                 'login_id': f'student{s}'}
+                for s in range(self.students)
+                if userIds is None or self.userId(s) in userIds]
+
+    def assignmentList(self, courseId: int) -> List[dict]:
+        if courseId not in self.courseIds:
+            return []
+        first: int = (courseId - 1) * self.assignments + 1
+        return [{'id': a, 'name': f'Assignment {a}', 'course_id': courseId,
+                 'peer_reviews': True,
+                 'rubric_settings': {'id': self.rubricId(a)},
+                 'updated_at': SUBMITTED_AT}
+                for a in range(first, first + self.assignments)]
+
+    def submissions(self, assignmentId: int,
+                    userIds: List[int] | None = None) -> List[dict]:
+        return [{'id': self.submissionId(assignmentId, s),
+                 'assignment_id': assignmentId, 'user_id': self.userId(s),
+                 'submission_type': 'online_text_entry',
+                 'submitted_at': SUBMITTED_AT}
+                for s in range(self.students)
+                if userIds is None or self.userId(s) in userIds]
+
+    def peerReviews(self, assignmentId: int) \
+            -> Iterator[Tuple[int, int, int]]:
+        """
+        :return: Iterator of (submitting student, reviewing student,
+            review number)
+        """
+        for s in range(self.students):
+            for r in range(self.reviews):
+                yield s, (s + r + 1) % self.students, r
+
+    def peerReviewList(self, assignmentId: int) -> List[dict]:
+        return [{'id': self.assessmentId(
+                    self.submissionId(assignmentId, s), r),
+                 'asset_id': self.submissionId(assignmentId, s),
+                 'asset_type': 'Submission',
+                 'user_id': self.userId(s),
+                 'assessor_id': self.userId(reviewer)}
+                for s, reviewer, r in self.peerReviews(assignmentId)]
+
+    def assessments(self, assignmentId: int) -> List[dict]:
+        result: List[dict] = []
+        for s, reviewer, r in self.peerReviews(assignmentId):
+            submissionId: int = self.submissionId(assignmentId, s)
+            result.append({
+                'id': self.assessmentId(submissionId, r),
+                'assessor_id': self.userId(reviewer),
+                'assessment_type': 'peer_review',
+                'artifact_type': 'Submission',
+                'artifact_id': submissionId,
+                'rubric_association_id': self.associationId(assignmentId),
+                'data': [{'criterion_id': self.criterionId(
+                              self.rubricId(assignmentId), k),
+                          'comments': f'Comment {k} of review {r} '
+                                      f'by student {reviewer}'}
+                         for k in range(self.criteria)]})
+        return result
+
+    def rubricCriteria(self, rubricId: int) -> List[dict]:
+        return [{'id': self.criterionId(rubricId, k),
+                 'description': f'Criterion {k}',
+                 'long_description': f'Criterion {k} of rubric {rubricId}'}
+                for k in range(self.criteria)]
+
+    def rubric(self, courseId: int, rubricId: int,
+               query: Dict[str, List[str]]) -> dict | None:
+        # Canvas takes `include` as a string, so `include[]`, or more than
+        # one `include`, is rejected.
+        includes: List[str] = query.get('include', [])
+        if 'include[]' in query or len(includes) > 1 or \
+                not RUBRIC_INCLUDES.issuperset(includes):
+            raise BadRequest('invalid include value')
+        include: str | None = includes[0] if includes else None
+
+        courseIndex, _ = divmod(rubricId - 1, self.rubrics)
+        if courseIndex + 1 != courseId or rubricId < 1:
+            return None
+        rubric: dict = {
+            'id': rubricId, 'title': f'Rubric {rubricId}',
+            'context_id': courseId, 'context_type': 'Course',
+            'data': self.rubricCriteria(rubricId)}
+        if include == 'assessments':
+            rubric['assessments'] = [
+                a for assignmentId in self.rubricAssignmentIds(rubricId)
+                for a in self.assessments(assignmentId)]
+        if include == 'assignment_associations':
+            rubric['associations'] = [{
+                'id': self.associationId(a), 'rubric_id': rubricId,
+                'association_id': a, 'association_type': 'Assignment'}
+                for a in self.rubricAssignmentIds(rubricId)]
+        return rubric
+
+    def get(self, path: str, query: Dict[str, List[str]]) \
+            -> List[dict] | dict | None:
+        """
+        :return: Data of the REST API endpoint, or `None` if not found
+        :raises BadRequest: If Canvas would reject the request
+        """
+        m: re.Match | None
+        if m := re.fullmatch(r'/api/v1/courses/(\d+)', path):
+            return self.course(int(m[1]))
+        if m := re.fullmatch(r'/api/v1/courses/(\d+)/assignments', path):
+            return self.assignmentList(int(m[1]))
+        if m := re.fullmatch(r'/api/v1/courses/(\d+)/(search_)?users',
+                             path):
+            userIds: List[str] | None = query.get('user_ids[]')
+            return self.users(None if userIds is None
+                              else [int(u) for u in userIds])
+        if m := re.fullmatch(
+                r'/api/v1/courses/(\d+)/assignments/(\d+)/submissions',
+                path):
+            return self.submissions(int(m[2]))
+        if m := re.fullmatch(
+                r'/api/v1/courses/(\d+)/assignments/(\d+)/peer_reviews',
+                path):
+            return self.peerReviewList(int(m[2]))
+        if m := re.fullmatch(r'/api/v1/courses/(\d+)/students/submissions',
+                             path):
+            return self.multipleSubmissions(int(m[1]), query)
+        if m := re.fullmatch(r'/api/v1/courses/(\d+)/rubrics/(\d+)', path):
+            return self.rubric(int(m[1]), int(m[2]), query)
+        return None
+
+    def multipleSubmissions(self, courseId: int,
+                            query: Dict[str, List[str]]) -> List[dict]:
+        assignmentIds: List[int] = [int(a) for a in
+                                    query.get('assignment_ids[]', [])]
+        studentIds: List[str] = query.get('student_ids[]', ['all'])
+        userIds: List[int] | None = None if 'all' in studentIds \
+            else [int(s) for s in studentIds]
+        since: str | None = query.get('submitted_since', [None])[0]
+
+        submissions: List[dict] = [
+            s for a in self.assignmentList(courseId)
+            if not assignmentIds or a['id'] in assignmentIds
+            for s in self.submissions(a['id'], userIds)]
+        if since is not None:
+            # Compare as UTC timestamps, which sort as strings.
+            since = since[:19].replace(' ', 'T')
+            submissions = [s for s in submissions
+                           if s['submitted_at'][:19] > since]
+        return submissions
+
+    def graphql(self, query: str, variables: dict) -> dict:
+        first: int = variables['first']
+        after: int = int(variables.get('after') or 0)
+
+        def connection(nodes: List[dict]) -> dict:
+            return {'pageInfo': {'hasNextPage': after + first < len(nodes),
+                                 'endCursor': str(after + first)},
+                    'nodes': nodes[after:after + first]}
+
+        if 'courseAssignments' in query:
+            courseId: int = int(variables['courseId'])
+            return {'course': {'assignmentsConnection': connection([
+                {'_id': str(a['id']), 'name': a['name'],
+                 'updatedAt': a['updated_at'],
+                 'peerReviews': {'enabled': True},
+                 'rubric': {
+                     '_id': str(a['rubric_settings']['id']),
+                     'title': f'Rubric {a["rubric_settings"]["id"]}',
+                     'criteria': [{
+                         '_id': c['id'], 'description': c['description'],
+                         'longDescription': c['long_description']}
+                         for c in self.rubricCriteria(
+                             a['rubric_settings']['id'])]}}
+                for a in self.assignmentList(courseId)])}}
+
+        if 'courseUsers' in query:
+            userIds: List[str] | None = variables.get('userIds')
+            return {'course': {'usersConnection': connection([
+                {'_id': str(u['id']), 'name': u['name'],
+                 'sortableName': u['sortable_name'],
+                 'loginId': u['login_id']}
+                for u in self.users(None if userIds is None
+                                    else [int(u) for u in userIds])])}}
+
+        if 'assignmentSubmissions' in query:
+            assignmentId: int = int(variables['assignmentId'])
+            assessments: Dict[int, List[dict]] = {}
+            for a in self.assessments(assignmentId):
+                assessments.setdefault(a['artifact_id'], []).append(a)
+            return {'assignment': {'submissionsConnection': connection([
+                {'_id': str(s['id']), 'user': {'_id': str(s['user_id'])},
+                 'rubricAssessmentsConnection': {
+                     'pageInfo': {'hasNextPage': False},
+                     'nodes': [{
+                         '_id': str(a['id']),
+                         'assessmentType': a['assessment_type'],
+                         'assessor': {'_id': str(a['assessor_id'])},
+                         'assessmentRatings': [{
+                             'comments': d['comments'],
+                             'criterion': {'_id': d['criterion_id']}}
+                             for d in a['data']]}
+                         for a in assessments.get(s['id'], [])]}}
+                for s in self.submissions(assignmentId)])}}
+
+        raise ValueError('Unknown GraphQL query')
+
+
+class RecordedCanvas(object):
+    """
+    Canvas responses recorded in a response cache directory, served by
+    URL path and parameters.  Links in the recorded headers are rewritten
+    to point to the fake server.
+    """
+
+    def __init__(self, cacheDir: str):
+        self.cacheDir: str = cacheDir
+        self.entries: Dict[str, dict] = {}
+        for path in glob.glob(os.path.join(cacheDir, '*', '*.json')):
+            with open(path, encoding='utf-8') as f:
+                entry: dict = json.load(f)
+            entry['path'] = path
+            url = urlsplit(entry['url'])
+            self.entries[self.key(url.path, parse_qs(url.query))] = entry
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: {len(self.entries)} ' \
+               f'response(s) from {self.cacheDir}'
+
+    @property
+    def courseIds(self) -> List[int]:
+        return sorted(int(m[1]) for m in (
+            re.fullmatch(r'/api/v1/courses/(\d+)', urlsplit(e['url']).path)
+            for e in self.entries.values()) if m)
+
+    def sizes(self) -> dict:
+        return {'recording': self.cacheDir, 'responses': len(self.entries)}
+
+    @staticmethod
+    def key(path: str, query: Dict[str, List[str]]) -> str:
+        return path + '?' + urlencode(sorted(
+            (k, v) for k, values in query.items() for v in values))
+
+    def reply(self, path: str, query: Dict[str, List[str]],
+              host: str) -> Reply | None:
+        entry: dict | None = self.entries.get(self.key(path, query))
+        if entry is None:
+            return None
+        headers: Dict[str, str] = {
+            k: v for k, v in entry['headers'].items()
+            if k.lower() not in ('content-encoding', 'content-length',
+                                 'transfer-encoding', 'connection')}
+        if 'Link' in headers:
+            headers['Link'] = re.sub(r'<https?://[^/]+', f'<http://{host}',
+                                     headers['Link'])
+        if 'body' in entry:
+            return entry['status'], headers, base64.b64decode(entry['body'])
+        # Streamed responses are kept in a body file (see `CachingAdapter`)
+        with open(CachingAdapter.bodyPath(entry['path']), 'rb') as f:
+            return entry['status'], headers, f.read()
+
+
+class FakeCanvasHandler(BaseHTTPRequestHandler):
+    server: 'FakeCanvasServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+        LOGGER.debug(format % args)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query: Dict[str, List[str]] = parse_qs(url.query)
+
+        if url.path == '/__stats':
+            self.__send(200, {}, json.dumps(
+                self.server.stats(reset='reset' in query)).encode('utf-8'))
+            return
+
+        self.server.count(endpointType(url.path), 0)
+        time.sleep(self.server.latency)
+        reply: Reply | None = self.server.reply(url.path, query,
+                                                self.headers['Host'])
+        if reply is None:
+            self.__send(404, {}, b'{"errors": [{"message": "Not found"}]}')
+            return
+
+        status, headers, body = reply
+        etag: str = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.__send(304, {'ETag': etag}, b'')
+            return
+
+        self.server.count(None, len(body))
+        self.__send(status, {'ETag': etag, **headers}, body)
+
+    def do_POST(self) -> None:
+        body: dict = json.loads(
+            self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.count('graphql', 0)
+        time.sleep(self.server.latency)
+        if self.path != '/api/graphql' or self.server.canvas is None or \
+                not hasattr(self.server.canvas, 'graphql'):
+            self.__send(404, {}, b'{"errors": [{"message": "Not found"}]}')
+            return
+
+        data: bytes = json.dumps({'data': self.server.canvas.graphql(
+            body['query'], body.get('variables') or {})}).encode('utf-8')
+        self.server.count(None, len(data))
+        self.__send(200, {}, data)
+
+    def __send(self, status: int, headers: Dict[str, str],
+               body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Rate-Limit-Remaining', RATE_LIMIT_REMAINING)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeCanvasServer(ThreadingHTTPServer):
+    """
+    HTTP server for `SyntheticCanvas` or `RecordedCanvas` data, which
+    counts the requests it serves by endpoint type.
+    """
+    daemon_threads = True
+
+    def __init__(self, canvas: SyntheticCanvas | RecordedCanvas,
+                 port: int = 0, latency: float = 0.0):
+        """
+        :param latency: Seconds each API response is delayed, as if Canvas
+            were across a network
+        """
+        super().__init__(('127.0.0.1', port), FakeCanvasHandler)
+        self.canvas: SyntheticCanvas | RecordedCanvas = canvas
+        self.latency: float = latency
+        self.__requests: Counter = Counter()
+        self.__bytes: int = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, endpoint: str | None, size: int) -> None:
+        with self.__lock:
+            if endpoint is not None:
+                self.__requests[endpoint] += 1
+            self.__bytes += size
+
+    def stats(self, reset: bool = False) -> dict:
+        with self.__lock:
+            stats: dict = {'requests': sum(self.__requests.values()),
+                           'requestsByEndpoint': dict(self.__requests),
+                           'bytes': self.__bytes}
+            if reset:
+                self.__requests = Counter()
+                self.__bytes = 0
+        return stats
+
+    def reply(self, path: str, query: Dict[str, List[str]],
+              host: str) -> Reply | None:
+        if isinstance(self.canvas, RecordedCanvas):
+            return self.canvas.reply(path, query, host)
+
+        data: List[dict] | dict | None
+        try:
+            data = self.canvas.get(path, query)
+        except BadRequest as e:
+            return 400, {}, json.dumps(
+                {'errors': [{'message': str(e)}]}).encode('utf-8')
+        if data is None:
+            return None
+        if not isinstance(data, list):
+            return 200, {}, json.dumps(data).encode('utf-8')
+
+        # Paginate lists like Canvas does, with a `Link` header.
+        perPage: int = min(MAX_PER_PAGE, int(
+            query.get('per_page', [DEFAULT_PER_PAGE])[0]))
+        page: int = int(query.get('page', ['1'])[0])
+        lastPage: int = max(1, -(-len(data) // perPage))
+
+        def link(p: int, rel: str) -> str:
+            pageQuery: dict = {**query, 'page': [p], 'per_page': [perPage]}
+            return f'<http://{host}{path}?' \
+                   f'{urlencode(pageQuery, doseq=True)}>; rel="{rel}"'
+
+        links: List[str] = [link(1, 'first'), link(lastPage, 'last')]
+        if page < lastPage:
+            links.append(link(page + 1, 'next'))
+        return 200, {'Link': ', '.join(links)}, json.dumps(
+            data[(page - 1) * perPage:page * perPage]).encode('utf-8')
+
+
+def parseArguments(args: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    addDataArguments(parser)
+    parser.add_argument('--port', type=int, default=0,
+                        help='Port to listen on.  By default, any free '
+                             'port is used.')
+    return parser.parse_args(args)
+
+
+def addDataArguments(parser: argparse.ArgumentParser) -> None:
+    sizes = parser.add_argument_group('synthetic data sizes')
+    sizes.add_argument('--courses', type=int, default=2)
+    sizes.add_argument('--assignments', type=int, default=5,
+                       help='Peer reviewed assignments per course')
+    sizes.add_argument('--students', type=int, default=50,
+                       help='Students in each course')
+    sizes.add_argument('--reviews', type=int, default=2,
+                       help='Peer reviews of each submission')
+    sizes.add_argument('--criteria', type=int, default=3,
+                       help='Criteria of each rubric')
+    sizes.add_argument('--assignments-per-rubric', type=int, default=1,
+                       help='Assignments that share each rubric')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        metavar='SECONDS',
+                        help='Delay of each API response of the fake '
+                             'server.  Defaults to 0.')
+    parser.add_argument('--replay', metavar='CACHE_DIR',
+                        help='Serve the responses recorded in a Canvas '
+                             'response cache directory (CANVAS_CACHE_DIR) '
+                             'instead of synthetic data.')
+
+
+def canvasFromArguments(arguments: argparse.Namespace) \
+        -> SyntheticCanvas | RecordedCanvas:
+    if arguments.replay:
+        return RecordedCanvas(arguments.replay)
+    return SyntheticCanvas(arguments.courses, arguments.assignments,
+                           arguments.students, arguments.reviews,
+                           arguments.criteria,
+                           arguments.assignments_per_rubric)
+
+
+def main(args: List[str] | None = None) -> None:
+    arguments: argparse.Namespace = parseArguments(args)
+    canvas: SyntheticCanvas | RecordedCanvas = canvasFromArguments(arguments)
+    server = FakeCanvasServer(canvas, arguments.port, arguments.latency)
+    print(server.url, flush=True)
+    print(canvas, file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark making the users, submissions and peer reviews of pages of
+Canvas JSON into `canvasapi` objects and into `canvasData.CanvasRecord`
+records, and report, for each, the time taken, the memory allocated while
+they're made, and the memory and number of blocks the items keep once the
+pages are gone.  Example:
+
+    python -m benchmarks.records --items 5000 --output records.json
+
+The JSON has all of the members Canvas returns for each item, not only
+those that are saved, as the cost of `canvasapi` objects grows with them.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+os.environ.setdefault('CANVAS_BASE_URL', 'http://localhost')
+os.environ.setdefault('CANVAS_API_TOKEN', 'benchmark')
+os.environ.setdefault('COURSE_IDS_CSV', '1')
+
+from canvasapi.peer_review import PeerReview  # noqa: E402
+from canvasapi.submission import Submission  # noqa: E402
+from canvasapi.user import User  # noqa: E402
+
+from canvasData import (  # noqa: E402
+    CanvasPeerReview,
+    canvas_requester,
+    CanvasSubmission,
+    CanvasUser
+)
+from canvasPages import PAGE_SIZE  # noqa: E402
+
+TIME: str = '2020-01-01T00:00:00Z'
+
+
+def user(i: int) -> dict:
+    return {'id': i, 'name': f'Student {i}', 'created_at': TIME,
+            'sortable_name': f'{i}, Student', 'short_name': f'Student {i}',
+            'sis_user_id': f'SIS{i}', 'integration_id': None,
+            'sis_import_id': 1, 'login_id': f'student{i}',
+            'email': f'student{i}@example.edu'}
+
+
+def submission(i: int) -> dict:
+    return {'id': i, 'body': None, 'url': None, 'grade': 'A',
+            'score': 9.5, 'submitted_at': TIME, 'assignment_id': 1,
+            'user_id': i, 'submission_type': 'online_text_entry',
+            'workflow_state': 'graded',
+            'grade_matches_current_submission': True, 'graded_at': TIME,
+            'grader_id': 1, 'attempt': 1, 'cached_due_date': TIME,
+            'excused': False, 'late_policy_status': None,
+            'points_deducted': None, 'grading_period_id': None,
+            'extra_attempts': None, 'posted_at': TIME, 'redo_request': False,
+            'late': False, 'missing': False, 'seconds_late': 0,
+            'entered_grade': 'A', 'entered_score': 9.5,
+            'preview_url': f'https://canvas.example.edu/courses/1/'
+                           f'assignments/1/submissions/{i}?preview=1',
+            'anonymous_id': f'a{i:04}'}
+
+
+def peerReview(i: int) -> dict:
+    return {'id': i, 'assessor_id': i + 1, 'asset_id': i,
+            'asset_type': 'Submission', 'user_id': i,
+            'workflow_state': 'completed'}
+
+
+# Items benchmarked: JSON of an item, and the `canvasapi` class and record
+# class it's made into
+KINDS: Dict[str, tuple] = {
+    'user': (user, User, CanvasUser),
+    'submission': (submission, Submission, CanvasSubmission),
+    'peerReview': (peerReview, PeerReview, CanvasPeerReview),
+}
+
+
+def pages(makeJson: Callable[[int], dict], items: int) -> List[bytes]:
+    return [json.dumps([makeJson(i) for i in range(
+        start, min(start + PAGE_SIZE, items))]).encode('utf-8')
+        for start in range(0, items, PAGE_SIZE)]
+
+
+def parse(pageBodies: List[bytes], cls: type) -> list:
+    """
+    Parse pages and make their items, like `canvasPages.fetchPages()`.
+    """
+    return [cls(canvas_requester, element)
+            for body in pageBodies for element in json.loads(body)]
+
+
+def measure(pageBodies: List[bytes], cls: type, repeats: int) -> dict:
+    seconds: float = float('inf')
+    for _ in range(repeats):
+        start: float = time.perf_counter()
+        parse(pageBodies, cls)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    gc.collect()
+    blocksStart: int = sys.getallocatedblocks()
+    tracemalloc.start()
+    items: list = parse(pageBodies, cls)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    retainedBlocks: int = sys.getallocatedblocks() - blocksStart
+    del items
+
+    return {'seconds': round(seconds, 4),
+            'peakKiB': peak // 1024,
+            'retainedKiB': retained // 1024,
+            'retainedBlocks': retainedBlocks}
+
+
+def parseArguments(args: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=2000,
+                        help='Number of items of each kind')
+    parser.add_argument('--repeats', type=int, default=1,
+                        help='Times each kind is timed; the best time is '
+                             'reported')
+    parser.add_argument('--output', metavar='FILE',
+                        help='File to save the results to, as JSON')
+    return parser.parse_args(args)
+
+
+def main(args: List[str] | None = None) -> None:
+    arguments: argparse.Namespace = parseArguments(args)
+
+    results: Dict[str, dict] = {}
+    print(f'{"kind":<12} {"made as":<10} {"seconds":>9} {"peak KiB":>10} '
+          f'{"kept KiB":>10} {"kept blocks":>12}')
+    for kind, (makeJson, canvasClass, recordClass) in KINDS.items():
+        pageBodies: List[bytes] = pages(makeJson, arguments.items)
+        results[kind] = {
+            'canvasapi': measure(pageBodies, canvasClass, arguments.repeats),
+            'record': measure(pageBodies, recordClass, arguments.repeats)}
+        for madeAs, r in results[kind].items():
+            print(f'{kind:<12} {madeAs:<10} {r["seconds"]:>9.4f} '
+                  f'{r["peakKiB"]:>10} {r["retainedKiB"]:>10} '
+                  f'{r["retainedBlocks"]:>12}')
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'items': arguments.items,
+                                'results': results}, indent=2) + '\n')
+
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark a sync against a fake Canvas server, and report its wall time,
+CPU time, number of HTTP requests and DB queries, and peak RSS as JSON.
+
+The fake server runs in a separate process, so that it doesn't count
+towards the time and memory measured.  Example:
+
+    python -m benchmarks.run --students 200 --runs 2 --output base.json
+
+The first run starts with an empty DB.  Later runs sync again, which
+measures incremental syncs (or full ones, with `--full`).  Settings like
+`FETCH_ENGINE` or `COURSE_CONCURRENCY` are taken from the environment, as
+usual, and recorded in the results.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import List, Tuple, Type
+
+from benchmarks.fakeCanvas import (
+    addDataArguments,
+    canvasFromArguments,
+    RecordedCanvas,
+    SyntheticCanvas
+)
+
+# Settings recorded with the results, as they affect performance
+SETTINGS: List[str] = [
+    'FETCH_ENGINE', 'DEMAND_LOADING', 'COURSE_CONCURRENCY',
+    'ASSIGNMENT_PREFETCH', 'CANVAS_MAX_CONCURRENCY', 'CANVAS_PAGE_CONCURRENCY',
+    'DB_BATCH_SIZE',
+    'CANVAS_CACHE_DIR']
+
+
+class QueryCounter(object):
+    """
+    Count the queries run on every DB connection, including those opened
+    by worker threads.
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.__lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs) -> None:
+        connection.execute_wrappers.append(self)
+
+
+def parseArguments(args: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    addDataArguments(parser)
+    parser.add_argument('--runs', type=int, default=1,
+                        help='Number of syncs run one after another')
+    parser.add_argument('--full', action='store_true',
+                        help='Make every run a full sync')
+    parser.add_argument('--db', choices=['sqlite', 'mysql'],
+                        default='sqlite',
+                        help='DB used.  A new SQLite DB is made for each '
+                             'benchmark; MySQL uses the DB_* settings.')
+    parser.add_argument('--flush', action='store_true',
+                        help='Delete all data in the MySQL DB before the '
+                             'first run.  Required with --db mysql, so it '
+                             'is never emptied by accident.')
+    parser.add_argument('--label', default='',
+                        help='Label saved with the results')
+    parser.add_argument('--output', metavar='FILE',
+                        help='File to save the results to.  By default, '
+                             'they are printed.')
+    arguments: argparse.Namespace = parser.parse_args(args)
+    if arguments.db == 'mysql' and not arguments.flush:
+        parser.error('--db mysql needs --flush, which empties the DB')
+    return arguments
+
+
+def startServer(arguments: argparse.Namespace) \
+        -> Tuple[subprocess.Popen, str]:
+    """
+    Start the fake Canvas server with the same data arguments.
+
+    :return: The server process and its URL
+    """
+    dataArguments: List[str] = [
+        f'--{name}={getattr(arguments, name)}' for name in
+        ['courses', 'assignments', 'students', 'reviews', 'criteria',
+         'latency']]
+    if arguments.replay:
+        dataArguments.append(f'--replay={arguments.replay}')
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fakeCanvas', *dataArguments],
+        stdout=subprocess.PIPE, text=True)
+    assert server.stdout is not None
+    return server, server.stdout.readline().strip()
+
+
+def serverStats(url: str, reset: bool = False) -> dict:
+    with urllib.request.urlopen(
+            f'{url}/__stats' + ('?reset=1' if reset else '')) as response:
+        stats: dict = json.load(response)
+    return stats
+
+
+def peakRssKiB() -> int:
+    # `ru_maxrss` is in bytes on macOS, and in KiB elsewhere.
+    maxRss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss // 1024 if sys.platform == 'darwin' else maxRss
+
+
+def cpuSeconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def benchmark(arguments: argparse.Namespace, url: str,
+              canvas: SyntheticCanvas | RecordedCanvas) -> dict:
+    os.environ.update({
+        'CANVAS_BASE_URL': url,
+        'CANVAS_API_TOKEN': 'benchmark',
+        'COURSE_IDS_CSV': ','.join(str(c) for c in canvas.courseIds),
+        'DB_ENGINE': arguments.db,
+    })
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'peer_review_data.settings')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    # Django and the app read the environment when they are imported.
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.db.models import Model
+
+    import config
+    from peer_review_data import main, models
+
+    call_command('migrate', verbosity=0)
+    if arguments.flush:
+        call_command('flush', interactive=False, verbosity=0)
+    connections.close_all()
+
+    queries = QueryCounter()
+    connection_created.connect(queries.install, weak=False)
+
+    runs: List[dict] = []
+    for run in range(arguments.runs):
+        serverStats(url, reset=True)
+        queriesStart: int = queries.count
+        cpuStart: float = cpuSeconds()
+        timeStart: float = time.perf_counter()
+
+        main.main(full=arguments.full)
+
+        wallSeconds: float = time.perf_counter() - timeStart
+        http: dict = serverStats(url)
+        runs.append({
+            'run': run + 1,
+            'wallSeconds': round(wallSeconds, 3),
+            'cpuSeconds': round(cpuSeconds() - cpuStart, 3),
+            'httpRequests': http['requests'],
+            'httpRequestsByEndpoint': http['requestsByEndpoint'],
+            'httpBytes': http['bytes'],
+            'dbQueries': queries.count - queriesStart,
+            'peakRssKiB': peakRssKiB(),
+        })
+        print(f'Run {run + 1}: {wallSeconds:.2f} s, '
+              f'{http["requests"]} HTTP request(s), '
+              f'{queries.count - queriesStart} DB query(ies)',
+              file=sys.stderr)
+
+    syncedModels: List[Type[Model]] = [
+        models.Course, models.User, models.Assignment, models.Rubric,
+        models.RubricAssignment, models.Criterion, models.Submission,
+        models.Assessment, models.Comment]
+    rows: dict = {m.__name__: m.objects.count() for m in syncedModels}
+
+    return {
+        'label': arguments.label,
+        'startedAt': datetime.now(tz=timezone.utc).isoformat(
+            timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'db': arguments.db,
+        'data': canvas.sizes(),
+        'latency': arguments.latency,
+        'settings': {s: getattr(config, s) for s in SETTINGS},
+        'runs': runs,
+        'rows': rows,
+    }
+
+
+def main(args: List[str] | None = None) -> None:
+    arguments: argparse.Namespace = parseArguments(args)
+    canvas: SyntheticCanvas | RecordedCanvas = canvasFromArguments(arguments)
+
+    with tempfile.TemporaryDirectory(prefix='peer-review-bench') as tempDir:
+        if arguments.db == 'sqlite':
+            os.environ['DB_NAME'] = os.path.join(tempDir, 'db.sqlite3')
+
+        server, url = startServer(arguments)
+        try:
+            results: dict = benchmark(arguments, url, canvas)
+        finally:
+            server.terminate()
+            server.wait()
+
+    output: str = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from contextvars import Context
+from datetime import datetime
+from typing import Any, Callable, Coroutine, IO, List, TypeVar
+
+from canvasapi.exceptions import CanvasException
+from canvasapi.requester import Requester
+from canvasapi.util import combine_kwargs
+
+from canvasPages import PAGE_SIZE, pageUrls
+from canvasRateLimit import (
+    isThrottled,
+    rateLimitRemaining,
+    RateLimitScheduler
+)
+from canvasStream import CHUNK_SIZE, STATUS_EXCEPTIONS
+from runMetrics import metrics
+
+try:
+    import httpx
+    HTTPX_AVAILABLE: bool = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class CanvasAsync(object):
+    """
+    Makes Canvas REST API requests as coroutines, on an event loop of its
+    own that runs in a background thread.  All requests share one pool of
+    keep-alive connections, and go through the same `RateLimitScheduler`
+    as `canvasapi` requests, so its concurrency limit holds across both.
+
+    Code in other threads runs coroutines with `submit()` or `run()`.
+    """
+
+    def __init__(self, requester: Requester, scheduler: RateLimitScheduler,
+                 pageConcurrency: int = 4):
+        """
+        :param requester: `canvasapi` requester, whose URL and token are
+            used, and which is given to the objects returned
+        :param scheduler: Scheduler that limits requests in flight
+        :param pageConcurrency: Maximum number of pages of one list
+            fetched at the same time
+        """
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError('The "async" fetch engine needs the '
+                               '"httpx" package, which is not installed.')
+
+        self.requester: Requester = requester
+        self.scheduler: RateLimitScheduler = scheduler
+        self.pageConcurrency: int = max(1, pageConcurrency)
+
+        self.loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(
+            target=self.loop.run_forever, name='canvas-async', daemon=True)
+        self.__thread.start()
+
+        self.client = httpx.AsyncClient(
+            base_url=requester.base_url,
+            headers={'Authorization': f'Bearer {requester.access_token}'},
+            limits=httpx.Limits(
+                max_connections=scheduler.maxConcurrency,
+                max_keepalive_connections=scheduler.maxConcurrency),
+            timeout=httpx.Timeout(60.0))
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> Future:
+        """
+        Start running a coroutine on the event loop, in the background.
+        Like a thread, it starts with an empty context, so the metrics
+        phases it runs aren't nested in the caller's.
+
+        :return: Future of the coroutine's result, which cancels the
+            coroutine if it's cancelled
+        """
+        return Context().run(asyncio.run_coroutine_threadsafe,
+                             coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """
+        Run a coroutine on the event loop, and wait for its result.  The
+        coroutine runs in a copy of the caller's context, so the requests
+        it makes are counted in the caller's metrics phase.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            coroutine, self.loop).result()
+
+    def close(self) -> None:
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.__thread.join()
+        self.loop.close()
+
+    async def get(self, url: str, params: List[tuple] | None = None,
+                  output: IO[bytes] | None = None) -> 'httpx.Response':
+        """
+        Make a GET request, retrying it like `RateLimitedAdapter` does when
+        it's throttled, fails with a 5xx status, or fails to connect.
+
+        :param url: URL, or path relative to the API URL
+        :param params: Query parameters, as made by `params()`
+        :param output: File that the body of the response is written to as
+            it's received, instead of being kept in the response, if the
+            request succeeds
+        :raise CanvasException: If the request fails
+        """
+        attempt: int = 0
+        while True:
+            response: httpx.Response | None = None
+            error: str = ''
+            await self.scheduler.acquireAsync()
+            try:
+                response = await self.__send(url, params, output)
+            except httpx.TransportError as e:
+                if attempt >= self.scheduler.maxRetries:
+                    metrics.count(api_calls=1, errors=1)
+                    raise
+                error = str(e) or repr(e)
+            finally:
+                # Released like `RateLimitedAdapter` does, even if the
+                # coroutine is cancelled.
+                if response is None:
+                    self.scheduler.release()
+                else:
+                    self.scheduler.release(rateLimitRemaining(response),
+                                           isThrottled(response))
+
+            if response is None:
+                await self.__wait(url, attempt, error)
+                attempt += 1
+                continue
+
+            throttled: bool = isThrottled(response)
+            metrics.count(api_calls=1, bytes=len(response.content)
+                          if output is None or response.status_code >= 400
+                          else response.num_bytes_downloaded)
+
+            retry: bool = throttled or response.status_code >= 500
+            if retry and attempt < self.scheduler.maxRetries:
+                await self.__wait(url, attempt,
+                                  f'status {response.status_code}')
+                attempt += 1
+                continue
+
+            if response.status_code >= 400:
+                metrics.count(errors=1)
+                raise STATUS_EXCEPTIONS.get(
+                    response.status_code, CanvasException)(response.text)
+            return response
+
+    async def __send(self, url: str, params: List[tuple] | None,
+                     output: IO[bytes] | None) -> 'httpx.Response':
+        if output is None:
+            return await self.client.get(url, params=params)
+
+        async with self.client.stream('GET', url, params=params) as response:
+            if response.status_code >= 400:
+                await response.aread()
+            else:
+                # Written over what a failed attempt may have left.
+                output.seek(0)
+                output.truncate()
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    output.write(chunk)
+        return response
+
+    async def __wait(self, url: str, attempt: int, reason: str) -> None:
+        delay: float = self.scheduler.backoff(attempt)
+        metrics.count(retries=1)
+        LOGGER.info(f'Retrying GET {url} in {delay:.1f} s ({reason})…')
+        await asyncio.sleep(delay)
+
+    async def getObject(self, cls: Callable[[Requester, dict], T], url: str,
+                        attributes: dict, **kwargs) -> T:
+        """
+        Fetch one object, like `canvasapi` does.
+
+        :param cls: `canvasapi` class of the object, or a
+            `canvasData.CanvasRecord` class
+        :param url: Path of the object, relative to the API URL
+        :param attributes: Attributes added to the object, like the IDs
+            of its parents that `canvasapi` adds
+        :param kwargs: Query parameters, like `canvasapi` takes them
+        """
+        response: httpx.Response = await self.get(url, params(**kwargs))
+        return cls(self.requester, {**response.json(), **attributes})
+
+    async def getList(self, cls: Callable[[Requester, dict], T], url: str,
+                      attributes: dict, **kwargs) -> List[T]:
+        """
+        Fetch all pages of a list, like `canvasPages.fetchPages()`: once
+        the first page tells how many pages there are, up to
+        `pageConcurrency` of the others are fetched at the same time.
+        Otherwise, the `next` links are followed one by one.  The arguments
+        are like those of `getObject()`.
+        """
+        semaphore = asyncio.Semaphore(self.pageConcurrency)
+
+        async def getPage(pageUrl: str) -> httpx.Response:
+            async with semaphore:
+                return await self.get(pageUrl)
+
+        response: httpx.Response = await self.get(
+            url, params(per_page=PAGE_SIZE, **kwargs))
+        responses: List[httpx.Response] = [response]
+        # The page links have all of the query parameters already.
+        while (nextLink := response.links.get('next')) is not None:
+            urls: List[str] = pageUrls(
+                nextLink['url'], response.links.get('last', {}).get('url'))
+            pages: List[httpx.Response] = await asyncio.gather(
+                *map(getPage, urls or [nextLink['url']]))
+            responses.extend(pages)
+            response = pages[-1]
+
+        return [cls(self.requester, {**o, **attributes} if attributes else o)
+                for r in responses for o in r.json()]
+
+
+def params(**kwargs) -> List[tuple]:
+    """
+    Format query parameters the way `canvasapi` does, e.g., lists as
+    `name[]` parameters and times in ISO 8601 format.
+    """
+    query: List[tuple] = []
+    for name, value in combine_kwargs(**kwargs):
+        if isinstance(value, bool):
+            value = str(value).lower()
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        query.append((name, value))
+    return query
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+LOGGER = logging.getLogger(__name__)
+
+# Endpoint types, used to choose a TTL for each cached response
+ENDPOINT_TYPES: Dict[str, re.Pattern] = {
+    'course': re.compile(r'/api/v1/courses/\d+$'),
+    'assignments': re.compile(r'/api/v1/courses/\d+/assignments$'),
+    'rubric': re.compile(r'/api/v1/courses/\d+/rubrics/\d+$'),
+    'submissions': re.compile(r'/submissions$'),
+    'users': re.compile(r'/api/v1/courses/\d+/(search_)?users$'),
+}
+ENDPOINT_TYPE_OTHER: str = 'other'
+
+# Bytes copied at a time to the body file of a streamed response
+BODY_CHUNK_SIZE: int = 64 * 1024
+
+
+def endpointType(url: str) -> str:
+    path: str = url.split('?', 1)[0].rstrip('/')
+    for name, pattern in ENDPOINT_TYPES.items():
+        if pattern.search(path):
+            return name
+    return ENDPOINT_TYPE_OTHER
+
+
+class CachingAdapter(BaseAdapter):
+    """
+    Transport adapter that keeps a persistent on-disk cache of successful
+    `GET` responses, keyed by URL (including parameters).
+
+    A cached response younger than the TTL of its endpoint type is used
+    without making a request.  Older responses that have an `ETag` are
+    revalidated with `If-None-Match`; a `304 Not Modified` reply means the
+    cached response is used again.  Endpoint types without a TTL are
+    always revalidated.
+
+    Responses of requests made with `stream=True`, like large rubrics,
+    are copied in chunks to a body file next to their entry, and returned
+    reading from it, so they're never all in memory.  Other responses are
+    kept in their entry.
+
+    Requests are sent by the wrapped adapter, so other adapters can
+    provide the actual transport.
+    """
+
+    def __init__(self, cacheDir: str, ttls: Dict[str, int],
+                 adapter: BaseAdapter | None = None):
+        """
+        :param cacheDir: Directory where cached responses are kept.
+        :param ttls: Seconds a cached response is used without
+            revalidation, by endpoint type (see `ENDPOINT_TYPES`).
+        :param adapter: Adapter that sends requests not answered from the
+            cache.  If not given, a default `HTTPAdapter` is used.
+        """
+        super().__init__()
+        self.cacheDir: str = cacheDir
+        self.ttls: Dict[str, int] = ttls
+        self.adapter: BaseAdapter = adapter or HTTPAdapter()
+
+        self.hits: int = 0
+        self.revalidations: int = 0
+        self.misses: int = 0
+        self.__statsLock = threading.Lock()
+
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: ' \
+               f'{self.hits} hit(s), ' \
+               f'{self.revalidations} revalidated hit(s), ' \
+               f'{self.misses} miss(es)'
+
+    def __count(self, stat: str) -> None:
+        with self.__statsLock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    def send(self, request: PreparedRequest, stream: bool = False,
+             *args: Any, **kwargs: Any) -> Response:
+        if request.method != 'GET':
+            return self.adapter.send(request, stream, *args, **kwargs)
+
+        path: str = self.__path(request)
+        entry: dict | None = self.__load(path)
+        ttl: int = self.ttls.get(endpointType(request.url or ''), 0)
+
+        if entry is not None:
+            if time.time() - entry['storedAt'] < ttl:
+                self.__count('hits')
+                return self.__response(request, path, entry, stream)
+
+            etag: str | None = entry['headers'].get('ETag')
+            if etag is not None:
+                request.headers['If-None-Match'] = etag
+
+        response: Response = self.adapter.send(request, stream, *args,
+                                               **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.__count('revalidations')
+            entry['storedAt'] = time.time()
+            self.__store(path, entry)
+            return self.__response(request, path, entry, stream)
+
+        self.__count('misses')
+        if response.status_code != 200 or \
+                (ttl == 0 and 'ETag' not in response.headers):
+            return response
+
+        entry = {
+            'url': request.url,
+            'storedAt': time.time(),
+            'status': response.status_code,
+            'headers': dict(response.headers),
+        }
+        if not stream:
+            entry['body'] = base64.b64encode(response.content) \
+                .decode('ascii')
+            self.__store(path, entry)
+            return response
+
+        if not self.__storeBody(path, response):
+            return response
+        self.__store(path, entry)
+        return self.__response(request, path, entry, stream)
+
+    def close(self) -> None:
+        self.adapter.close()
+
+    def __path(self, request: PreparedRequest) -> str:
+        """
+        The authorization header is part of the key, so responses aren't
+        shared between callers with different access.
+        """
+        authorization: str | bytes | None = \
+            request.headers.get('Authorization')
+        if isinstance(authorization, bytes):
+            authorization = authorization.decode('latin-1')
+        key: str = hashlib.sha256(f'{request.url}\n{authorization}'
+                                  .encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, key[:2], f'{key}.json')
+
+    @staticmethod
+    def bodyPath(path: str) -> str:
+        """
+        :return: Path of the body file of the entry in `path`, for
+            responses without a body in their entry
+        """
+        return os.path.splitext(path)[0] + '.body'
+
+    def __load(self, path: str) -> dict | None:
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry: dict = json.load(f)
+            if 'body' not in entry and \
+                    not os.path.exists(self.bodyPath(path)):
+                return None
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f'Ignoring unreadable cache entry ({path}): {e}')
+            return None
+
+    def __store(self, path: str, entry: dict) -> None:
+        """
+        Write the entry to a temporary file, then rename it, so other
+        threads and processes never read a partially written entry.
+        """
+        directory: str = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tempPath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tempPath, path)
+        except OSError as e:
+            LOGGER.warning(f'Error saving cache entry ({path}): {e}')
+
+    def __storeBody(self, path: str, response: Response) -> bool:
+        """
+        Copy the body of a streamed response to the entry's body file, one
+        chunk at a time, through a temporary file renamed once it's
+        complete, like `__store()`.
+
+        :return: Whether the body was stored.  If not, the response wasn't
+            read.
+        """
+        directory: str = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tempPath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except OSError as e:
+            LOGGER.warning(f'Error saving cache entry ({path}): {e}')
+            return False
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(BODY_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tempPath, self.bodyPath(path))
+        except BaseException:
+            os.unlink(tempPath)
+            raise
+        finally:
+            response.close()
+        return True
+
+    def __response(self, request: PreparedRequest, path: str, entry: dict,
+                   stream: bool) -> Response:
+        """
+        :param stream: Whether the response is read from its body file as
+            it's used, if it has one, instead of being read at once
+        """
+        response = Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        if 'body' in entry:
+            response._content = base64.b64decode(entry['body'])
+            response._content_consumed = True
+        elif stream:
+            response.raw = open(self.bodyPath(path), 'rb')
+        else:
+            with open(self.bodyPath(path), 'rb') as f:
+                response._content = f.read()
+            response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.reason = 'OK'
+        response.url = request.url or ''
+        response.request = request
+        return response
@@ -1,19 +1,72 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import List, Sequence, Tuple
 
 from canvasapi import Canvas
 from canvasapi.assignment import Assignment
 from canvasapi.course import Course
+from canvasapi.requester import Requester
 from canvasapi.rubric import Rubric
-from canvasapi.submission import Submission
-from canvasapi.user import User
+from requests.adapters import BaseAdapter
 
 import config
+from canvasCache import CachingAdapter
+from canvasRateLimit import RateLimitedAdapter, RateLimitScheduler
+from runMetrics import metrics, MetricsAdapter
 
 canvas = Canvas(config.CANVAS_BASE_URL, config.CANVAS_API_TOKEN)
 
+'''
+`canvasapi` doesn't offer access to the `requests` session it uses, so
+the name-mangled attribute of the requester is used to mount transport
+adapters on it.
+'''
+canvas_requester: Requester = canvas._Canvas__requester
+
+# All requests share one scheduler, however many threads make them.
+canvas_scheduler = RateLimitScheduler(config.CANVAS_MAX_CONCURRENCY,
+                                      config.CANVAS_MAX_RETRIES)
+canvas_adapter: BaseAdapter = MetricsAdapter(
+    RateLimitedAdapter(canvas_scheduler), metrics, canvas_scheduler)
+
+canvas_cache: CachingAdapter | None = None
+if config.CANVAS_CACHE_DIR:
+    canvas_cache = CachingAdapter(config.CANVAS_CACHE_DIR,
+                                  config.CANVAS_CACHE_TTLS, canvas_adapter)
+    canvas_adapter = canvas_cache
+
+canvas_requester._session.mount(canvas_requester.original_url, canvas_adapter)
+
+
+class CanvasRecord(object):
+    """
+    Compact stand-in for a `canvasapi` object, holding only the attributes
+    listed in the `__slots__` of its class, which are those that are saved.
+    It keeps no requester, and doesn't look for times in its strings like
+    `canvasapi` objects do, so it's much cheaper to make, and far smaller
+    to keep, which matters for the many users and submissions of large
+    courses.  Attributes missing from the JSON it's made from are missing
+    from the record, too.
+
+    It's made like a `canvasapi` object, so its class can be given where
+    those are made from pages of JSON, e.g., to `canvasPages.fetchPages()`.
+    """
+
+    __slots__: Tuple[str, ...] = ()
+
+    def __init__(self, requester: Requester | None, attributes: dict):
+        for name in self.__slots__:
+            if name in attributes:
+                setattr(self, name, attributes[name])
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(' + ', '.join(
+            f'{name}={getattr(self, name)!r}' for name in self.__slots__
+            if hasattr(self, name)) + ')'
+
+
+class CanvasUser(CanvasRecord):
+    __slots__ = ('id', 'name', 'sortable_name', 'login_id')
 
-class CanvasUser(User):
     id: int
     name: str
     sortable_name: str
@@ -35,72 +88,64 @@ class CanvasAssignment(Assignment):
 
 
 class CanvasComment(object):
-    def __init__(self, comment: dict):
-        self.__comment = comment
+    """
+    Comment of a rubric assessment on one criterion, parsed from the JSON
+    of the assessment.  A comment without a criterion raises `TypeError`,
+    like other records that can't be saved.
+    """
 
-    @property
-    def criterionId(self) -> int:
-        return int(self.__comment['criterion_id'][1:])
+    __slots__ = ('criterionId', 'comments')
 
-    @property
-    def comments(self) -> str:
-        return self.__comment['comments']
+    def __init__(self, comment: dict):
+        criterionId: str | None = comment.get('criterion_id')
+        if criterionId is None:
+            raise TypeError('Comment has no criterion')
+        self.criterionId: int = int(criterionId[1:])
+        self.comments: str = comment.get('comments') or ''
 
 
 class CanvasAssessment(object):
-    def __init__(self, assessment: dict):
-        self.__assessment = assessment
+    """
+    Rubric assessment, parsed from the JSON Canvas returns with a rubric.
+    Rubrics keep their assessments as JSON, so they can be split by
+    assignment, or left in a spool (see `canvasStream.SpooledItems`), until
+    they're used.  Only the ID is required; keys Canvas leaves out are
+    read as missing values, so the assessment is rejected or skipped with
+    the others like it.
+    """
+
+    __slots__ = ('id', 'assessorId', 'isPeerReview', 'submissionId',
+                 'comments')
 
-    @property
-    def id(self) -> int:
-        return self.__assessment['id']
-
-    @property
-    def assessorId(self) -> int:
-        return self.__assessment['assessor_id']
-
-    @property
-    def isPeerReview(self) -> bool:
-        return self.__assessment['assessment_type'] == 'peer_review'
+    def __init__(self, assessment: dict):
+        self.id: int = assessment['id']
+        self.assessorId: int | None = assessment.get('assessor_id')
+        self.isPeerReview: bool = \
+            assessment.get('assessment_type') == 'peer_review'
+        self.submissionId: int | None = assessment.get('artifact_id') \
+            if assessment.get('artifact_type') == 'Submission' else None
+        # Parsed one at a time by `CanvasComment`, as they're saved
+        self.comments: List[dict] = assessment.get('data') or []
 
     @property
     def hasSubmission(self) -> bool:
-        return self.__assessment['artifact_type'] == 'Submission'
-
-    @property
-    def submissionId(self) -> int:
-        return self.__assessment['artifact_id'] if self.hasSubmission else None
-
-    @property
-    def comments(self) -> List[CanvasComment]:
-        return self.__assessment['data']
-
-    data: List[dict]
+        return self.submissionId is not None
 
 
 class CanvasCriteria(object):
-    def __init__(self, criteria: dict):
-        self.__criteria = criteria
-
-    @property
-    def id(self) -> int:
-        """
-        Canvas' RubricCriterion objects contain ID *strings* of the format
-        `"_nnn…"`.  It's not clear from the docs *why* they are that format.
-        Here, we assume that the ID will be unique if everything following the
-        underscore is converted to an integer.
+    """
+    Canvas' RubricCriterion objects contain ID *strings* of the format
+    `"_nnn…"`.  It's not clear from the docs *why* they are that format.
+    Here, we assume that the ID will be unique if everything following the
+    underscore is converted to an integer.
+    """
 
-        :return: RubricCriterion ID, stripped and converted to an integer.
-        """
-        return int(self.__criteria['id'][1:])
+    __slots__ = ('id', 'description', 'longDescription')
 
-    @property
-    def description(self) -> str:
-        return self.__criteria['description']
-
-    @property
-    def longDescription(self) -> str:
-        return self.__criteria['long_description']
+    def __init__(self, criteria: dict):
+        self.id: int = int(criteria['id'][1:])
+        self.description: str = criteria['description']
+        self.longDescription: str = criteria['long_description']
 
     def __str__(self) -> str:
         return f'{self.__class__.__name__} ({self.id}): ' \
@@ -126,11 +171,25 @@ class CanvasRubric(Rubric):
                                d.get('criteria', d.get('data'))]
         return self.__criteria
 
-    assessments: List[CanvasAssessment]
+    # A list, or `canvasStream.SpooledItems` for large rubrics
+    assessments: Sequence[dict]
+
 
+class CanvasSubmission(CanvasRecord):
+    __slots__ = ('id', 'assignment_id', 'user_id')
 
-class CanvasSubmission(Submission):
     id: int
     assignment_id: int
     user_id: int
-    submission_type: str
+
+
+class CanvasPeerReview(CanvasRecord):
+    """
+    Peer review of a submission, as listed for an assignment, used to find
+    the students whose submissions were reviewed.
+    """
+
+    __slots__ = ('user_id', 'asset_id')
+
+    user_id: int
+    asset_id: int
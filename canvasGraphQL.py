@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+import logging
+from itertools import chain
+from typing import Collection, Dict, Iterator, List, Set, Tuple
+
+from canvasapi import Canvas
+from canvasapi.assignment import Assignment
+from canvasapi.rubric import Rubric
+
+from canvasData import CanvasSubmission, CanvasUser
+
+LOGGER = logging.getLogger(__name__)
+
+PAGE_SIZE: int = 100
+
+ASSIGNMENTS_QUERY: str = '''
+query courseAssignments($courseId: ID!, $first: Int!, $after: String) {
+  course(id: $courseId) {
+    assignmentsConnection(first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        _id
+        name
+        updatedAt
+        peerReviews { enabled }
+        rubric {
+          _id
+          title
+          criteria { _id description longDescription }
+        }
+      }
+    }
+  }
+}
+'''
+
+SUBMISSIONS_QUERY: str = '''
+query assignmentSubmissions($assignmentId: ID!, $first: Int!,
+                            $after: String) {
+  assignment(id: $assignmentId) {
+    submissionsConnection(
+        first: $first, after: $after,
+        filter: {states: [unsubmitted, submitted, pending_review, graded,
+                          ungraded]}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        _id
+        user { _id }
+        rubricAssessmentsConnection(first: $first) {
+          pageInfo { hasNextPage }
+          nodes {
+            _id
+            assessmentType
+            assessor { _id }
+            assessmentRatings { comments criterion { _id } }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+# Only what's needed to tell whether an assignment is peer reviewed with
+# a rubric, so a course's assignments take a small response
+PEER_REVIEWS_CONNECTION: str = '''
+    assignmentsConnection(first: $first%s) {
+      pageInfo { hasNextPage endCursor }
+      nodes { _id peerReviews { enabled } rubric { _id } }
+    }'''
+
+PEER_REVIEWS_QUERY: str = '''
+query coursePeerReviews($courseId: ID!, $first: Int!, $after: String) {
+  course(id: $courseId) {%s
+  }
+}
+''' % (PEER_REVIEWS_CONNECTION % ', after: $after')
+
+USERS_QUERY: str = '''
+query courseUsers($courseId: ID!, $userIds: [ID!], $first: Int!,
+                  $after: String) {
+  course(id: $courseId) {
+    usersConnection(first: $first, after: $after,
+                    filter: {userIds: $userIds}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { _id name sortableName loginId }
+    }
+  }
+}
+'''
+
+
+class GraphQLError(Exception):
+    pass
+
+
+class CanvasGraphQL(object):
+    """
+    Fetches course data through Canvas' GraphQL API, which returns
+    assignments with their rubrics, and submissions with their rubric
+    assessments, in a few nested queries.
+
+    Results are returned as the same objects (with the same attributes) as
+    the REST API, so they can be used by the model constructors unchanged.
+    """
+
+    def __init__(self, canvas: Canvas):
+        self.canvas: Canvas = canvas
+        self.requester = canvas._Canvas__requester
+
+    def query(self, query: str, variables: dict) -> dict:
+        result: dict = self.canvas.graphql(query, variables)
+        if result.get('errors'):
+            raise GraphQLError('; '.join(
+                e.get('message', str(e)) for e in result['errors']))
+        data: dict = result['data']
+        return data
+
+    def nodes(self, query: str, variables: dict,
+              *path: str) -> Iterator[dict]:
+        """
+        Iterate over the nodes of the connection found by following `path`
+        through the query results, fetching all of its pages, or those
+        after the cursor given as the `after` variable.
+        """
+        after: str | None = variables.get('after')
+        while True:
+            connection: dict | None = self.query(
+                query, {**variables, 'first': PAGE_SIZE, 'after': after})
+            for key in path:
+                connection = connection.get(key) if connection else None
+            if connection is None:
+                return
+
+            yield from connection['nodes']
+
+            pageInfo: dict = connection['pageInfo']
+            if not pageInfo['hasNextPage']:
+                return
+            after = pageInfo['endCursor']
+
+    def getAssignments(self, courseId: int) -> Iterator[Assignment]:
+        node: dict
+        for node in self.nodes(ASSIGNMENTS_QUERY, {'courseId': courseId},
+                               'course', 'assignmentsConnection'):
+            attributes: dict = {
+                'id': int(node['_id']),
+                'name': node['name'],
+                'course_id': courseId,
+                'updated_at': node['updatedAt'],
+                'peer_reviews': bool((node['peerReviews'] or {})
+                                     .get('enabled')),
+            }
+            if node['rubric'] is not None:
+                attributes['rubric_settings'] = {
+                    'id': int(node['rubric']['_id'])}
+                attributes['graphql_rubric'] = node['rubric']
+            yield Assignment(self.requester, attributes)
+
+    def getPeerReviewedAssignmentIds(self, courseIds: Collection[int]) \
+            -> Dict[int, Set[int] | None]:
+        """
+        Find the peer reviewed assignments with a rubric of several
+        courses.  The first page of assignments of all of the courses is
+        fetched in one query, each course under its own alias, and the
+        other pages only for the courses that have more.
+
+        Errors of one course's alias only fail that course, which is left
+        out of the result, so it's checked again later.  Other errors fail
+        all of the courses.
+
+        :return: IDs of the assignments by course ID, or `None` for
+            courses that weren't found
+        """
+        courseIds = list(courseIds)
+        if len(courseIds) == 0:
+            return {}
+
+        query: str = 'query coursesPeerReviews($first: Int!, ' + \
+            ', '.join(f'$c{i}: ID!' for i in range(len(courseIds))) + \
+            ') {\n' + ''.join(
+                f'  c{i}: course(id: $c{i}) {{'
+                f'{PEER_REVIEWS_CONNECTION % ""}\n  }}\n'
+                for i in range(len(courseIds))) + '}\n'
+        result: dict = self.canvas.graphql(query, {
+            'first': PAGE_SIZE,
+            **{f'c{i}': courseId for i, courseId in enumerate(courseIds)}})
+
+        aliases: Dict[str, int] = {
+            f'c{i}': courseId for i, courseId in enumerate(courseIds)}
+        failedIds: Set[int] = set()
+        batchErrors: List[dict] = []
+        for error in result.get('errors') or []:
+            path: list = error.get('path') or []
+            if len(path) > 0 and path[0] in aliases:
+                LOGGER.warning(f'Error checking course '
+                               f'({aliases[path[0]]}): '
+                               f'{error.get("message", error)}')
+                failedIds.add(aliases[path[0]])
+            else:
+                batchErrors.append(error)
+        data: dict | None = result.get('data')
+        if len(batchErrors) > 0 or data is None:
+            raise GraphQLError('; '.join(
+                e.get('message', str(e)) for e in batchErrors or
+                result.get('errors') or [{'message': 'No data'}]))
+
+        assignmentIds: Dict[int, Set[int] | None] = {}
+        for alias, courseId in aliases.items():
+            if courseId in failedIds:
+                continue
+            course: dict | None = data.get(alias)
+            if course is None:
+                assignmentIds[courseId] = None
+                continue
+
+            connection: dict = course['assignmentsConnection']
+            nodes: Iterator[dict] = iter(connection['nodes'])
+            if connection['pageInfo']['hasNextPage']:
+                nodes = chain(nodes, self.nodes(
+                    PEER_REVIEWS_QUERY,
+                    {'courseId': courseId,
+                     'after': connection['pageInfo']['endCursor']},
+                    'course', 'assignmentsConnection'))
+            try:
+                assignmentIds[courseId] = {
+                    int(n['_id']) for n in nodes
+                    if (n['peerReviews'] or {}).get('enabled') and
+                    n['rubric'] is not None}
+            except GraphQLError as e:
+                LOGGER.warning(f'Error checking course ({courseId}): {e}')
+        return assignmentIds
+
+    def getRubricAndSubmissions(self, assignment: Assignment) \
+            -> Tuple[Rubric, List[CanvasSubmission]]:
+        """
+        Return the rubric of the assignment, with the assessments of the
+        assignment's submissions, and the submissions themselves.
+        """
+        graphQLRubric: dict = assignment.graphql_rubric
+        submissions: List[CanvasSubmission] = []
+        assessments: List[dict] = []
+        assessmentsTruncated: bool = False
+
+        node: dict
+        for node in self.nodes(SUBMISSIONS_QUERY,
+                               {'assignmentId': assignment.id},
+                               'assignment', 'submissionsConnection'):
+            submissionId: int = int(node['_id'])
+            submissions.append(CanvasSubmission(self.requester, {
+                'id': submissionId,
+                'assignment_id': assignment.id,
+                'user_id': int(node['user']['_id']) if node['user'] else None,
+            }))
+
+            assessmentsConnection: dict = node['rubricAssessmentsConnection']
+            if assessmentsConnection['pageInfo']['hasNextPage']:
+                LOGGER.warning(f'Submission ({submissionId}) has more than '
+                               f'{PAGE_SIZE} rubric assessments; only the '
+                               f'first {PAGE_SIZE} are used.')
+                assessmentsTruncated = True
+            assessments.extend(
+                self.__assessment(a, submissionId)
+                for a in assessmentsConnection['nodes'])
+
+        rubric = Rubric(self.requester, {
+            'id': int(graphQLRubric['_id']),
+            'title': graphQLRubric['title'],
+            'course_id': assignment.course_id,
+            'data': [{'id': c['_id'],
+                      'description': c['description'],
+                      'long_description': c['longDescription']}
+                     for c in graphQLRubric['criteria']],
+            'assessments': assessments,
+            # Whether some assessments were left out, as above
+            'assessments_truncated': assessmentsTruncated,
+        })
+
+        return rubric, submissions
+
+    def getUsers(self, courseId: int,
+                 userIds: Collection[int] | None = None) \
+            -> Iterator[CanvasUser]:
+        """
+        :param courseId: ID of the course
+        :param userIds: IDs of the users to fetch, or `None` for all users
+        """
+        variables: dict = {
+            'courseId': courseId,
+            'userIds': None if userIds is None else sorted(userIds)}
+
+        node: dict
+        for node in self.nodes(USERS_QUERY, variables,
+                               'course', 'usersConnection'):
+            yield CanvasUser(self.requester, {
+                'id': int(node['_id']),
+                'name': node['name'],
+                'sortable_name': node['sortableName'],
+                'login_id': node['loginId'],
+            })
+
+    @staticmethod
+    def __assessment(node: dict, submissionId: int) -> Dict:
+        """
+        Convert a GraphQL rubric assessment to the format of the REST API,
+        used by `CanvasAssessment`.
+        """
+        return {
+            'id': int(node['_id']),
+            'assessor_id': int(node['assessor']['_id'])
+            if node['assessor'] else None,
+            'assessment_type': node['assessmentType'],
+            'artifact_type': 'Submission',
+            'artifact_id': submissionId,
+            'data': [{'criterion_id': r['criterion']['_id'],
+                      'comments': r['comments']}
+                     for r in node['assessmentRatings']
+                     if r['criterion'] is not None],
+        }
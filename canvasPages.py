@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Iterator, List, TypeVar
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from canvasapi.paginated_list import PaginatedList
+from requests import Response
+
+from peer_review_data.pipeline import pipelined
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Largest page size Canvas allows for most lists
+PAGE_SIZE: int = 100
+
+
+def pageNumber(url: str) -> int | None:
+    """
+    :return: Value of the `page` parameter of a page URL, or `None` if it
+        isn't a number, like the opaque bookmarks of some Canvas lists
+    """
+    values: List[str] = [v for k, v in parse_qsl(urlsplit(url).query)
+                         if k == 'page']
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def pageUrls(nextUrl: str, lastUrl: str | None) -> List[str]:
+    """
+    URLs of the pages of a list from the `next` link to the `last` link,
+    made by changing the `page` parameter of the `next` link, so they can
+    be fetched at the same time.
+
+    :return: The URLs, or an empty list if the pages aren't numbered or
+        Canvas didn't give the `last` link, as it doesn't for lists that
+        are expensive to count
+    """
+    nextPage: int | None = pageNumber(nextUrl)
+    lastPage: int | None = None if lastUrl is None else pageNumber(lastUrl)
+    if nextPage is None or lastPage is None:
+        return []
+
+    parts = urlsplit(nextUrl)
+    query: List[tuple] = parse_qsl(parts.query, keep_blank_values=True)
+    return [urlunsplit(parts._replace(query=urlencode(
+        [(k, str(page) if k == 'page' else v) for k, v in query])))
+        for page in range(nextPage, lastPage + 1)]
+
+
+def fetchPages(paginatedList: PaginatedList, concurrency: int,
+               contentClass: Callable[..., T] | None = None) -> Iterator[T]:
+    """
+    Iterate over a `canvasapi` list, like iterating over the list itself,
+    but with pages of `PAGE_SIZE` items, and once the first page tells how
+    many pages there are, fetching up to `concurrency` of the following
+    pages at the same time.  Items are yielded in order.  If the pages
+    aren't numbered, they are fetched one by one, following the `next`
+    links.
+
+    Pages are fetched in threads, in a copy of the caller's context, so
+    their requests are counted in the caller's metrics phase.
+
+    Items are made like the list makes them, with its own class, or with
+    `contentClass`, if given, like a `canvasData.CanvasRecord` class.
+
+    `PaginatedList` has no public way to get its request or make its
+    objects, so its attributes are used.
+    """
+    requester = paginatedList._requester
+    method: str = paginatedList._request_method
+    makeItem: Callable[..., T] = contentClass or paginatedList._content_class
+    extraAttributes: dict = paginatedList._extra_attribs or {}
+
+    def objects(response: Response) -> List[T]:
+        data: list = response.json()
+        if paginatedList._root:
+            data = data[paginatedList._root]
+        # Elements are only copied to add attributes to them.
+        return [makeItem(requester, {**element, **extraAttributes}
+                         if extraAttributes else element)
+                for element in data if element is not None]
+
+    def fetch(url: str) -> Response:
+        pageResponse: Response = requester.request(method, _url=url)
+        return pageResponse
+
+    response: Response = requester.request(
+        method, paginatedList._first_url,
+        **{**paginatedList._first_params, 'per_page': PAGE_SIZE})
+    yield from objects(response)
+
+    while (nextLink := response.links.get('next')) is not None:
+        urls: List[str] = pageUrls(
+            nextLink['url'], response.links.get('last', {}).get('url'))
+        if len(urls) <= 1:
+            response = fetch(nextLink['url'])
+            yield from objects(response)
+            continue
+
+        LOGGER.debug(f'Fetching {len(urls)} more page(s) of '
+                     f'{paginatedList._first_url}…')
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency),
+                                      thread_name_prefix='pages')
+        try:
+            for response in pipelined(
+                    urls, lambda u: executor.submit(copy_context().run,
+                                                    fetch, u),
+                    concurrency):
+                yield from objects(response)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        # If the list grew while it was fetched, the last page links to
+        # more pages, which are followed by the next loop.
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, FrozenSet, Mapping, Protocol
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+LOGGER = logging.getLogger(__name__)
+
+RATE_LIMIT_HEADER: str = 'X-Rate-Limit-Remaining'
+
+# Canvas' GraphQL endpoint, to which this app only sends queries, which read
+# data, even though they're `POST` requests
+GRAPHQL_PATH: str = '/api/graphql'
+
+
+class RateLimitScheduler(object):
+    """
+    Controls how many Canvas requests are in flight and how fast they are
+    started, based on the cost bucket balance Canvas reports in the
+    `X-Rate-Limit-Remaining` header of each response.
+
+    The concurrency limit grows slowly while the balance is healthy and is
+    halved when it falls below `lowWater` or a request is throttled
+    (additive increase, multiplicative decrease).  Below `lowWater`,
+    request starts are also spaced out, more as the balance approaches
+    zero, to let the bucket refill.
+    """
+
+    def __init__(self, maxConcurrency: int, maxRetries: int,
+                 lowWater: float = 200.0, maxInterval: float = 2.0,
+                 backoffBase: float = 1.0, backoffMax: float = 60.0):
+        """
+        :param maxConcurrency: Upper bound of requests in flight
+        :param maxRetries: Times a throttled or failed request is retried
+        :param lowWater: Balance below which requests are slowed down
+        :param maxInterval: Seconds between request starts when the
+            balance is zero
+        :param backoffBase: Seconds of the first retry backoff
+        :param backoffMax: Upper bound of seconds of any retry backoff
+        """
+        self.maxConcurrency: int = max(1, maxConcurrency)
+        self.maxRetries: int = max(0, maxRetries)
+        self.lowWater: float = lowWater
+        self.maxInterval: float = maxInterval
+        self.backoffBase: float = backoffBase
+        self.backoffMax: float = backoffMax
+        # Seconds between checks of `acquireAsync()` while at the limit
+        self.pollInterval: float = 0.01
+
+        self.retries: int = 0
+        self.throttled: int = 0
+
+        self.__limit: float = float(self.maxConcurrency)
+        self.__inFlight: int = 0
+        self.__interval: float = 0.0
+        self.__nextStart: float = 0.0
+        self.__condition = threading.Condition()
+        self.__thread = threading.local()
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: ' \
+               f'concurrency limit {self.limit}, ' \
+               f'{self.throttled} throttled response(s), ' \
+               f'{self.retries} retried request(s)'
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self.__limit))
+
+    @property
+    def threadRetries(self) -> int:
+        """
+        Number of retries made by the calling thread, so callers can tell
+        how many retries one of their requests took.
+        """
+        return getattr(self.__thread, 'retries', 0)
+
+    def acquire(self) -> None:
+        """
+        Wait until a request may be started.
+        """
+        with self.__condition:
+            while True:
+                if self.__inFlight < self.limit:
+                    delay: float = self.__nextStart - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.__condition.wait(delay)
+                else:
+                    self.__condition.wait()
+
+            self.__start()
+
+    def tryAcquire(self) -> float:
+        """
+        Start a request if it may be started now, without waiting.
+
+        :return: 0 if the request may be started, otherwise the seconds to
+            wait before trying again
+        """
+        with self.__condition:
+            if self.__inFlight >= self.limit:
+                return self.pollInterval
+            delay: float = self.__nextStart - time.monotonic()
+            if delay > 0:
+                return delay
+            self.__start()
+            return 0.0
+
+    async def acquireAsync(self) -> None:
+        """
+        Like `acquire()`, but for coroutines, which mustn't block the event
+        loop.  As an event loop can't wait on the condition used by
+        threads, it checks again after a while.
+        """
+        while (delay := self.tryAcquire()) > 0:
+            await asyncio.sleep(delay)
+
+    def __start(self) -> None:
+        self.__inFlight += 1
+        self.__nextStart = time.monotonic() + self.__interval
+
+    def release(self, remaining: float | None = None,
+                throttled: bool = False) -> None:
+        """
+        Record the end of a request and adjust the limits.
+
+        :param remaining: Value of the rate limit header, if any
+        :param throttled: Whether Canvas rejected the request for exceeding
+            the rate limit
+        """
+        with self.__condition:
+            self.__inFlight -= 1
+
+            if throttled:
+                self.throttled += 1
+                self.__limit = max(1.0, self.__limit / 2)
+                self.__interval = self.maxInterval
+            elif remaining is not None:
+                if remaining < self.lowWater:
+                    self.__limit = max(1.0, self.__limit / 2)
+                    self.__interval = self.maxInterval * \
+                        (1 - max(0.0, remaining) / self.lowWater)
+                else:
+                    self.__limit = min(float(self.maxConcurrency),
+                                       self.__limit + 1 / self.__limit)
+                    self.__interval = 0.0
+
+            self.__condition.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 0), with
+        "full jitter", so that throttled threads don't retry in step.
+        """
+        with self.__condition:
+            self.retries += 1
+        self.__thread.retries = self.threadRetries + 1
+        return random.uniform(
+            0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends every request through a
+    `RateLimitScheduler`, and retries requests that were throttled by
+    Canvas, failed with a 5xx status, or failed to connect.  Only requests
+    with methods in `retryMethods`, and `POST` requests to paths in
+    `retryPostPaths`, are retried after a 5xx status or a connection error,
+    as they may have reached Canvas, so they must only read data.
+    """
+
+    def __init__(self, scheduler: RateLimitScheduler,
+                 retryMethods: FrozenSet[str] = frozenset(
+                     {'GET', 'HEAD', 'OPTIONS'}),
+                 retryPostPaths: FrozenSet[str] = frozenset({GRAPHQL_PATH})):
+        super().__init__(pool_connections=1,
+                         pool_maxsize=scheduler.maxConcurrency)
+        self.scheduler: RateLimitScheduler = scheduler
+        self.retryMethods: FrozenSet[str] = retryMethods
+        self.retryPostPaths: FrozenSet[str] = retryPostPaths
+
+    def isRetryable(self, request: PreparedRequest) -> bool:
+        """
+        :return: Whether the request may be sent again after it failed
+            with a 5xx status or a connection error
+        """
+        if request.method in self.retryMethods:
+            return True
+        path: str = urlsplit(request.url or '').path.rstrip('/')
+        return request.method == 'POST' and \
+            any(path.endswith(p) for p in self.retryPostPaths)
+
+    def send(self, request: PreparedRequest, *args: Any,
+             **kwargs: Any) -> Response:
+        attempt: int = 0
+        while True:
+            response: Response | None = None
+            error: str = ''
+            self.scheduler.acquire()
+            try:
+                response = super().send(request, *args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if not self.isRetryable(request) or \
+                        attempt >= self.scheduler.maxRetries:
+                    raise
+                error = str(e)
+            finally:
+                # The slot is released whatever the error, but the rate
+                # limit is only known from a response.
+                if response is None:
+                    self.scheduler.release()
+                else:
+                    self.scheduler.release(rateLimitRemaining(response),
+                                           isThrottled(response))
+
+            if response is None:
+                self.__wait(request, attempt, error)
+                attempt += 1
+                continue
+
+            retry: bool = isThrottled(response) or (
+                    response.status_code >= 500 and
+                    self.isRetryable(request))
+            if not retry or attempt >= self.scheduler.maxRetries:
+                return response
+
+            response.close()
+            self.__wait(request, attempt, f'status {response.status_code}')
+            attempt += 1
+
+    def __wait(self, request: PreparedRequest, attempt: int,
+               reason: str) -> None:
+        delay: float = self.scheduler.backoff(attempt)
+        LOGGER.info(f'Retrying {request.method} {request.url} '
+                    f'in {delay:.1f} s ({reason})…')
+        time.sleep(delay)
+
+
+class ApiResponse(Protocol):
+    """
+    What the rate limit is read from, in a `requests` or an `httpx`
+    response
+    """
+
+    @property
+    def status_code(self) -> int: ...
+
+    @property
+    def headers(self) -> Mapping[str, str]: ...
+
+    @property
+    def content(self) -> bytes: ...
+
+
+def rateLimitRemaining(response: ApiResponse) -> float | None:
+    try:
+        return float(response.headers[RATE_LIMIT_HEADER])
+    except (KeyError, ValueError):
+        return None
+
+
+def isThrottled(response: ApiResponse) -> bool:
+    return response.status_code == 429 or (
+            response.status_code == 403 and
+            b'Rate Limit Exceeded' in response.content)
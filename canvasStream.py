@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+import logging
+import re
+import threading
+from array import array
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    IO,
+    Iterator,
+    List,
+    overload,
+    Sequence,
+    Set,
+    Tuple,
+    Type
+)
+
+from canvasapi.exceptions import (
+    BadRequest,
+    CanvasException,
+    Forbidden,
+    ResourceDoesNotExist,
+    Unauthorized
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# Bytes read or written at a time when streaming a response
+CHUNK_SIZE: int = 64 * 1024
+
+# Exceptions raised for error statuses, like `canvasapi` does
+STATUS_EXCEPTIONS: Dict[int, Type[CanvasException]] = {
+    400: BadRequest,
+    401: Unauthorized,
+    403: Forbidden,
+    404: ResourceDoesNotExist,
+}
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class SpooledItems(Sequence[dict]):
+    """
+    Items of a JSON array in a file, like a spooled response, decoded one
+    at a time as they're read, so only the items being used are in memory.
+    Iterating over the items again reads them again.
+
+    Integer columns of each item, like IDs it refers to, are taken from it
+    when the array is scanned, so subsets can be selected with `where()`,
+    and the values of a column found with `values()`, without reading the
+    items again.  Subsets share the file, which may be read from several
+    threads.
+    """
+
+    def __init__(self, file: IO[bytes], spans: array,
+                 columns: Dict[str, array], lock: threading.Lock):
+        """
+        :param file: File containing the array
+        :param spans: Offsets of the first byte of each item, and of the
+            byte after it, in pairs
+        :param columns: Values of each item, by column name, with 0 for
+            missing values
+        :param lock: Lock of the file, shared with the other subsets
+        """
+        self.file: IO[bytes] = file
+        self.__spans: array = spans
+        self.__columns: Dict[str, array] = columns
+        self.__lock: threading.Lock = lock
+
+    def __len__(self) -> int:
+        return len(self.__spans) // 2
+
+    @overload
+    def __getitem__(self, index: int) -> dict: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[dict]: ...
+
+    def __getitem__(self, index: int | slice) -> dict | List[dict]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not isinstance(index, int):
+            raise TypeError(f'{self.__class__.__name__} indices must be '
+                            f'integers, not {type(index).__name__}')
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'{self.__class__.__name__} index out of range')
+
+        start, end = self.__spans[2 * index], self.__spans[2 * index + 1]
+        with self.__lock:
+            self.file.seek(start)
+            data: bytes = self.file.read(end - start)
+        item: dict = json.loads(data)
+        return item
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__} ({len(self)} items)>'
+
+    def values(self, column: str) -> Set[int]:
+        """
+        :return: Values of a column, other than missing ones
+        """
+        return set(self.__columns[column]) - {0}
+
+    def where(self, column: str, values: Collection[int]) -> 'SpooledItems':
+        """
+        :return: Items whose value of a column is one of `values`, in the
+            same file
+        """
+        spans: array = array('q')
+        columns: Dict[str, array] = {c: array('q') for c in self.__columns}
+        for index, value in enumerate(self.__columns[column]):
+            if value in values:
+                spans.extend(self.__spans[2 * index:2 * index + 2])
+                for c, columnValues in self.__columns.items():
+                    columns[c].append(columnValues[index])
+        return SpooledItems(self.file, spans, columns, self.__lock)
+
+
+class _JsonScanner(object):
+    """
+    Reads the JSON values of a file one by one, a chunk at a time, keeping
+    the byte offset of the text that wasn't read yet.
+    """
+
+    def __init__(self, file: IO[bytes]):
+        self.file: IO[bytes] = file
+        self.offset: int = file.tell()
+        self.__decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__jsonDecoder = json.JSONDecoder()
+        self.__text: str = ''
+        self.__position: int = 0
+        self.__eof: bool = False
+
+    def __readMore(self) -> None:
+        data: bytes = self.file.read(CHUNK_SIZE)
+        self.__eof = len(data) == 0
+        self.__text = self.__text[self.__position:] + \
+            self.__decoder.decode(data, final=self.__eof)
+        self.__position = 0
+
+    def __advance(self, position: int) -> None:
+        self.offset += len(
+            self.__text[self.__position:position].encode('utf-8'))
+        self.__position = position
+
+    def peek(self) -> str:
+        """
+        Skip whitespace.
+
+        :return: Next character, or an empty string at the end of the file
+        """
+        while True:
+            # Always matches, if only an empty string
+            whitespace: re.Match | None = WHITESPACE.match(
+                self.__text, self.__position)
+            assert whitespace is not None
+            self.__advance(whitespace.end())
+            if self.__position < len(self.__text):
+                return self.__text[self.__position]
+            if self.__eof:
+                return ''
+            self.__readMore()
+
+    def expect(self, characters: str) -> str:
+        """
+        Read one of the given characters, like a bracket or a separator.
+
+        :raise ValueError: If the next character isn't one of them
+        """
+        character: str = self.peek()
+        if character == '' or character not in characters:
+            raise ValueError(f'Expected one of "{characters}" at byte '
+                             f'{self.offset}, found "{character}"')
+        self.__advance(self.__position + 1)
+        return character
+
+    def value(self) -> Any:
+        """
+        Read a whole value.  Values that don't fit in the text read so far
+        are decoded again once more is read, so this is meant for values
+        smaller than `CHUNK_SIZE`, or not much larger.
+
+        :raise json.JSONDecodeError: If the value isn't valid JSON
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.__jsonDecoder.raw_decode(
+                    self.__text, self.__position)
+                # A number at the end of the text may continue in the next
+                # chunk.
+                if end < len(self.__text) or self.__eof:
+                    self.__advance(end)
+                    return value
+            except json.JSONDecodeError:
+                if self.__eof:
+                    raise
+            self.__readMore()
+
+
+# Functions giving the integer columns of an item (see `SpooledItems`)
+Columns = Dict[str, Callable[[dict], int | None]]
+
+
+def scanObject(file: IO[bytes], arrayName: str,
+               columns: Columns) -> Tuple[dict, SpooledItems | None]:
+    """
+    Read a JSON object from a file without keeping one of its members, an
+    array of objects, which is only scanned, to find where its items are.
+
+    :param file: File containing the object, from its current position
+    :param arrayName: Name of the array member
+    :param columns: Functions giving the columns of each item of the
+        array, called once for each item while it's scanned
+    :return: Other members of the object, and the items of the array, or
+        `None` if the object has no such array
+    :raise ValueError: If the file doesn't contain a JSON object
+    """
+    scanner = _JsonScanner(file)
+    members: dict = {}
+    items: SpooledItems | None = None
+
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        scanner.expect('}')
+        return members, items
+
+    while True:
+        name: str = scanner.value()
+        scanner.expect(':')
+        if name == arrayName and scanner.peek() == '[':
+            items = scanArray(scanner, columns)
+        else:
+            members[name] = scanner.value()
+        if scanner.expect(',}') == '}':
+            return members, items
+
+
+def scanArray(scanner: _JsonScanner, columns: Columns) -> SpooledItems:
+    spans: array = array('q')
+    values: Dict[str, array] = {c: array('q') for c in columns}
+
+    scanner.expect('[')
+    if scanner.peek() == ']':
+        scanner.expect(']')
+    else:
+        while True:
+            scanner.peek()
+            start: int = scanner.offset
+            item: Any = scanner.value()
+            spans.extend((start, scanner.offset))
+            for column, value in columns.items():
+                values[column].append(
+                    (value(item) if isinstance(item, dict) else None) or 0)
+            if scanner.expect(',]') == ']':
+                break
+
+    return SpooledItems(scanner.file, spans, values, threading.Lock())
+
+
+def loadSpooled(file: IO[bytes], maxLoadedBytes: int, arrayName: str,
+                columns: Columns) -> Tuple[dict, Sequence[dict] | None]:
+    """
+    Read a JSON object written to a file, like a spooled response.  If the
+    file is at most `maxLoadedBytes` long, it's decoded all at once, which
+    is faster.  Otherwise, the object's array named `arrayName` is left in
+    the file, as `SpooledItems`.
+
+    :return: Members of the object other than the array, and the array's
+        items, or `None` if it has no such array
+    """
+    file.seek(0, 2)
+    size: int = file.tell()
+    file.seek(0)
+    if size <= maxLoadedBytes:
+        members: dict = json.load(file)
+        return members, members.pop(arrayName, None)
+
+    LOGGER.debug(f'Reading "{arrayName}" from a {size}-byte response '
+                 'as it is used…')
+    return scanObject(file, arrayName, columns)
@@ -8,10 +8,39 @@ LOGGER: Logger = getLogger(__name__)
 
 CANVAS_BASE_URL: str | None = os.getenv('CANVAS_BASE_URL')
 CANVAS_API_TOKEN: str | None = os.getenv('CANVAS_API_TOKEN')
-COURSE_IDS_CSV: str | None = os.getenv('COURSE_IDS_CSV')
+COURSE_IDS_CSV: str | None = os.getenv('COURSE_IDS_CSV') or None
 COURSE_IDS: list[str] | None = [
     c.strip() for c in COURSE_IDS_CSV.split(',') if c.isdigit()
 ] if COURSE_IDS_CSV else None
+CANVAS_ACCOUNT_ID: str | None = os.getenv('CANVAS_ACCOUNT_ID') or None
+CANVAS_TERM_ID: str | None = os.getenv('CANVAS_TERM_ID') or None
+COURSE_DISCOVERY_TTL: int = max(
+    0, int(os.getenv('COURSE_DISCOVERY_TTL', '86400')))
+DB_BATCH_SIZE: int = max(1, int(os.getenv('DB_BATCH_SIZE', '500')))
+COURSE_CONCURRENCY: int = max(1, int(os.getenv('COURSE_CONCURRENCY', '1')))
+ASSIGNMENT_PREFETCH: int = max(1, int(os.getenv('ASSIGNMENT_PREFETCH', '2')))
+RUBRIC_STREAM_MIN_BYTES: int = max(0, int(os.getenv(
+    'RUBRIC_STREAM_MIN_BYTES', str(8 * 1024 * 1024))))
+DEMAND_LOADING: bool = bool(int(os.getenv('DEMAND_LOADING', '0')))
+PRUNE_DELETED: bool = bool(int(os.getenv('PRUNE_DELETED', '0')))
+FETCH_ENGINES: list[str] = ['rest', 'graphql', 'async']
+FETCH_ENGINE: str = os.getenv('FETCH_ENGINE', 'rest').strip().lower()
+CANVAS_MAX_CONCURRENCY: int = max(
+    1, int(os.getenv('CANVAS_MAX_CONCURRENCY', '8')))
+CANVAS_PAGE_CONCURRENCY: int = max(
+    1, int(os.getenv('CANVAS_PAGE_CONCURRENCY', '4')))
+CANVAS_MAX_RETRIES: int = max(0, int(os.getenv('CANVAS_MAX_RETRIES', '5')))
+CANVAS_CACHE_DIR: str | None = os.getenv('CANVAS_CACHE_DIR') or None
+CANVAS_CACHE_TTLS_CSV: str = os.getenv('CANVAS_CACHE_TTLS_CSV',
+                                       'course=86400')
+CANVAS_CACHE_TTLS: dict[str, int] = {
+    k.strip(): int(v) for k, v in
+    (t.split('=', 1) for t in CANVAS_CACHE_TTLS_CSV.split(',') if '=' in t)
+}
+WORK_LEASE_SECONDS: int = max(
+    3, int(os.getenv('WORK_LEASE_SECONDS', '300')))
+RUN_REPORT_FILE: str | None = os.getenv('RUN_REPORT_FILE') or None
+METRICS_TEXTFILE: str | None = os.getenv('METRICS_TEXTFILE') or None
 
 
 def checkConfig():
@@ -23,15 +52,20 @@ def checkConfig():
     if CANVAS_API_TOKEN is None:
         envErrors.append('CANVAS_API_TOKEN')
 
-    if COURSE_IDS_CSV is None:
-        envErrors.append('COURSE_IDS_CSV')
+    if COURSE_IDS_CSV is None and CANVAS_ACCOUNT_ID is None:
+        envErrors.append('COURSE_IDS_CSV or CANVAS_ACCOUNT_ID')
 
     if len(envErrors) > 0:
         LOGGER.critical('The following environment variable(s) are not set: '
                         f'{", ".join(envErrors)}')
         sys.exit()
 
-    if COURSE_IDS is None:
+    if FETCH_ENGINE not in FETCH_ENGINES:
+        LOGGER.critical(f'FETCH_ENGINE ("{FETCH_ENGINE}") must be one of: '
+                        f'{", ".join(FETCH_ENGINES)}')
+        sys.exit()
+
+    if COURSE_IDS_CSV is not None and COURSE_IDS is None:
         LOGGER.critical('COURSE_IDS could not be set. '
                         '(Problem parsing COURSE_IDS_CSV?)')
         sys.exit()
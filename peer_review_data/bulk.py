@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import Callable, Dict, Generic, List, Set, Type, TypeVar
+
+from django.db import (
+    DatabaseError,
+    connections,
+    models,
+    router,
+    transaction
+)
+from django.db.models import Field
+
+import config
+from peer_review_data.models import FINGERPRINT_FIELD, Fingerprinted
+from runMetrics import metrics
+from utils import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+M = TypeVar('M', bound=models.Model)
+
+ErrorHandler = Callable[[models.Model, Exception], None]
+
+
+def logSaveError(obj: models.Model, e: Exception) -> None:
+    """
+    Default error handler for rows that could not be written.  It uses
+    only the primary key of the object, because the `__str__` methods of
+    the models follow foreign keys, which may be the reason the row failed.
+    """
+    LOGGER.warning(f'Error saving {obj.__class__.__name__} ({obj.pk}): {e}')
+
+
+def raiseSaveError(obj: models.Model, e: Exception) -> None:
+    """
+    Error handler for rows whose failure should stop the caller, like an
+    error of `save()` would.
+    """
+    raise e
+
+
+class BulkUpserter(Generic[M]):
+    """
+    Buffer model objects and write them to the DB with multi-row upserts
+    (`INSERT … ON DUPLICATE KEY UPDATE` on MySQL, `INSERT … ON CONFLICT`
+    elsewhere) instead of one `save()` per object.
+
+    If a batch is rejected by the DB, its rows are written again one at a
+    time, so that only the rows that really fail are reported to `onError`.
+    Each batch and each row is written in its own savepoint, so a failed
+    write is rolled back without aborting an enclosing transaction.
+    Rows referring to rows that failed in a writer this one depends on are
+    skipped.
+
+    Objects without a primary key (e.g., `AutoField` models) are inserted
+    with `bulk_create()`.
+
+    Objects of `Fingerprinted` models are written only if they're new or
+    their fingerprint differs from that of their row.  The fingerprints of
+    the rows of each batch are loaded with one query before it's written.
+    The rows inserted, updated and found unchanged are counted by table
+    (see `Metrics.countRows()`).
+
+    Use as a context manager to flush any remaining objects on exit.
+    """
+
+    def __init__(self, model: Type[M],
+                 batchSize: int = config.DB_BATCH_SIZE,
+                 onError: ErrorHandler = logSaveError,
+                 dependsOn: List['BulkUpserter'] | None = None):
+        """
+        :param model: Model class of the objects to be written.
+        :param batchSize: Maximum number of objects written per statement.
+        :param onError: Called with each object that could not be written
+            and the exception raised for it.
+        :param dependsOn: Writers of models referenced by this model's
+            foreign keys.  They are flushed before this writer, so that the
+            rows referenced already exist.
+        """
+        self.model: Type[M] = model
+        self.batchSize: int = max(1, batchSize)
+        self.onError: ErrorHandler = onError
+        self.dependsOn: List[BulkUpserter] = dependsOn or []
+        self.savedCount: int = 0
+        self.unchangedCount: int = 0
+        self.errorCount: int = 0
+        # Keys of the rows written or found unchanged
+        self.savedKeys: Set = set()
+        self.failedKeys: Set = set()
+
+        self.__keyed: Dict[int, M] = {}
+        self.__unkeyed: List[M] = []
+        self.__fields: List[Field] = [
+            f for f in model._meta.concrete_fields]
+        self.__fingerprinted: bool = issubclass(model, Fingerprinted)
+        # Keys of the rows of the objects being flushed that already exist
+        self.__existingKeys: Set = set()
+
+    def __enter__(self) -> 'BulkUpserter[M]':
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        if excType is None:
+            self.flush()
+
+    def __len__(self) -> int:
+        return len(self.__keyed) + len(self.__unkeyed)
+
+    def add(self, obj: M) -> None:
+        if obj.pk is None:
+            self.__unkeyed.append(obj)
+        else:
+            # A later object with the same key replaces the earlier one.
+            self.__keyed[obj.pk] = obj
+
+        if len(self) >= self.batchSize:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self) == 0:
+            return
+
+        for writer in self.dependsOn:
+            writer.flush()
+
+        keyed: List[M] = self.__withoutFailedReferences(
+            list(self.__keyed.values()))
+        unkeyed: List[M] = self.__withoutFailedReferences(self.__unkeyed)
+        self.__keyed = {}
+        self.__unkeyed = []
+
+        LOGGER.debug(f'Saving {len(keyed) + len(unkeyed)} '
+                     f'{self.model.__name__} rows…')
+
+        connection = connections[router.db_for_write(self.model)]
+        batchSize: int = min(self.batchSize, connection.ops.bulk_batch_size(
+            self.__fields, keyed) or self.batchSize)
+
+        if self.__fingerprinted:
+            keyed = self.__changed(connection, keyed, batchSize)
+
+        for start in range(0, len(keyed), batchSize):
+            self.__writeBatch(connection, keyed[start:start + batchSize],
+                              self.__upsert)
+
+        for start in range(0, len(unkeyed), batchSize):
+            self.__writeBatch(connection, unkeyed[start:start + batchSize],
+                              self.__insert)
+
+    def __withoutFailedReferences(self, objs: List[M]) -> List[M]:
+        for writer in self.dependsOn:
+            if not writer.failedKeys:
+                continue
+            for f in self.__fields:
+                if f.is_relation and f.related_model is writer.model:
+                    kept = [o for o in objs if getattr(o, f.attname)
+                            not in writer.failedKeys]
+                    if len(kept) < len(objs):
+                        metrics.count(rows_skipped=len(objs) - len(kept))
+                        LOGGER.debug(
+                            f'Skipping {len(objs) - len(kept)} '
+                            f'{self.model.__name__} rows referring to '
+                            f'{writer.model.__name__} rows not saved.')
+                    objs = kept
+        return objs
+
+    def __changed(self, connection, objs: List[M],
+                  batchSize: int) -> List[M]:
+        """
+        Set the fingerprints of the objects, and compare them to those of
+        their rows, loaded with one query for each batch.
+
+        :return: Objects that are new, or differ from their rows
+        """
+        savedFingerprints: Dict = {}
+        for keys in chunks([o.pk for o in objs], batchSize):
+            savedFingerprints.update(
+                self.model._default_manager.using(connection.alias)
+                .filter(pk__in=keys).values_list('pk', FINGERPRINT_FIELD))
+        self.__existingKeys = set(savedFingerprints)
+
+        changed: List[M] = []
+        for obj in objs:
+            setattr(obj, FINGERPRINT_FIELD, obj.rowFingerprint())
+            if savedFingerprints.get(obj.pk) == \
+                    getattr(obj, FINGERPRINT_FIELD):
+                self.savedKeys.add(obj.pk)
+            else:
+                changed.append(obj)
+
+        unchangedCount: int = len(objs) - len(changed)
+        if unchangedCount > 0:
+            self.unchangedCount += unchangedCount
+            metrics.count(rows_skipped=unchangedCount)
+            metrics.countRows(self.model._meta.db_table,
+                              unchanged=unchangedCount)
+            LOGGER.debug(f'Skipping {unchangedCount} unchanged '
+                         f'{self.model.__name__} rows')
+        return changed
+
+    def __writeBatch(self, connection, batch: List[M],
+                     write: Callable[..., None]) -> None:
+        try:
+            with transaction.atomic(using=connection.alias):
+                write(connection, batch)
+                if connection.features.can_defer_constraint_checks:
+                    # Deferred foreign keys would otherwise be checked only
+                    # when the enclosing transaction commits.
+                    connection.check_constraints(
+                        table_names=[self.model._meta.db_table])
+            self.savedCount += len(batch)
+            metrics.count(rows_written=len(batch))
+            self.savedKeys.update(o.pk for o in batch if o.pk is not None)
+            if self.__fingerprinted:
+                insertedCount: int = sum(o.pk not in self.__existingKeys
+                                         for o in batch)
+                metrics.countRows(self.model._meta.db_table,
+                                  inserted=insertedCount,
+                                  updated=len(batch) - insertedCount)
+            return
+        except DatabaseError as e:
+            if len(batch) == 1:
+                self.errorCount += 1
+                metrics.count(errors=1)
+                self.failedKeys.add(batch[0].pk)
+                self.onError(batch[0], e)
+                return
+            LOGGER.debug(f'Batch of {len(batch)} {self.model.__name__} '
+                         f'rows failed ({e}); saving rows individually…')
+
+        for obj in batch:
+            self.__writeBatch(connection, [obj], write)
+
+    def __insert(self, connection, batch: List[M]) -> None:
+        self.model._default_manager.using(connection.alias).bulk_create(
+            batch)
+
+    def __upsert(self, connection, batch: List[M]) -> None:
+        params: List = []
+        for obj in batch:
+            params.extend(
+                f.get_db_prep_save(getattr(obj, f.attname),
+                                   connection=connection)
+                for f in self.__fields)
+
+        with connection.cursor() as cursor:
+            cursor.execute(self.__upsertSql(connection, len(batch)), params)
+
+    def __upsertSql(self, connection, rowCount: int) -> str:
+        qn = connection.ops.quote_name
+        meta = self.model._meta
+        columns: List[str] = [qn(f.column) for f in self.__fields]
+        updateColumns: List[str] = [qn(f.column) for f in self.__fields
+                                    if not f.primary_key]
+        row: str = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+        sql: str = f'INSERT INTO {qn(meta.db_table)} ' \
+                   f'({", ".join(columns)}) ' \
+                   f'VALUES {", ".join([row] * rowCount)} '
+
+        if connection.vendor == 'mysql':
+            updates = [f'{c} = VALUES({c})' for c in updateColumns] or \
+                      [f'{qn(meta.pk.column)} = {qn(meta.pk.column)}']
+            sql += f'ON DUPLICATE KEY UPDATE {", ".join(updates)}'
+        else:
+            sql += f'ON CONFLICT ({qn(meta.pk.column)}) '
+            if updateColumns:
+                updates = [f'{c} = EXCLUDED.{c}' for c in updateColumns]
+                sql += f'DO UPDATE SET {", ".join(updates)}'
+            else:
+                sql += 'DO NOTHING'
+
+        return sql
+
+
+def saveRow(obj: models.Model) -> None:
+    """
+    Write one object like `BulkUpserter` does, so it isn't written if it's
+    unchanged, but raise the error if it fails, like `save()`.
+    """
+    with BulkUpserter(type(obj), onError=raiseSaveError) as upserter:
+        upserter.add(obj)
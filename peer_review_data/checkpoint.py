@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import datetime, timedelta
+from typing import List, Self, Set
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils.timezone import utc
+
+import config
+from peer_review_data import models
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Checkpoints(object):
+    """
+    Courses and assignments finished in a run, recorded in the DB as they
+    finish.  If the run stops partway, e.g., because Canvas or the DB went
+    away or the process was killed, the next run can resume it, skipping
+    what was finished instead of fetching it again.
+
+    Courses are finished when all of their assignments are, or when they
+    aren't found.  Failed courses aren't finished, so they're processed
+    again when the run is resumed.  Assignments are finished in the
+    transaction that saves them, so a checkpoint is never recorded without
+    the data.
+    """
+
+    def __init__(self, run: models.SyncRun):
+        self.run: models.SyncRun = run
+
+    def __str__(self) -> str:
+        return str(self.run)
+
+    @classmethod
+    def start(cls, full: bool, resume: bool = False) -> Self:
+        """
+        Start a run, or resume the last run that didn't finish.
+
+        :param full: Whether the run is a full sync, if a run is started
+        :param resume: Resume the last run that didn't finish, if any,
+            with its own sync mode
+        """
+        if resume:
+            run: models.SyncRun | None = models.SyncRun.objects \
+                .filter(finished_at__isnull=True).order_by('-id').first()
+            if run is not None:
+                checkpoints: Self = cls(run)
+                LOGGER.info(
+                    f'Resuming {run}, in which '
+                    f'{checkpoints.__count(assignment_id__isnull=True)} '
+                    'course(s) and '
+                    f'{checkpoints.__count(assignment_id__isnull=False)} '
+                    'assignment(s) were finished')
+                if run.full != full:
+                    LOGGER.warning(f'Resuming {run} as a ' +
+                                   ('full' if run.full else 'incremental') +
+                                   ' sync, like it was started')
+                return checkpoints
+            LOGGER.info('No unfinished run to resume; starting a new run')
+
+        run = models.SyncRun.objects.create(
+            full=full, started_at=datetime.now(tz=utc))
+        cls.deleteStale(run)
+        return cls(run)
+
+    @staticmethod
+    def deleteStale(run: models.SyncRun) -> int:
+        """
+        Delete the checkpoints and queued courses of the runs started
+        before a run that are finished or abandoned, as they can't be
+        resumed anymore.  A run is abandoned once it's older than
+        `config.WORK_LEASE_SECONDS`, and no node holds a lease on any of
+        its courses.  Runs that nodes are working on are kept, so their
+        queue isn't wiped.
+
+        :return: Number of rows deleted
+        """
+        now: datetime = datetime.now(tz=utc)
+        # Listed first, as MySQL can't delete from a table that a subquery
+        # of the statement selects from.
+        staleRunIds: List[int] = list(
+            models.SyncRun.objects
+            .filter(Q(finished_at__isnull=False) |
+                    Q(started_at__lt=now - timedelta(
+                        seconds=config.WORK_LEASE_SECONDS)),
+                    id__lt=run.id)
+            .filter(Exists(models.SyncCheckpoint.objects.filter(
+                        run=OuterRef('pk'))) |
+                    Exists(models.WorkItem.objects.filter(
+                        run=OuterRef('pk'))))
+            .exclude(Exists(models.WorkItem.objects.filter(
+                run=OuterRef('pk'), status=models.WorkItem.LEASED,
+                lease_expires_at__gte=now)))
+            .values_list('id', flat=True))
+        if len(staleRunIds) == 0:
+            return 0
+
+        deletedCount: int = models.SyncCheckpoint.objects.filter(
+            run_id__in=staleRunIds).delete()[0] + \
+            models.WorkItem.objects.filter(
+                run_id__in=staleRunIds).delete()[0]
+        LOGGER.debug(f'Deleted {deletedCount} checkpoint(s) and queued '
+                     f'course(s) of {len(staleRunIds)} earlier run(s)')
+        return deletedCount
+
+    def __count(self, **filters) -> int:
+        count: int = models.SyncCheckpoint.objects.filter(
+            run=self.run, **filters).count()
+        return count
+
+    def __add(self, courseId: int, assignmentId: int | None) -> None:
+        models.SyncCheckpoint.objects.create(
+            run=self.run, course_id=courseId, assignment_id=assignmentId,
+            finished_at=datetime.now(tz=utc))
+
+    def isCourseFinished(self, courseId: int) -> bool:
+        finished: bool = models.SyncCheckpoint.objects.filter(
+            run=self.run, course_id=courseId,
+            assignment_id__isnull=True).exists()
+        return finished
+
+    def finishedAssignmentIds(self, courseId: int) -> Set[int]:
+        return set(models.SyncCheckpoint.objects
+                   .filter(run=self.run, course_id=courseId,
+                           assignment_id__isnull=False)
+                   .values_list('assignment_id', flat=True))
+
+    def finishCourse(self, courseId: int) -> None:
+        self.__add(courseId, None)
+
+    def finishAssignment(self, courseId: int, assignmentId: int) -> None:
+        self.__add(courseId, assignmentId)
+
+    def finish(self) -> None:
+        """
+        Finish the run, once all of its courses are, so it isn't resumed.
+        Its checkpoints and queued courses aren't needed anymore.
+        """
+        self.run.finished_at = datetime.now(tz=utc)
+        self.run.save(update_fields=['finished_at'])
+        models.SyncCheckpoint.objects.filter(run=self.run).delete()
+        models.WorkItem.objects.filter(run=self.run).delete()
+        LOGGER.debug(f'Finished {self.run}')
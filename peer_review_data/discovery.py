@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Set
+
+from canvasapi.account import Account
+from django.utils.timezone import utc
+
+import config
+from canvasData import canvas, CanvasCourse, canvas_requester
+from canvasGraphQL import CanvasGraphQL
+from canvasPages import fetchPages
+from peer_review_data import models
+from peer_review_data.bulk import BulkUpserter
+from runMetrics import metrics
+from utils import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of courses whose assignments are checked in one GraphQL query
+CHECK_BATCH_SIZE: int = 20
+
+
+def listCourses(accountId: str,
+                termId: str | None = None) -> Iterator[CanvasCourse]:
+    """
+    List the courses of an account and its sub-accounts that have
+    enrollments, only those of one term, if given.  Several pages are
+    fetched at a time (see `canvasPages.fetchPages()`).
+    """
+    kwargs: dict = {'with_enrollments': 'true',
+                    'include': ['total_students']}
+    if termId is not None:
+        kwargs['enrollment_term_id'] = termId
+    return fetchPages(
+        Account(canvas_requester, {'id': accountId}).get_courses(**kwargs),
+        config.CANVAS_PAGE_CONCURRENCY)
+
+
+def checkCourses(courses: List[models.DiscoveredCourse],
+                 checkedAt: datetime) -> None:
+    """
+    Count the peer reviewed assignments with a rubric of each course, in
+    batches of `CHECK_BATCH_SIZE` courses per GraphQL query, with up to
+    `config.CANVAS_MAX_CONCURRENCY` queries at a time.  Courses that fail,
+    alone or with their whole batch, are left unchecked.
+    """
+    client = CanvasGraphQL(canvas)
+    byId: Dict[int, models.DiscoveredCourse] = {c.id: c for c in courses}
+    with ThreadPoolExecutor(max_workers=config.CANVAS_MAX_CONCURRENCY,
+                            thread_name_prefix='discovery') as executor:
+        futures: Dict[Future, List[int]] = {
+            executor.submit(copy_context().run,
+                            client.getPeerReviewedAssignmentIds, batch): batch
+            for batch in chunks(list(byId), CHECK_BATCH_SIZE)}
+        for future, batch in futures.items():
+            try:
+                assignmentIds: Dict[int, Set[int] | None] = future.result()
+            except Exception as e:
+                LOGGER.warning(f'Error checking courses ({batch[0]}) to '
+                               f'({batch[-1]}): {e}')
+                metrics.count(errors=1)
+                continue
+
+            # Courses that failed alone are left out, and were reported.
+            metrics.count(errors=len(batch) - len(assignmentIds))
+            for courseId, ids in assignmentIds.items():
+                byId[courseId].assignment_count = 0 if ids is None \
+                    else len(ids)
+                byId[courseId].checked_at = checkedAt
+
+
+def prioritized(courses: Iterable[models.DiscoveredCourse]) -> List[int]:
+    """
+    :return: IDs of the courses with peer reviewed assignments, those with
+        the most work first, so that the largest courses don't start last
+        and hold up the end of a run with several workers.  Courses that
+        couldn't be checked come last.
+    """
+    return [c.id for c in sorted(
+        (c for c in courses if c.assignment_count != 0),
+        key=lambda c: (c.assignment_count is None,
+                       -(c.assignment_count or 0) * (c.student_count or 1),
+                       c.id))]
+
+
+def discoverCourses(accountId: str, termId: str | None = None,
+                    ttl: int = config.COURSE_DISCOVERY_TTL) -> List[int]:
+    """
+    Find the courses of an account (and term, if given) with peer reviewed
+    assignments that use a rubric.  The courses are listed every time, but
+    only those not checked in the last `ttl` seconds are checked for such
+    assignments.  The results are saved in the DB, replacing those of the
+    last discovery.
+
+    :return: IDs of the courses found, in priority order (see
+        `prioritized()`)
+    """
+    discoveredAt: datetime = datetime.now(tz=utc)
+    LOGGER.info(f'Discovering courses of account ({accountId})' +
+                (f' in term ({termId})' if termId is not None else '') +
+                '…')
+
+    with metrics.phase('listCourses'):
+        courses: List[models.DiscoveredCourse] = [
+            models.DiscoveredCourse.fromCanvasCourse(c, discoveredAt)
+            for c in listCourses(accountId, termId)]
+
+    checkedSince: datetime = discoveredAt - timedelta(seconds=ttl)
+    known: Dict[int, models.DiscoveredCourse] = models.DiscoveredCourse \
+        .objects.filter(checked_at__gte=checkedSince).in_bulk()
+    for course in courses:
+        if course.id in known:
+            course.assignment_count = known[course.id].assignment_count
+            course.checked_at = known[course.id].checked_at
+
+    unchecked: List[models.DiscoveredCourse] = [
+        c for c in courses if c.checked_at is None]
+    LOGGER.info(f'Found {len(courses)} course(s); checking '
+                f'{len(unchecked)} for peer reviewed assignments…')
+    with metrics.phase('checkCourses'):
+        checkCourses(unchecked, discoveredAt)
+
+    with metrics.phase('saveDiscoveredCourses'):
+        with BulkUpserter(models.DiscoveredCourse) as upserter:
+            for course in courses:
+                upserter.add(course)
+        deletedCount: int = models.DiscoveredCourse.objects.filter(
+            discovered_at__lt=discoveredAt).delete()[0]
+        metrics.count(rows_deleted=deletedCount)
+
+    courseIds: List[int] = prioritized(courses)
+    LOGGER.info(f'Discovered {len(courseIds)} course(s) with peer reviewed '
+                'assignments')
+    return courseIds
+
+
+def discoveredCourseIds() -> List[int]:
+    """
+    :return: IDs of the courses found by the last discovery, in priority
+        order, without asking Canvas
+    """
+    return prioritized(models.DiscoveredCourse.objects.iterator())
+
+
+def courseIds(discover: bool = True) -> List[str]:
+    """
+    Courses to process: those in `config.COURSE_IDS`, followed by those
+    discovered in `config.CANVAS_ACCOUNT_ID`, if set.  If discovery fails,
+    the courses found by the last discovery are used.
+
+    :param discover: Discover the courses again, instead of using those
+        found by the last discovery
+    """
+    ids: List[str] = list(config.COURSE_IDS or [])
+    if config.CANVAS_ACCOUNT_ID is None:
+        return ids
+
+    discoveredIds: List[int]
+    if not discover:
+        discoveredIds = discoveredCourseIds()
+    else:
+        try:
+            discoveredIds = discoverCourses(config.CANVAS_ACCOUNT_ID,
+                                            config.CANVAS_TERM_ID)
+        except Exception as e:
+            LOGGER.exception(f'Error discovering courses: {e}; using the '
+                             'courses discovered before')
+            metrics.count(errors=1)
+            discoveredIds = discoveredCourseIds()
+
+    return list(dict.fromkeys(ids + [str(i) for i in discoveredIds]))
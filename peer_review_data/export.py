@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Type
+
+import canvasapi.exceptions as canvasApiExceptions  # noqa: N812
+from django.db.models import Field, Model, Q, QuerySet
+
+import config
+from canvasData import (
+    canvas,
+    CanvasAssessment,
+    CanvasComment,
+    CanvasCourse,
+    CanvasCriteria,
+    CanvasRubric,
+    CanvasSubmission
+)
+from peer_review_data import models
+from peer_review_data.discovery import courseIds
+from peer_review_data.fetch import AssignmentFetch, FetchEngine, getFetchEngine
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET_AVAILABLE: bool = pyarrow is not None
+
+LOGGER = logging.getLogger(__name__)
+
+FORMAT_NDJSON: str = 'ndjson'
+FORMAT_PARQUET: str = 'parquet'
+FORMATS: List[str] = [FORMAT_NDJSON, FORMAT_PARQUET]
+
+SOURCE_DB: str = 'db'
+SOURCE_CANVAS: str = 'canvas'
+SOURCES: List[str] = [SOURCE_DB, SOURCE_CANVAS]
+
+# Tables exported, with the lookup from each model to its course
+TABLES: Dict[str, Tuple[Type[Model], str]] = {
+    'course': (models.Course, 'id'),
+    'user': (models.User, ''),
+    'assignment': (models.Assignment, 'course_id'),
+    'rubric': (models.Rubric, 'assignments__course_id'),
+    'rubric_assignment': (models.RubricAssignment, 'assignment__course_id'),
+    'criterion': (models.Criterion, 'rubric__assignments__course_id'),
+    'submission': (models.Submission, 'assignment__course_id'),
+    'assessment': (models.Assessment, 'submission__assignment__course_id'),
+    'comment': (models.Comment,
+                'assessment__submission__assignment__course_id'),
+}
+
+
+def columns(model: Type[Model]) -> List[Field]:
+    if issubclass(model, models.Fingerprinted):
+        return model.dataFields()
+    return list(model._meta.concrete_fields)
+
+
+def record(obj: Model) -> dict:
+    return {f.attname: getattr(obj, f.attname) for f in columns(type(obj))}
+
+
+class TableWriter(object):
+    """
+    Writes the records of one table of one course to a file.  The file is
+    written under a temporary name and renamed when it's closed, so readers
+    never see a partially written file.
+    """
+
+    def __init__(self, model: Type[Model], path: str):
+        self.model: Type[Model] = model
+        self.path: str = path
+        self.tempPath: str = f'{path}.tmp'
+        self.count: int = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, records: List[dict]) -> None:
+        self.count += len(records)
+
+    def close(self) -> None:
+        os.replace(self.tempPath, self.path)
+
+    def abort(self) -> None:
+        """
+        Close and delete the temporary file, leaving any earlier export of
+        the same table and course in place.
+        """
+        os.unlink(self.tempPath)
+
+
+class NdjsonWriter(TableWriter):
+    def __init__(self, model: Type[Model], path: str):
+        super().__init__(model, path)
+        self.file = open(self.tempPath, 'w', encoding='utf-8')
+
+    def write(self, records: List[dict]) -> None:
+        super().write(records)
+        self.file.writelines(json.dumps(r, default=str) + '\n'
+                             for r in records)
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+    def abort(self) -> None:
+        self.file.close()
+        super().abort()
+
+
+class ParquetWriter(TableWriter):
+    """
+    Writes each batch of records as a row group, so only one batch is held
+    in memory.
+    """
+
+    def __init__(self, model: Type[Model], path: str):
+        super().__init__(model, path)
+        self.schema = pyarrow.schema(
+            [(f.attname, self.arrowType(f)) for f in columns(model)])
+        self.writer = pyarrow.parquet.ParquetWriter(self.tempPath,
+                                                    self.schema)
+
+    @staticmethod
+    def arrowType(field: Field):
+        if field.is_relation:
+            field = field.target_field
+        fieldType: str = field.get_internal_type()
+        if fieldType in ('IntegerField', 'BigIntegerField', 'AutoField',
+                         'BigAutoField', 'SmallIntegerField'):
+            return pyarrow.int64()
+        if fieldType == 'BooleanField':
+            return pyarrow.bool_()
+        if fieldType == 'DateTimeField':
+            return pyarrow.timestamp('us', tz='UTC')
+        return pyarrow.string()
+
+    def write(self, records: List[dict]) -> None:
+        super().write(records)
+        self.writer.write_table(
+            pyarrow.Table.from_pylist(records, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+        super().close()
+
+    def abort(self) -> None:
+        self.writer.close()
+        super().abort()
+
+
+WRITERS: Dict[str, Type[TableWriter]] = {
+    FORMAT_NDJSON: NdjsonWriter,
+    FORMAT_PARQUET: ParquetWriter,
+}
+
+
+class CourseExport(object):
+    """
+    Writes the records of one course to files partitioned by table and
+    course, in each of the formats requested:
+    `<outputDir>/<format>/<table>/course_id=<id>/part-0.<format>`
+
+    Records are buffered by table and written in batches of `chunkSize`,
+    so memory use doesn't grow with the size of the course.  Use as a
+    context manager, so the files are completed on exit.
+    """
+
+    def __init__(self, outputDir: str, courseId: int, formats: List[str],
+                 chunkSize: int = config.DB_BATCH_SIZE):
+        if FORMAT_PARQUET in formats and not PARQUET_AVAILABLE:
+            raise RuntimeError('Exporting to Parquet requires "pyarrow".')
+
+        self.outputDir: str = outputDir
+        self.courseId: int = courseId
+        self.formats: List[str] = formats
+        self.chunkSize: int = max(1, chunkSize)
+        self.__buffers: Dict[str, List[dict]] = {}
+        self.__writers: Dict[str, List[TableWriter]] = {}
+
+    def __enter__(self) -> 'CourseExport':
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        if excType is None:
+            self.close()
+        else:
+            for writers in self.__writers.values():
+                for writer in writers:
+                    writer.abort()
+
+    def counts(self) -> Dict[str, int]:
+        return {table: writers[0].count
+                for table, writers in self.__writers.items()}
+
+    def add(self, table: str, records: Iterable[dict]) -> None:
+        buffer: List[dict] = self.__buffers.setdefault(table, [])
+        for r in records:
+            buffer.append(r)
+            if len(buffer) >= self.chunkSize:
+                self.__flush(table)
+                buffer = self.__buffers[table]
+
+    def addObjects(self, table: str,
+                   objs: Iterable[Model]) -> None:
+        self.add(table, map(record, objs))
+
+    def __flush(self, table: str) -> None:
+        buffer: List[dict] = self.__buffers.get(table, [])
+        if len(buffer) == 0:
+            return
+        if table not in self.__writers:
+            self.__writers[table] = [
+                WRITERS[f](TABLES[table][0], self.__path(table, f))
+                for f in self.formats]
+        for writer in self.__writers[table]:
+            writer.write(buffer)
+        self.__buffers[table] = []
+
+    def close(self) -> None:
+        for table in list(self.__buffers):
+            self.__flush(table)
+        for writers in self.__writers.values():
+            for writer in writers:
+                writer.close()
+
+        # Remove files of earlier exports of tables now empty.
+        for table in TABLES.keys() - self.__writers.keys():
+            for f in self.formats:
+                path: str = self.__path(table, f)
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def __path(self, table: str, fileFormat: str) -> str:
+        return os.path.join(self.outputDir, fileFormat, table,
+                            f'course_id={self.courseId}',
+                            f'part-0.{fileFormat}')
+
+
+def chunkedQuery(queryset: QuerySet, fieldNames: List[str],
+                 chunkSize: int) -> Iterator[dict]:
+    """
+    Iterate over the rows of a query as dictionaries, reading `chunkSize`
+    rows at a time in primary key order.  Unlike `QuerySet.iterator()`,
+    this doesn't load the whole result at once with MySQL, whose driver
+    doesn't stream results.
+    """
+    pkName: str = queryset.model._meta.pk.attname
+    lastPk = None
+    while True:
+        chunk: QuerySet = queryset.order_by(pkName)
+        if lastPk is not None:
+            chunk = chunk.filter(pk__gt=lastPk)
+        rows: List[dict] = list(chunk.values(*fieldNames)[:chunkSize])
+        yield from rows
+        if len(rows) < chunkSize:
+            return
+        lastPk = rows[-1][pkName]
+
+
+def courseQuery(table: str, courseId: int) -> QuerySet:
+    model, courseLookup = TABLES[table]
+    if table == 'user':
+        # Users have no course; export those who submitted or assessed.
+        return model.objects.filter(
+            Q(id__in=models.Submission.objects.filter(
+                assignment__course_id=courseId).values('user_id')) |
+            Q(id__in=models.Assessment.objects.filter(
+                submission__assignment__course_id=courseId)
+                .values('assessor_id')))
+    query: QuerySet = model.objects.filter(**{courseLookup: courseId})
+    # A rubric used by several assignments of the course matches once for
+    # each of them.
+    return query.distinct() if 'assignments__' in courseLookup else query
+
+
+def exportCourseFromDb(courseId: int, outputDir: str,
+                       formats: List[str]) -> Dict[str, int]:
+    """
+    Export the data of a course saved in the DB.
+
+    :return: Number of records exported, by table
+    """
+    with CourseExport(outputDir, courseId, formats) as export:
+        for table, (model, _) in TABLES.items():
+            export.add(table, chunkedQuery(
+                courseQuery(table, courseId),
+                [f.attname for f in columns(model)], export.chunkSize))
+    return export.counts()
+
+
+def exportCourseFromCanvas(canvasCourse: CanvasCourse, outputDir: str,
+                           formats: List[str],
+                           fetchEngine: FetchEngine) -> Dict[str, int]:
+    """
+    Export the data of a course fetched from Canvas, without using the DB.
+    Assignments are fetched in full, one at a time, and only the
+    assessments of each assignment's own submissions are exported with it.
+    A rubric shared by several assignments is exported with the first of
+    them.
+
+    :return: Number of records exported, by table
+    """
+    rubricIds: Set[int] = set()
+    with CourseExport(outputDir, canvasCourse.id, formats) as export:
+        export.addObjects('course',
+                          [models.Course.fromCanvasCourse(canvasCourse)])
+        export.addObjects('user', map(models.User.fromCanvasUser,
+                                      fetchEngine.getUsers(canvasCourse)))
+
+        fetched: AssignmentFetch
+        for fetched in fetchEngine.fetchAssignments(canvasCourse, {}):
+            if fetched.canvas_rubric is None:
+                continue
+            exportAssignment(export, fetched, rubricIds)
+    return export.counts()
+
+
+def exportAssignment(export: CourseExport, fetched: AssignmentFetch,
+                     rubricIds: Set[int]) -> None:
+    """
+    :param fetched: Data of an assignment that should be saved, so its
+        rubric and submissions were fetched
+    """
+    canvasRubric: CanvasRubric | None = fetched.canvas_rubric
+    canvasSubmissions: List[CanvasSubmission] | None = \
+        fetched.canvas_submissions
+    assert canvasRubric is not None and canvasSubmissions is not None
+
+    export.addObjects('assignment', [
+        models.Assignment.fromCanvasAssignment(fetched.canvas_assignment)])
+
+    rubric: models.Rubric = models.Rubric.fromCanvasRubric(canvasRubric)
+    export.addObjects('rubric_assignment', [
+        models.RubricAssignment.fromCanvasRubricAndAssignment(
+            canvasRubric, fetched.canvas_assignment)])
+    if rubric.id not in rubricIds:
+        rubricIds.add(rubric.id)
+        export.addObjects('rubric', [rubric])
+        export.addObjects('criterion', (
+            models.Criterion.fromCanvasCriterionAndRubric(
+                CanvasCriteria(c), rubric)
+            for c in canvasRubric.data))
+
+    submissions: List[models.Submission] = [
+        models.Submission.fromCanvasSubmission(s)
+        for s in canvasSubmissions]
+    export.addObjects('submission', submissions)
+    submissionIds: Set[int] = {s.id for s in submissions}
+
+    for canvasAssessment in map(CanvasAssessment,
+                                canvasRubric.assessments):
+        if not canvasAssessment.isPeerReview or \
+                canvasAssessment.submissionId not in submissionIds:
+            continue
+        assessment: models.Assessment | None = \
+            models.Assessment.fromCanvasAssessment(canvasAssessment)
+        if assessment is None:
+            continue
+        export.addObjects('assessment', [assessment])
+        export.addObjects('comment', (
+            models.Comment.fromCanvasCommentAndAssessment(
+                CanvasComment(c), assessment)
+            for c in canvasAssessment.comments))
+
+
+def exportCourses(outputDir: str, formats: List[str],
+                  source: str = SOURCE_DB) -> None:
+    """
+    Export the courses in `config.COURSE_IDS`, and those found by the last
+    discovery of `config.CANVAS_ACCOUNT_ID`, one at a time, from the DB or
+    directly from Canvas.
+    """
+    fetchEngine: FetchEngine | None = None
+    if source == SOURCE_CANVAS:
+        fetchEngine = getFetchEngine()
+
+    try:
+        for courseId in courseIds(discover=False):
+            LOGGER.info(f'Exporting course ({courseId}) from {source} to '
+                        f'{", ".join(formats)} in {outputDir}…')
+            try:
+                if fetchEngine is None:
+                    counts: Dict[str, int] = exportCourseFromDb(
+                        int(courseId), outputDir, formats)
+                else:
+                    counts = exportCourseFromCanvas(
+                        canvas.get_course(courseId), outputDir, formats,
+                        fetchEngine)
+            except canvasApiExceptions.ResourceDoesNotExist:
+                LOGGER.warning(f'Course ID ({courseId}) not found.')
+                continue
+
+            if len(counts) == 0:
+                LOGGER.warning(f'No data found for course ({courseId}).')
+                continue
+            LOGGER.info(f'Exported course ({courseId}): ' + ', '.join(
+                f'{count} {table}' for table, count in counts.items()))
+    finally:
+        if fetchEngine is not None:
+            fetchEngine.close()
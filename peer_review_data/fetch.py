@@ -0,0 +1,891 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import copy
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import chain
+from tempfile import SpooledTemporaryFile
+from typing import (
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Set
+)
+
+from canvasapi.assignment import Assignment
+from canvasapi.exceptions import CanvasException
+from canvasapi.paginated_list import PaginatedList
+from canvasapi.requester import Requester
+from canvasapi.rubric import Rubric
+from django.utils.timezone import utc
+from requests import Response
+
+import config
+from canvasAsync import CanvasAsync, params
+from canvasData import (
+    canvas,
+    CanvasAssessment,
+    CanvasAssignment,
+    CanvasCourse,
+    CanvasPeerReview,
+    canvas_requester,
+    CanvasRubric,
+    canvas_scheduler,
+    CanvasSubmission,
+    CanvasUser
+)
+from canvasGraphQL import CanvasGraphQL
+from canvasPages import fetchPages
+from canvasStream import (
+    CHUNK_SIZE,
+    Columns,
+    loadSpooled,
+    SpooledItems,
+    STATUS_EXCEPTIONS
+)
+from peer_review_data.pipeline import pipelined, prefetch
+from runMetrics import metrics
+from utils import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of IDs given to filters of Canvas API calls in one request
+ID_BATCH_SIZE: int = 100
+
+# What rubrics are fetched with: their assessments, and the associations
+# with assignments that the assessments refer to.  Canvas takes one
+# `include` value, as a string, so they're fetched with separate requests.
+RUBRIC_INCLUDE: str = 'assessments'
+RUBRIC_ASSOCIATIONS_INCLUDE: str = 'assignment_associations'
+
+
+@dataclass
+class AssignmentFetch:
+    """
+    Canvas data fetched for one assignment, ready to be saved.  If the
+    assignment should not be saved, `canvas_rubric` and `canvas_submissions`
+    are `None`.
+
+    When `since` is set, only submissions made after that time were
+    fetched.  `fetched_at` becomes the assignment's new sync high-water mark
+    once it's saved.
+
+    `all_submissions` and `all_assessments` tell whether all of the
+    assignment's submissions or assessments in Canvas were fetched, so
+    that those in the DB that weren't were deleted in Canvas (see
+    `prune`).  Engines set them only when they know it.
+    """
+    canvas_assignment: CanvasAssignment
+    since: datetime | None = None
+    fetched_at: datetime = field(
+        default_factory=lambda: datetime.now(tz=utc))
+    canvas_rubric: CanvasRubric | None = None
+    canvas_submissions: List[CanvasSubmission] | None = None
+    all_submissions: bool = False
+    all_assessments: bool = False
+
+
+def reviewedSubmissionId(assessment: dict) -> int | None:
+    canvasAssessment = CanvasAssessment(assessment)
+    return canvasAssessment.submissionId \
+        if canvasAssessment.isPeerReview else None
+
+
+def reviewerId(assessment: dict) -> int | None:
+    canvasAssessment = CanvasAssessment(assessment)
+    return canvasAssessment.assessorId \
+        if canvasAssessment.isPeerReview else None
+
+
+# Columns of spooled assessments (see `canvasStream.SpooledItems`), taken
+# while the response is scanned, so the assessments are read only once
+# more, when they're saved
+ASSESSMENT_COLUMNS: Columns = {
+    'associationId': lambda a: a.get('rubric_association_id'),
+    'submissionId': reviewedSubmissionId,
+    'reviewerId': reviewerId,
+}
+
+
+def assessmentIds(canvasRubric: CanvasRubric, column: str) -> Set[int]:
+    """
+    :param column: Name of the column of `ASSESSMENT_COLUMNS`
+    :return: Values of the column, for all of the rubric's assessments
+        that have one
+    """
+    if isinstance(canvasRubric.assessments, SpooledItems):
+        return canvasRubric.assessments.values(column)
+    value: Callable[[dict], int | None] = ASSESSMENT_COLUMNS[column]
+    return {i for i in map(value, canvasRubric.assessments)
+            if i is not None}
+
+
+def reviewedSubmissionIds(canvasRubric: CanvasRubric) -> Set[int]:
+    return assessmentIds(canvasRubric, 'submissionId')
+
+
+def reviewerIds(canvasRubric: CanvasRubric) -> Set[int]:
+    return assessmentIds(canvasRubric, 'reviewerId')
+
+
+def peerReviewed(canvasAssignment: CanvasAssignment) -> bool:
+    if canvasAssignment.peer_reviews is not True:
+        return False
+    LOGGER.debug(f'Found peer reviewed assignment '
+                 f'({canvasAssignment.id}): '
+                 f'"{canvasAssignment.name}"')
+    return True
+
+
+def rubricId(canvasAssignment: CanvasAssignment) -> int | None:
+    """
+    :return: ID of the assignment's rubric, or `None` if it has none
+    :raise ValueError: If the assignment has a rubric without an ID
+    """
+    if not hasattr(canvasAssignment, 'rubric_settings'):
+        LOGGER.debug(f'Skipping Assignment ({canvasAssignment.id}): '
+                     'No rubric.')
+        return None
+
+    assignmentRubricId: int | None = \
+        canvasAssignment.rubric_settings.get('id')
+    if assignmentRubricId is None:
+        raise ValueError('Rubric ID is null for '
+                         f'Assignment ({canvasAssignment.id}).')
+    LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
+                 f'rubric ID ({assignmentRubricId})')
+    return assignmentRubricId
+
+
+def hasAssessments(canvasCourse: CanvasCourse,
+                   canvasAssignment: CanvasAssignment,
+                   canvasRubric: CanvasRubric) -> bool:
+    """
+    :return: Whether the assignment's rubric, fetched with its
+        assessments, has any, so the assignment should be saved
+    """
+    if not hasattr(canvasRubric, 'assessments'):
+        LOGGER.debug(f'Skipping assignment ({canvasAssignment.id}) in '
+                     f'course ({canvasCourse.id}): Not configured '
+                     f'for peer reviews ("assessments").')
+        return False
+
+    LOGGER.debug(f'Assignment ({canvasAssignment.id}) '
+                 f'in course ({canvasCourse.id}) is '
+                 'configured for peer reviews ("assessments")…')
+
+    if len(canvasRubric.assessments) == 0:
+        LOGGER.debug(
+            f'Skipping assignment ({canvasAssignment.id}) '
+            f'in course ({canvasCourse.id}): '
+            'No peer reviews ("assessments") were found.')
+        return False
+    return True
+
+
+def assignmentRubric(canvasRubric: CanvasRubric,
+                     assignmentId: int) -> CanvasRubric:
+    """
+    Canvas returns the assessments of all assignments that use a rubric
+    with it.  Split off those made for one assignment, using the rubric's
+    assignment associations, which assessments refer to.  If the rubric was
+    fetched without associations, all assessments are kept.
+
+    :return: Copy of the rubric, with only the assignment's assessments
+    """
+    associations: Dict[int, int] = {
+        a['id']: a['association_id']
+        for a in getattr(canvasRubric, 'associations', None) or []
+        if a.get('association_type') == 'Assignment'}
+    if not hasattr(canvasRubric, 'assessments') or len(associations) == 0:
+        return canvasRubric
+
+    rubric: CanvasRubric = copy.copy(canvasRubric)
+    if isinstance(canvasRubric.assessments, SpooledItems):
+        rubric.assessments = canvasRubric.assessments.where(
+            'associationId',
+            {i for i, a in associations.items() if a == assignmentId})
+        return rubric
+
+    rubric.assessments = [
+        a for a in canvasRubric.assessments
+        if associations.get(
+            a.get('rubric_association_id') or 0) == assignmentId]
+    return rubric
+
+
+def rubricSpool() -> IO[bytes]:
+    """
+    :return: File that a rubric response is written to as it's received,
+        kept in memory up to `config.RUBRIC_STREAM_MIN_BYTES`
+    """
+    return SpooledTemporaryFile(max_size=config.RUBRIC_STREAM_MIN_BYTES)
+
+
+def spooledRubric(canvasCourse: CanvasCourse, spool: IO[bytes],
+                  associations: List[dict]) -> CanvasRubric:
+    """
+    Make a rubric from a response written to a spool, like `canvasapi`
+    does.  If the response is larger than `config.RUBRIC_STREAM_MIN_BYTES`,
+    its assessments are left in the spool, and read one at a time when
+    they're used (see `canvasStream.SpooledItems`), with the columns of
+    `ASSESSMENT_COLUMNS`, so `assignmentRubric()` can split them by rubric
+    association without reading them.
+
+    :param associations: Associations of the rubric, which are fetched
+        with another request
+    """
+    members, assessments = loadSpooled(
+        spool, config.RUBRIC_STREAM_MIN_BYTES, 'assessments',
+        ASSESSMENT_COLUMNS)
+    canvasRubric: CanvasRubric = Rubric(
+        canvasCourse._requester, {**members, 'course_id': canvasCourse.id})
+    # Set apart, as `canvasapi` formats each attribute as a string, to find
+    # times.
+    if assessments is not None:
+        canvasRubric.assessments = assessments
+    canvasRubric.associations = associations
+    return canvasRubric
+
+
+def associatedAssignmentIds(canvasRubric: CanvasRubric) -> Set[int]:
+    return {a['association_id']
+            for a in getattr(canvasRubric, 'associations', None) or []
+            if a.get('association_type') == 'Assignment'}
+
+
+@dataclass
+class _CachedRubric:
+    # `concurrent.futures.Future` with threads, `asyncio.Future` with
+    # coroutines
+    future: Future | asyncio.Future
+    # Assignments that haven't taken their assessments yet
+    remaining_ids: Set[int] | None = None
+
+
+class RubricCache(object):
+    """
+    Rubrics of one course, fetched with their assessments, so that a rubric
+    used by several assignments is fetched only once.  The first assignment
+    that needs a rubric fetches it, and the others wait for that fetch.
+    Each assignment gets a copy with only its own assessments (see
+    `assignmentRubric()`).
+
+    A rubric is dropped once all of the assignments associated with it
+    got their copy, so only shared rubrics stay in memory.  Rubrics of
+    associated assignments that aren't synced stay until the course is
+    done.  Rubrics that failed to be fetched are dropped, so they're
+    fetched again for the next assignment.
+    """
+
+    def __init__(self, skipIds: Collection[int] = ()):
+        """
+        :param skipIds: IDs of assignments that won't get their rubric, so
+            rubrics aren't kept for them
+        """
+        self.skipIds: Set[int] = set(skipIds)
+        self.__rubrics: Dict[int, _CachedRubric] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, rubricId: int, assignmentId: int,
+            fetch: Callable[[], CanvasRubric]) -> CanvasRubric:
+        """
+        :param rubricId: ID of the rubric
+        :param assignmentId: ID of the assignment that needs the rubric
+        :param fetch: Function that fetches the rubric, with its
+            assessments and assignment associations, if it isn't cached
+        """
+        with self.__lock:
+            cached: _CachedRubric | None = self.__rubrics.get(rubricId)
+            isNew: bool = cached is None
+            if cached is None:
+                cached = self.__rubrics[rubricId] = _CachedRubric(Future())
+
+        if isNew:
+            try:
+                cached.future.set_result(fetch())
+            except BaseException as e:
+                self.__drop(rubricId, cached)
+                cached.future.set_exception(e)
+        return self.__take(rubricId, assignmentId, cached.future.result())
+
+    async def getAsync(self, rubricId: int, assignmentId: int,
+                       fetch: Callable[[], Awaitable[CanvasRubric]]) \
+            -> CanvasRubric:
+        """
+        Like `get()`, for coroutines running on one event loop.
+        """
+        with self.__lock:
+            cached: _CachedRubric | None = self.__rubrics.get(rubricId)
+            if cached is None:
+                cached = self.__rubrics[rubricId] = _CachedRubric(
+                    asyncio.ensure_future(fetch()))
+
+        try:
+            # Shielded, so that a waiter being cancelled doesn't cancel
+            # the fetch for the others.
+            canvasRubric: CanvasRubric = await asyncio.shield(
+                asyncio.wrap_future(cached.future))
+        except Exception:
+            self.__drop(rubricId, cached)
+            raise
+        return self.__take(rubricId, assignmentId, canvasRubric)
+
+    def __drop(self, rubricId: int, cached: _CachedRubric) -> None:
+        with self.__lock:
+            if self.__rubrics.get(rubricId) is cached:
+                del self.__rubrics[rubricId]
+
+    def __take(self, rubricId: int, assignmentId: int,
+               canvasRubric: CanvasRubric) -> CanvasRubric:
+        with self.__lock:
+            cached: _CachedRubric | None = self.__rubrics.get(rubricId)
+            if cached is not None:
+                if cached.remaining_ids is None:
+                    cached.remaining_ids = associatedAssignmentIds(
+                        canvasRubric) - self.skipIds
+                cached.remaining_ids.discard(assignmentId)
+                if len(cached.remaining_ids) == 0:
+                    del self.__rubrics[rubricId]
+        return assignmentRubric(canvasRubric, assignmentId)
+
+
+class FetchEngine(ABC):
+    """
+    Fetches the Canvas data of a course that is saved to the DB.  Each
+    engine uses a different Canvas API, but returns the same objects, so
+    the data is saved the same way.  Users and submissions are returned as
+    `canvasData.CanvasRecord` objects, the others as `canvasapi` objects.
+    """
+
+    @abstractmethod
+    def getUsers(self, canvasCourse: CanvasCourse,
+                 userIds: Collection[int] | None = None) \
+            -> Iterable[CanvasUser]:
+        """
+        :param canvasCourse: Course of the users
+        :param userIds: IDs of the users to fetch.  If not given, the whole
+            course roster is fetched.
+        """
+
+    def fetchAssignments(self, canvasCourse: CanvasCourse,
+                         syncedAt: Dict[int, datetime],
+                         skipIds: Collection[int] = (),
+                         listedIds: Set[int] | None = None) \
+            -> Iterator[AssignmentFetch]:
+        """
+        Fetch the peer reviewed assignments of a course.  Assignments are
+        fetched up to `config.ASSIGNMENT_PREFETCH` ahead of the one the
+        caller is saving, so API and DB time overlap.
+
+        :param canvasCourse: Course of the assignments
+        :param syncedAt: Time of the last sync of each assignment, by ID.
+            Engines that support it fetch only what changed since then.
+        :param skipIds: IDs of assignments not to fetch, like those
+            finished in a run being resumed
+        :param listedIds: Set to which the IDs of all of the assignments
+            of the course are added as they're listed, if given, including
+            those not fetched
+        :return: Iterator of `AssignmentFetch`, one for each peer reviewed
+            assignment not skipped
+        """
+        rubrics = RubricCache(skipIds)
+        return prefetch(
+            self.assignmentsToFetch(canvasCourse, skipIds, listedIds),
+            lambda a: self.fetchAssignment(canvasCourse, a,
+                                           syncedAt.get(a.id), rubrics),
+            config.ASSIGNMENT_PREFETCH)
+
+    def assignmentsToFetch(self, canvasCourse: CanvasCourse,
+                           skipIds: Collection[int],
+                           listedIds: Set[int] | None = None) \
+            -> Iterator[CanvasAssignment]:
+        """
+        :return: Peer reviewed assignments of a course, except those
+            skipped, listed as they're iterated over
+        """
+        for a in metrics.timed(self.getAssignments(canvasCourse),
+                               'listAssignments', canvasCourse.id):
+            if listedIds is not None:
+                listedIds.add(a.id)
+            if peerReviewed(a) and a.id not in skipIds:
+                yield a
+
+    @abstractmethod
+    def getAssignments(self, canvasCourse: CanvasCourse) \
+            -> Iterable[CanvasAssignment]:
+        """
+        :return: All of the assignments of a course
+        """
+
+    @abstractmethod
+    def fetchAssignment(self, canvasCourse: CanvasCourse,
+                        canvasAssignment: CanvasAssignment,
+                        since: datetime | None = None,
+                        rubrics: RubricCache | None = None) \
+            -> AssignmentFetch:
+        """
+        Fetch the rubric (with assessments) and submissions of a peer
+        reviewed assignment.  This makes only Canvas API calls, no DB calls,
+        so it may run in a prefetch thread while other assignments are
+        saved.
+
+        :param rubrics: Rubrics of the course fetched so far, shared by
+            the assignments of the course, if the engine fetches rubrics
+            separately
+        """
+
+    def close(self) -> None:
+        """
+        Release what the engine holds, like connections.  It can't be used
+        afterwards.
+        """
+
+
+class RestFetchEngine(FetchEngine):
+    """
+    Fetches data with the Canvas REST API, through `canvasapi`.  Pages of
+    lists are fetched with `canvasPages.fetchPages()`, several at a time.
+    """
+
+    @staticmethod
+    def pages(paginatedList: PaginatedList,
+              contentClass: Callable | None = None) -> Iterator:
+        return fetchPages(paginatedList, config.CANVAS_PAGE_CONCURRENCY,
+                          contentClass)
+
+    def getUsers(self, canvasCourse: CanvasCourse,
+                 userIds: Collection[int] | None = None) \
+            -> Iterable[CanvasUser]:
+        '''
+        Possible bug in `canvasapi` module…
+        When calling `get_users` with the argument `include='test_student'`,
+        the module adds it to the URL as `include=test_studentanalytics_url`.
+        The origin of the "analytics_url" string is unknown.  However, it's
+        known that the Canvas API expects the "include" argument to appear
+        as `include[]`, so by using a dictionary here with the key in the
+        correct format, the bug is bypassed and the argument appears
+        correctly.
+        Strangely, a later call to `get_rubric` uses the `include` keyword
+        argument without problem.
+        '''
+        include: dict = {'include[]': 'test_student'}
+        if userIds is None:
+            return self.pages(canvasCourse.get_users(**include), CanvasUser)
+
+        return chain.from_iterable(
+            self.pages(canvasCourse.get_users(user_ids=batch, **include),
+                       CanvasUser)
+            for batch in chunks(sorted(userIds), ID_BATCH_SIZE))
+
+    def getAssignments(self, canvasCourse: CanvasCourse) \
+            -> Iterable[CanvasAssignment]:
+        return self.pages(canvasCourse.get_assignments())
+
+    def fetchAssignment(self, canvasCourse: CanvasCourse,
+                        canvasAssignment: CanvasAssignment,
+                        since: datetime | None = None,
+                        rubrics: RubricCache | None = None) \
+            -> AssignmentFetch:
+        """
+        Canvas can't filter rubric assessments by time, so they are always
+        fetched in full.  Submissions are filtered with `submitted_since`
+        when `since` is given.
+        """
+        fetched = AssignmentFetch(canvasAssignment, since)
+
+        assignmentRubricId: int | None = rubricId(canvasAssignment)
+        if assignmentRubricId is None:
+            return fetched
+
+        if rubrics is None:
+            rubrics = RubricCache()
+        with metrics.phase('fetchRubric', canvasCourse.id,
+                           canvasAssignment.id):
+            canvasAssignmentRubric: CanvasRubric = rubrics.get(
+                assignmentRubricId, canvasAssignment.id,
+                lambda: self.getRubric(canvasCourse, assignmentRubricId))
+
+        if not hasAssessments(canvasCourse, canvasAssignment,
+                              canvasAssignmentRubric):
+            return fetched
+
+        fetched.canvas_rubric = canvasAssignmentRubric
+        with metrics.phase('fetchSubmissions', canvasCourse.id,
+                           canvasAssignment.id):
+            fetched.canvas_submissions = self.getSubmissions(
+                canvasCourse, canvasAssignment, canvasAssignmentRubric,
+                since)
+        fetched.all_submissions = since is None and not config.DEMAND_LOADING
+        fetched.all_assessments = True
+        return fetched
+
+    @staticmethod
+    def getRubric(canvasCourse: CanvasCourse,
+                  assignmentRubricId: int) -> CanvasRubric:
+        """
+        Fetch a rubric with its assessments, like `get_rubric()` does, but
+        stream the response to a spool (see `spooledRubric()`).  The
+        response isn't kept by `canvasapi`, which keeps the last responses
+        it received.  It's sent by the requester of the course, like
+        `canvasapi` requests are.  The rubric's associations are fetched
+        first, with `get_rubric()`.
+        """
+        associations: List[dict] = getattr(canvasCourse.get_rubric(
+            assignmentRubricId, include=RUBRIC_ASSOCIATIONS_INCLUDE),
+            'associations', None) or []
+
+        requester: Requester = canvasCourse._requester
+        spool: IO[bytes] = rubricSpool()
+        response: Response = requester._session.get(
+            f'{requester.base_url}courses/{canvasCourse.id}/rubrics/'
+            f'{assignmentRubricId}',
+            params=params(include=RUBRIC_INCLUDE, style='full'),
+            headers={'Authorization': f'Bearer {requester.access_token}'},
+            stream=True)
+        with response:
+            if response.status_code >= 400:
+                raise STATUS_EXCEPTIONS.get(
+                    response.status_code, CanvasException)(response.text)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                spool.write(chunk)
+
+        metrics.count(bytes=spool.tell())
+        return spooledRubric(canvasCourse, spool, associations)
+
+    def getSubmissions(self, canvasCourse: CanvasCourse,
+                       canvasAssignment: CanvasAssignment,
+                       canvasRubric: CanvasRubric,
+                       since: datetime | None = None) \
+            -> List[CanvasSubmission]:
+        """
+        Fetch the submissions of an assignment: only the reviewed ones with
+        `config.DEMAND_LOADING`, and only those made after `since`, if
+        given.
+        """
+        if config.DEMAND_LOADING:
+            return self.getReviewedSubmissions(
+                canvasCourse, canvasAssignment,
+                reviewedSubmissionIds(canvasRubric), since)
+
+        if since is None:
+            return list(self.pages(canvasAssignment.get_submissions(),
+                                   CanvasSubmission))
+
+        submissions: List[CanvasSubmission] = list(self.pages(
+            canvasCourse.get_multiple_submissions(
+                assignment_ids=[canvasAssignment.id],
+                student_ids=['all'], submitted_since=since),
+            CanvasSubmission))
+        LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
+                     f'{len(submissions)} submission(s) '
+                     f'since {since.isoformat()}')
+        return submissions
+
+    def getReviewedSubmissions(self, canvasCourse: CanvasCourse,
+                               canvasAssignment: CanvasAssignment,
+                               submissionIds: Set[int],
+                               since: datetime | None = None) \
+            -> List[CanvasSubmission]:
+        """
+        Fetch only the submissions of an assignment with the given IDs.
+        Canvas can't filter submissions by ID, so the assignment's peer
+        reviews are used to find the students who made them, and the
+        submissions are fetched by student ID, in batches.
+        """
+        studentIds: Set[int] = {
+            p.user_id for p in self.pages(canvasAssignment.get_peer_reviews(),
+                                          CanvasPeerReview)
+            if p.asset_id in submissionIds}
+
+        kwargs: dict = {} if since is None else {'submitted_since': since}
+        submissions: List[CanvasSubmission] = []
+        for batch in chunks(sorted(studentIds), ID_BATCH_SIZE):
+            submissions.extend(
+                s for s in self.pages(canvasCourse.get_multiple_submissions(
+                    assignment_ids=[canvasAssignment.id],
+                    student_ids=batch, **kwargs), CanvasSubmission)
+                if s.id in submissionIds)
+
+        LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
+                     f'{len(submissions)} reviewed submission(s) of '
+                     f'{len(studentIds)} student(s)')
+        return submissions
+
+
+class GraphQLFetchEngine(FetchEngine):
+    """
+    Fetches data with the Canvas GraphQL API.  A course's assignments come
+    with their rubrics in one query, and an assignment's submissions come
+    with their rubric assessments in another, instead of several REST
+    calls per assignment.
+
+    The submissions query returns the assessments nested in submissions,
+    so it can't be filtered by time without losing assessments of older
+    submissions.  Assignments are therefore always fetched in full.
+    """
+
+    def __init__(self, client: CanvasGraphQL):
+        self.client: CanvasGraphQL = client
+
+    def getUsers(self, canvasCourse: CanvasCourse,
+                 userIds: Collection[int] | None = None) \
+            -> Iterable[CanvasUser]:
+        return self.client.getUsers(canvasCourse.id, userIds)
+
+    def getAssignments(self, canvasCourse: CanvasCourse) \
+            -> Iterable[CanvasAssignment]:
+        return self.client.getAssignments(canvasCourse.id)
+
+    def fetchAssignment(self, canvasCourse: CanvasCourse,
+                        canvasAssignment: CanvasAssignment,
+                        since: datetime | None = None,
+                        rubrics: RubricCache | None = None) \
+            -> AssignmentFetch:
+        """
+        The rubric comes with the assignment, and the assessments with the
+        assignment's own submissions, so `rubrics` isn't used.
+        """
+        fetched = AssignmentFetch(canvasAssignment)
+
+        if not hasattr(canvasAssignment, 'rubric_settings'):
+            LOGGER.debug(f'Skipping Assignment ({canvasAssignment.id}): '
+                         'No rubric.')
+            return fetched
+
+        # The rubric comes with the assignment; this fetches submissions.
+        with metrics.phase('fetchSubmissions', canvasCourse.id,
+                           canvasAssignment.id):
+            canvasRubric, canvasSubmissions = \
+                self.client.getRubricAndSubmissions(canvasAssignment)
+
+        if len(canvasRubric.assessments) == 0:
+            LOGGER.debug(
+                f'Skipping assignment ({canvasAssignment.id}) '
+                f'in course ({canvasCourse.id}): '
+                'No peer reviews ("assessments") were found.')
+            return fetched
+
+        if config.DEMAND_LOADING:
+            submissionIds: Set[int] = reviewedSubmissionIds(canvasRubric)
+            canvasSubmissions = [s for s in canvasSubmissions
+                                 if s.id in submissionIds]
+
+        fetched.canvas_rubric = canvasRubric
+        fetched.canvas_submissions = canvasSubmissions
+        fetched.all_submissions = not config.DEMAND_LOADING
+        fetched.all_assessments = not canvasRubric.assessments_truncated
+        return fetched
+
+
+class AsyncFetchEngine(FetchEngine):
+    """
+    Fetches data with the Canvas REST API, like `RestFetchEngine`, but as
+    coroutines on the event loop of a `CanvasAsync` client, instead of with
+    `canvasapi` in threads.  The requests of all courses and assignments
+    being fetched share the client's connection pool and the scheduler's
+    concurrency limit, and the batches of a list are fetched at the same
+    time.
+    """
+
+    def __init__(self, client: CanvasAsync):
+        self.client: CanvasAsync = client
+
+    def close(self) -> None:
+        self.client.close()
+
+    def getUsers(self, canvasCourse: CanvasCourse,
+                 userIds: Collection[int] | None = None) \
+            -> Iterable[CanvasUser]:
+        return self.client.run(self.getUsersAsync(canvasCourse, userIds))
+
+    async def getUsersAsync(self, canvasCourse: CanvasCourse,
+                            userIds: Collection[int] | None = None) \
+            -> List[CanvasUser]:
+        url: str = f'courses/{canvasCourse.id}/search_users'
+        if userIds is None:
+            return await self.client.getList(CanvasUser, url, {},
+                                             include=['test_student'])
+
+        batches: List[List[CanvasUser]] = await asyncio.gather(*(
+            self.client.getList(CanvasUser, url, {},
+                                include=['test_student'], user_ids=batch)
+            for batch in chunks(sorted(userIds), ID_BATCH_SIZE)))
+        return list(chain.from_iterable(batches))
+
+    def getAssignments(self, canvasCourse: CanvasCourse) \
+            -> Iterator[CanvasAssignment]:
+        # Fetched when iterated, like a `canvasapi` list, so the requests
+        # are counted in the caller's phase.
+        yield from self.client.run(self.client.getList(
+            Assignment, f'courses/{canvasCourse.id}/assignments',
+            {'course_id': canvasCourse.id}))
+
+    def fetchAssignments(self, canvasCourse: CanvasCourse,
+                         syncedAt: Dict[int, datetime],
+                         skipIds: Collection[int] = (),
+                         listedIds: Set[int] | None = None) \
+            -> Iterator[AssignmentFetch]:
+        """
+        Like `FetchEngine.fetchAssignments()`, but the assignments fetched
+        ahead are coroutines on the client's event loop, not threads.
+        """
+        rubrics = RubricCache(skipIds)
+        return pipelined(
+            self.assignmentsToFetch(canvasCourse, skipIds, listedIds),
+            lambda a: self.client.submit(self.fetchAssignmentAsync(
+                canvasCourse, a, syncedAt.get(a.id), rubrics)),
+            config.ASSIGNMENT_PREFETCH)
+
+    def fetchAssignment(self, canvasCourse: CanvasCourse,
+                        canvasAssignment: CanvasAssignment,
+                        since: datetime | None = None,
+                        rubrics: RubricCache | None = None) \
+            -> AssignmentFetch:
+        return self.client.run(self.fetchAssignmentAsync(
+            canvasCourse, canvasAssignment, since, rubrics))
+
+    async def fetchAssignmentAsync(self, canvasCourse: CanvasCourse,
+                                   canvasAssignment: CanvasAssignment,
+                                   since: datetime | None = None,
+                                   rubrics: RubricCache | None = None) \
+            -> AssignmentFetch:
+        """
+        See `RestFetchEngine.fetchAssignment()`.
+        """
+        fetched = AssignmentFetch(canvasAssignment, since)
+
+        assignmentRubricId: int | None = rubricId(canvasAssignment)
+        if assignmentRubricId is None:
+            return fetched
+
+        if rubrics is None:
+            rubrics = RubricCache()
+        canvasRubric: CanvasRubric = await rubrics.getAsync(
+            assignmentRubricId, canvasAssignment.id,
+            lambda: self.getRubric(canvasCourse, canvasAssignment,
+                                   assignmentRubricId))
+
+        if not hasAssessments(canvasCourse, canvasAssignment, canvasRubric):
+            return fetched
+
+        canvasSubmissions: List[CanvasSubmission] = \
+            await self.getSubmissions(
+                canvasCourse, canvasAssignment, since,
+                reviewedSubmissionIds(canvasRubric)
+                if config.DEMAND_LOADING else None)
+
+        fetched.canvas_rubric = canvasRubric
+        fetched.canvas_submissions = canvasSubmissions
+        fetched.all_submissions = since is None and not config.DEMAND_LOADING
+        fetched.all_assessments = True
+        return fetched
+
+    async def getRubric(self, canvasCourse: CanvasCourse,
+                        canvasAssignment: CanvasAssignment,
+                        assignmentRubricId: int) -> CanvasRubric:
+        """
+        Fetch a rubric with its assessments, streaming the response to a
+        spool like `RestFetchEngine.getRubric()`.  It's read in a thread, so
+        a large response doesn't hold up the event loop.  The rubric's
+        associations are fetched at the same time.
+        """
+        with metrics.phase('fetchRubric', canvasCourse.id,
+                           canvasAssignment.id):
+            url: str = f'courses/{canvasCourse.id}/rubrics/' \
+                       f'{assignmentRubricId}'
+            spool: IO[bytes] = rubricSpool()
+            associated, _ = await asyncio.gather(
+                self.client.get(url, params(
+                    include=RUBRIC_ASSOCIATIONS_INCLUDE)),
+                self.client.get(url, params(include=RUBRIC_INCLUDE,
+                                            style='full'), spool))
+            associations: List[dict] = \
+                associated.json().get('associations') or []
+            return await asyncio.to_thread(spooledRubric, canvasCourse,
+                                           spool, associations)
+
+    async def getSubmissions(self, canvasCourse: CanvasCourse,
+                             canvasAssignment: CanvasAssignment,
+                             since: datetime | None = None,
+                             submissionIds: Set[int] | None = None) \
+            -> List[CanvasSubmission]:
+        """
+        Fetch the submissions of an assignment, only those made after
+        `since`, if given.
+
+        :param submissionIds: IDs of the only submissions to fetch, as
+            with `RestFetchEngine.getReviewedSubmissions()`, if given
+        """
+        courseId: int = canvasCourse.id
+        with metrics.phase('fetchSubmissions', courseId,
+                           canvasAssignment.id):
+            if submissionIds is not None:
+                return await self.getReviewedSubmissions(
+                    canvasCourse, canvasAssignment, submissionIds, since)
+
+            if since is None:
+                return await self.client.getList(
+                    CanvasSubmission,
+                    f'courses/{courseId}/assignments/'
+                    f'{canvasAssignment.id}/submissions',
+                    {'course_id': courseId})
+
+            submissions: List[CanvasSubmission] = await self.client.getList(
+                CanvasSubmission, f'courses/{courseId}/students/submissions',
+                {'course_id': courseId}, assignment_ids=[canvasAssignment.id],
+                student_ids=['all'], submitted_since=since)
+            LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
+                         f'{len(submissions)} submission(s) '
+                         f'since {since.isoformat()}')
+            return submissions
+
+    async def getReviewedSubmissions(self, canvasCourse: CanvasCourse,
+                                     canvasAssignment: CanvasAssignment,
+                                     submissionIds: Set[int],
+                                     since: datetime | None = None) \
+            -> List[CanvasSubmission]:
+        courseId: int = canvasCourse.id
+        peerReviews: List[CanvasPeerReview] = await self.client.getList(
+            CanvasPeerReview,
+            f'courses/{courseId}/assignments/{canvasAssignment.id}/'
+            'peer_reviews', {})
+        studentIds: Set[int] = {p.user_id for p in peerReviews
+                                if p.asset_id in submissionIds}
+
+        kwargs: dict = {} if since is None else {'submitted_since': since}
+        batches: List[List[CanvasSubmission]] = await asyncio.gather(*(
+            self.client.getList(
+                CanvasSubmission, f'courses/{courseId}/students/submissions',
+                {'course_id': courseId}, assignment_ids=[canvasAssignment.id],
+                student_ids=batch, **kwargs)
+            for batch in chunks(sorted(studentIds), ID_BATCH_SIZE)))
+        submissions: List[CanvasSubmission] = [
+            s for s in chain.from_iterable(batches) if s.id in submissionIds]
+
+        LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
+                     f'{len(submissions)} reviewed submission(s) of '
+                     f'{len(studentIds)} student(s)')
+        return submissions
+
+
+def getFetchEngine(name: str = config.FETCH_ENGINE) -> FetchEngine:
+    if name == 'graphql':
+        return GraphQLFetchEngine(CanvasGraphQL(canvas))
+    if name == 'async':
+        if config.CANVAS_CACHE_DIR:
+            LOGGER.warning('CANVAS_CACHE_DIR is not used by the "async" '
+                           'fetch engine.')
+        return AsyncFetchEngine(CanvasAsync(
+            canvas_requester, canvas_scheduler,
+            config.CANVAS_PAGE_CONCURRENCY))
+    return RestFetchEngine()
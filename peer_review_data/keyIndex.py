@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, List, Set, Tuple
+
+from django.db.models import Model
+
+from peer_review_data import models
+from peer_review_data.userCache import user_cache
+from runMetrics import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Reject:
+    """
+    A row that was not written because a foreign key refers to a row that
+    isn't in the DB.
+    """
+    model: str
+    id: int
+    field: str
+    value: int | None
+
+
+class RejectReport(object):
+    """
+    Rows of a course rejected before they were written to the DB.
+    """
+
+    def __init__(self, courseId: int):
+        self.courseId: int = courseId
+        self.rejects: List[Reject] = []
+
+    def __len__(self) -> int:
+        return len(self.rejects)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: ' \
+               f'{len(self)} row(s) rejected in ' \
+               f'course ({self.courseId})' + ''.join(
+                   f'; {count} {model} with unknown {field}'
+                   for (model, field), count in self.counts().items())
+
+    def add(self, obj: Model, field: str) -> None:
+        value: int | None = getattr(obj, f'{field}_id')
+        self.rejects.append(
+            Reject(obj.__class__.__name__, obj.pk, field, value))
+        metrics.count(errors=1)
+        LOGGER.debug(f'Rejected {obj.__class__.__name__} ({obj.pk}): '
+                     f'{field} ({value}) not found')
+
+    def counts(self) -> Counter[Tuple[str, str]]:
+        return Counter((r.model, r.field) for r in self.rejects)
+
+
+class KeyIndex(object):
+    """
+    IDs of the rows of a course that assessments and comments refer to, so
+    they can be checked before they are written.  Submissions and criteria
+    already in the DB are loaded once per course, then those written
+    during the sync are added, and those deleted are removed.  Users are
+    looked up in the process-wide user cache, which knows every user in
+    the DB when the run starts.  Users it doesn't know are looked up in
+    the DB, as another node or course may have saved them since then.
+    """
+
+    def __init__(self, courseId: int):
+        self.courseId: int = courseId
+        self.submissionIds: Set[int] = set()
+        self.criterionIds: Set[int] = set()
+        # Users not in the DB, so they're only looked up once
+        self.unknownUserIds: Set[int] = set()
+
+    def load(self) -> 'KeyIndex':
+        self.submissionIds.update(
+            models.Submission.objects
+            .filter(assignment__course_id=self.courseId)
+            .values_list('id', flat=True).iterator())
+        self.criterionIds.update(
+            models.Criterion.objects
+            .filter(rubric__assignments__course_id=self.courseId)
+            .values_list('id', flat=True).distinct().iterator())
+        LOGGER.debug(f'Loaded IDs of {len(self.submissionIds)} '
+                     f'submission(s) and {len(self.criterionIds)} '
+                     f'criteria of course ({self.courseId})')
+        return self
+
+    def addSubmissions(self, ids: Iterable[int]) -> None:
+        self.submissionIds.update(ids)
+
+    def addCriteria(self, ids: Iterable[int]) -> None:
+        self.criterionIds.update(ids)
+
+    def removeSubmissions(self, ids: Iterable[int]) -> None:
+        self.submissionIds.difference_update(ids)
+
+    def removeCriteria(self, ids: Iterable[int]) -> None:
+        self.criterionIds.difference_update(ids)
+
+    def checkAssessment(self, assessment: models.Assessment) -> str | None:
+        """
+        :return: Name of the first foreign key of the assessment that
+            refers to an unknown row, or `None` if all are known
+        """
+        if assessment.submission_id not in self.submissionIds:
+            return 'submission'
+        if not self.isUserKnown(assessment.assessor_id):
+            return 'assessor'
+        return None
+
+    def isUserKnown(self, userId: int | None) -> bool:
+        """
+        Users missing from the user cache are looked up in the DB once, in
+        case they were saved after it was seeded.
+        """
+        if userId is None or userId in self.unknownUserIds:
+            return False
+        if userId in user_cache:
+            return True
+        self.unknownUserIds.update(user_cache.lookUp([userId]))
+        return userId not in self.unknownUserIds
+
+    def checkComment(self, comment: models.Comment) -> str | None:
+        """
+        The comment's assessment is not checked; comments are only made
+        for assessments that passed their own check.
+        """
+        if comment.criterion_id not in self.criterionIds:
+            return 'criterion'
+        return None
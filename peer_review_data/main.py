@@ -1,248 +1,806 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List
+from functools import partial
+from itertools import chain
+from typing import Dict, Iterable, List, Set
 
 import canvasapi.exceptions as canvasApiExceptions
+from django.db import connections, DatabaseError, transaction
 from django.utils.timezone import utc
 
 import config
 from canvasData import (
     canvas,
+    canvas_cache,
+    canvas_scheduler,
     CanvasAssessment,
     CanvasAssignment,
     CanvasCourse,
     CanvasComment,
     CanvasCriteria,
     CanvasRubric,
-    CanvasSubmission
+    CanvasSubmission,
+    CanvasUser
 )
 from peer_review_data import models
+from peer_review_data.bulk import BulkUpserter, saveRow
+from peer_review_data.checkpoint import Checkpoints
+from peer_review_data.discovery import courseIds
+from peer_review_data.fetch import (
+    AssignmentFetch,
+    FetchEngine,
+    getFetchEngine,
+    reviewerIds
+)
+from peer_review_data.keyIndex import KeyIndex, RejectReport
 from peer_review_data.models import Submission, User
-from utils import dictSkipKeys
+from peer_review_data.prune import (
+    countDeleted,
+    pruneAssignment,
+    pruneAssignments,
+    pruneCriteria
+)
+from peer_review_data.userCache import user_cache
+from peer_review_data.workQueue import queuedRun, WorkQueue
+from runMetrics import metrics, prometheusGauge
+from utils import chunks, dictSkipKeys, writeFileAtomically
 
 LOGGER = logging.getLogger(__name__)
 
+COURSE_SUCCEEDED: str = 'succeeded'
+COURSE_FAILED: str = 'failed'
+COURSE_NOT_FOUND: str = 'not found'
+COURSE_SKIPPED: str = 'skipped'
+
+fetch_engine: FetchEngine = getFetchEngine()
 
-def saveCourseAndUsers(canvasCourse: CanvasCourse):
+
+@metrics.phase('saveCourse')
+def saveCourse(canvasCourse: CanvasCourse):
     course = models.Course.fromCanvasCourse(canvasCourse)
     LOGGER.debug(f'Saving {course}…')
-    course.save()
-
-    LOGGER.debug(f'Saving users of {course}…')
-    '''
-    Possible bug in `canvasapi` module…
-    When calling `get_users` with the argument `include='test_student'`, the
-    module adds it to the URL as `include=test_studentanalytics_url`.  The
-    origin of the "analytics_url" string is unknown.  However, it's known that
-    the Canvas API expects the "include" argument to appear as `include[]`, so
-    by using a dictionary here with the key in the correct format, the bug is
-    bypassed and the argument appears correctly.
-    Strangely, a later call to `get_rubric` uses the `include` keyword argument
-    without problem.
-    '''
-    for canvasUser in canvasCourse.get_users(**{'include[]': 'test_student'}):
-        user = models.User.fromCanvasUser(canvasUser)
-        LOGGER.debug(f'Saving {user}…')
-        user.save()
+    saveRow(course)
 
 
-def saveSubmissions(canvasAssignment: CanvasAssignment):
-    canvasSubmissions: List[CanvasSubmission] = \
-        canvasAssignment.get_submissions()
+@metrics.phase('saveUsers')
+def saveUsers(canvasUsers: Iterable[CanvasUser]):
+    """
+    Save users that are new or changed since they were last saved, as
+    recorded by the user cache.
+    """
+    changedUsers: List[models.User] = []
+    with BulkUpserter(models.User) as users:
+        for canvasUser in canvasUsers:
+            user: models.User = models.User.fromCanvasUser(canvasUser)
+            if user_cache.changed(user):
+                users.add(user)
+                changedUsers.append(user)
+            else:
+                metrics.count(rows_skipped=1)
+                metrics.countRows(models.User._meta.db_table, unchanged=1)
+
+    user_cache.saved(u for u in changedUsers if u.id not in users.failedKeys)
+
+
+@metrics.phase('saveSubmissions')
+def saveSubmissions(canvasSubmissions: List[CanvasSubmission],
+                    keyIndex: KeyIndex) -> int:
+    """
+    :param keyIndex: Index to which the IDs of submissions saved are added
+    :return: Number of submissions that could not be saved
+    """
+    errorCount: int = 0
+    with BulkUpserter(models.Submission) as submissions:
+        for canvasSubmission in canvasSubmissions:
+            try:
+                submissions.add(
+                    models.Submission.fromCanvasSubmission(canvasSubmission))
+            except TypeError as e:
+                errorCount += 1
+                metrics.count(errors=1)
+                LOGGER.warning(f'Error saving Submission: {e}')
+                LOGGER.debug(json.dumps(
+                    dictSkipKeys(canvasSubmission, ['_requester']),
+                    indent=2, default=str))
 
-    for canvasSubmission in canvasSubmissions:
-        try:
-            submission: models.Submission = \
-                models.Submission.fromCanvasSubmission(canvasSubmission)
-            LOGGER.debug(f'Saving {submission}…')
-            submission.save()
-        except TypeError as e:
-            LOGGER.warning(f'Error saving Submission: {e}')
-            LOGGER.debug(json.dumps(
-                dictSkipKeys(canvasSubmission, ['_requester']),
-                indent=2, default=str))
+    keyIndex.addSubmissions(submissions.savedKeys)
+    return errorCount + submissions.errorCount
 
 
+@metrics.phase('saveRubricAndCriteria')
 def saveRubricAndCriteria(canvasRubric: CanvasRubric,
-                          canvasAssignment: CanvasAssignment):
-    rubric = models.Rubric.fromCanvasRubricAndAssignment(canvasRubric,
-                                                         canvasAssignment)
-    LOGGER.debug(f'Saving {rubric}…')
-    rubric.save()
+                          canvasAssignment: CanvasAssignment,
+                          keyIndex: KeyIndex,
+                          savedRubricIds: Set[int]) -> int:
+    """
+    Link the assignment to its rubric, and save the rubric and its
+    criteria, unless they were saved for another assignment of the course
+    already.  Criteria no longer in the rubric are deleted, with
+    `config.PRUNE_DELETED`.
+
+    :param keyIndex: Index to which the IDs of criteria saved are added,
+        and from which those of criteria deleted are removed
+    :param savedRubricIds: IDs of the rubrics of the course saved so far,
+        to which the rubric is added once its criteria are saved
+    :return: Number of criteria that could not be saved
+    """
+    rubric = models.Rubric.fromCanvasRubric(canvasRubric)
+    if rubric.id in savedRubricIds:
+        saveRubricAssignment(canvasRubric, canvasAssignment)
+        metrics.count(rows_skipped=1)
+        metrics.countRows(models.Rubric._meta.db_table, unchanged=1)
+        return 0
 
-    criteria: Dict[int, models.Criterion] = {}
+    LOGGER.debug(f'Saving {rubric}…')
+    saveRow(rubric)
+    saveRubricAssignment(canvasRubric, canvasAssignment)
 
     '''
     Rubric objects always contain criteria in the `data` property, and also
     in the `criteria` property when assessments are requested.  Use `data`
     to ensure access to the criteria.
     '''
-    for canvasCriterion in canvasRubric.data:
-        criterion = models.Criterion.fromCanvasCriterionAndRubric(
-            CanvasCriteria(canvasCriterion), rubric)
-        LOGGER.debug(f'Saving {criterion}…')
-        criterion.save()
-        criteria[criterion.id] = criterion
-
-
+    criterionIds: Set[int] = set()
+    with BulkUpserter(models.Criterion) as criteria:
+        for canvasCriterion in canvasRubric.data:
+            criterion: models.Criterion = \
+                models.Criterion.fromCanvasCriterionAndRubric(
+                    CanvasCriteria(canvasCriterion), rubric)
+            criteria.add(criterion)
+            criterionIds.add(criterion.id)
+
+    keyIndex.addCriteria(criteria.savedKeys)
+    if config.PRUNE_DELETED:
+        pruneCriteria(rubric.id, criterionIds, keyIndex)
+    if criteria.errorCount == 0:
+        savedRubricIds.add(rubric.id)
+    return criteria.errorCount
+
+
+def saveRubricAssignment(canvasRubric: CanvasRubric,
+                         canvasAssignment: CanvasAssignment) -> None:
+    link: models.RubricAssignment = \
+        models.RubricAssignment.fromCanvasRubricAndAssignment(
+            canvasRubric, canvasAssignment)
+    LOGGER.debug(f'Saving {link}…')
+    saveRow(link)
+
+
+def logAssessmentError(assessment: models.Assessment,
+                       e: Exception) -> None:
+    """
+    Report an assessment that could not be saved, naming the object it
+    refers to that is missing from the DB.  These lookups only happen for
+    rows that failed, so they don't slow down the normal write path.
+    """
+    problemType: str | None = None
+    problemObjectId: int | None = None
+    if not Submission.objects.filter(id=assessment.submission_id).exists():
+        problemType = 'Submission'
+        problemObjectId = assessment.submission_id
+    elif not User.objects.filter(id=assessment.assessor_id).exists():
+        problemType = 'Assessor'
+        problemObjectId = assessment.assessor_id
+
+    if problemType is None:
+        LOGGER.warning(f'Error saving Assessment ({assessment.id}): {e}')
+    else:
+        LOGGER.warning(f'Error saving Assessment ({assessment.id}): '
+                       f'{problemType} ({problemObjectId}); {e}')
+
+
+@metrics.phase('saveAssessmentsAndComments')
 def saveAssessmentsAndComments(
-        canvasAssessments: List[CanvasAssessment]) -> None:
+        canvasAssessments: Iterable[dict], keyIndex: KeyIndex,
+        rejects: RejectReport, seenIds: Set[int] | None = None) -> int:
     """
-    Given a list of `CanvasAssessment` objects, save those that are
+    Given the assessments of a rubric, save those that are
     peer reviews.  When saving assessments, save their
     comments with the appropriate model.
 
-    :param canvasAssessments:
-    :return: None
+    Assessments are read one at a time, and written with their comments
+    in chunks of `config.DB_BATCH_SIZE` assessments, so assessments read
+    lazily, like `canvasStream.SpooledItems`, are never all in memory.
+    The comment batches depend on the assessment batches, so assessments
+    are always written before the comments that refer to them.  Comments
+    of the assessments saved that are no longer in Canvas are deleted
+    after each chunk.
+
+    Assessments and comments referring to rows not in `keyIndex` are added
+    to `rejects` instead of being written.  The comments of a rejected
+    assessment are skipped without being reported.
+
+    :param canvasAssessments: Assessments, as Canvas returns them
+    :param keyIndex: IDs of the rows that may be referred to
+    :param rejects: Report of the rows rejected
+    :param seenIds: Set to which the IDs of all of the assessments read
+        are added, if given, including those not saved
+    :return: Number of assessments and comments that could not be saved
     """
+    errorCount: int = 0
+    assessments: BulkUpserter[models.Assessment] = BulkUpserter(
+        models.Assessment, onError=logAssessmentError)
+    comments: BulkUpserter[models.Comment] = BulkUpserter(
+        models.Comment, dependsOn=[assessments])
+    commentIds: Dict[int, Set[int]] = {}
+
+    def flushChunk() -> None:
+        assessments.flush()
+        comments.flush()
+        deleteStaleComments({a: ids for a, ids in commentIds.items()
+                             if a not in assessments.failedKeys})
+        commentIds.clear()
+
     canvasAssessment: CanvasAssessment
-    for canvasAssessment in [CanvasAssessment(a) for a in
-                             canvasAssessments]:
+    for canvasAssessment in map(CanvasAssessment, canvasAssessments):
+        if seenIds is not None:
+            seenIds.add(canvasAssessment.id)
         if not canvasAssessment.isPeerReview:
             LOGGER.warning(f'Assessment ({canvasAssessment.id}) '
                            'is NOT a peer-review.')
             continue
 
-        assessment: models.Assessment | None = None
-        problemType: str | None = None
-        problemObjectId: int | None = None
-        problemException: str | None = None
-        try:
-            assessment = \
-                models.Assessment.fromCanvasAssessment(canvasAssessment)
-
-            if assessment is None:
-                continue
-
-            LOGGER.debug(f'Saving {assessment}…')
-            assessment.save()
-        except Submission.DoesNotExist as e:
-            problemType = 'Submission'
-            problemObjectId = canvasAssessment.submissionId
-            problemException = e
-        except User.DoesNotExist as e:
-            problemType = 'Assessor'
-            problemObjectId = canvasAssessment.assessorId
-            problemException = e
-        finally:
-            if problemType is not None:
-                LOGGER.warning(f'Error saving Assessment '
-                               f'({canvasAssessment.id}): '
-                               f'{problemType} ({problemObjectId}); '
-                               f'{problemException}')
-                LOGGER.debug('Assessment data: ' + json.dumps(
-                    dictSkipKeys(canvasAssessment, ['_requester']),
-                    indent=2, default=str))
-                continue
+        assessment: models.Assessment | None = \
+            models.Assessment.fromCanvasAssessment(canvasAssessment)
+
+        if assessment is None:
+            continue
 
-        canvasComment: CanvasComment
-        for canvasComment in [CanvasComment(c) for c in
-                              canvasAssessment.comments]:
+        field: str | None = keyIndex.checkAssessment(assessment)
+        if field is not None:
+            rejects.add(assessment, field)
+            errorCount += 1
+            continue
+
+        assessments.add(assessment)
+        commentIds[assessment.id] = set()
+
+        commentData: dict
+        for commentData in canvasAssessment.comments:
             try:
+                canvasComment: CanvasComment = CanvasComment(commentData)
                 comment: models.Comment = \
                     models.Comment.fromCanvasCommentAndAssessment(
                         canvasComment, assessment)
-                LOGGER.debug(f'Saving {comment}…')
-                comment.save()
+                field = keyIndex.checkComment(comment)
+                if field is not None:
+                    rejects.add(comment, field)
+                    errorCount += 1
+                    continue
+                comments.add(comment)
+                commentIds[assessment.id].add(comment.id)
             except TypeError as e:
-                LOGGER.warning(f'Error saving {comment}: {e}')
+                errorCount += 1
+                metrics.count(errors=1)
+                LOGGER.warning('Error saving Comment for Assessment '
+                               f'({assessment.id}): {e}')
 
+        if len(commentIds) >= config.DB_BATCH_SIZE:
+            flushChunk()
 
-def processCourseAssignments(canvasCourse: CanvasCourse):
-    courseSaved = False
+    flushChunk()
+    return errorCount + assessments.errorCount + comments.errorCount
 
-    canvasAssignments: List[CanvasAssignment] = \
-        canvasCourse.get_assignments()
 
-    canvasAssignment: CanvasAssignment
-    # Iterate over assignments which have peer reviews
-    for canvasAssignment in filter(
-            lambda a: a.peer_reviews is True, canvasAssignments):
-        LOGGER.debug(f'Found peer reviewed assignment '
-                     f'({canvasAssignment.id}): '
-                     f'"{canvasAssignment.name}"')
+def deleteStaleComments(commentIds: Dict[int, Set[int]]) -> int:
+    """
+    Delete the comments of assessments that are not among the comments
+    just saved for them, with one statement for each batch of assessments.
 
-        if not hasattr(canvasAssignment, 'rubric_settings'):
-            LOGGER.debug(f'Skipping Assignment ({canvasAssignment.id}): '
-                         'No rubric.')
-            continue
+    :param commentIds: IDs of the current comments, by assessment ID
+    :return: Number of comments deleted
+    """
+    deletedCount: int = 0
+    for assessmentIds in chunks(commentIds.keys(), config.DB_BATCH_SIZE):
+        currentIds: Set[int] = set().union(
+            *(commentIds[a] for a in assessmentIds))
+        deletedCount += countDeleted(
+            models.Comment.objects.filter(assessment_id__in=assessmentIds)
+            .exclude(id__in=currentIds).delete()[1])
 
-        assignmentRubricId: int | None = canvasAssignment.rubric_settings.get(
-            'id')
-        if assignmentRubricId is None:
-            raise ValueError('Rubric ID is null for '
-                             f'Assignment ({canvasAssignment.id}).')
-        LOGGER.debug(f'Assignment ({canvasAssignment.id}) has '
-                     f'rubric ID ({assignmentRubricId})')
-
-        canvasAssignmentRubric: CanvasRubric = canvasCourse.get_rubric(
-            assignmentRubricId, include='assessments', style='full')
-
-        if not hasattr(canvasAssignmentRubric, 'assessments'):
-            LOGGER.debug(f'Skipping assignment ({canvasAssignment.id}) in '
-                         f'course ({canvasCourse.id}): Not configured '
-                         f'for peer reviews ("assessments").')
-            continue
+    if deletedCount > 0:
+        LOGGER.debug(f'Deleted {deletedCount} comment(s) no longer in Canvas')
+    return deletedCount
+
+
+def fetchUsers(canvasCourse: CanvasCourse,
+               userIds: Set[int] | None = None) -> List[CanvasUser]:
+    """
+    Fetch users of a course all at once, so that fetching them is timed
+    apart from saving them.
+
+    :param userIds: IDs of the users to fetch, or `None` for all users
+    """
+    with metrics.phase('fetchUsers', canvasCourse.id):
+        return list(fetch_engine.getUsers(canvasCourse, userIds))
+
+
+def unknownUserIds(fetched: AssignmentFetch) -> Set[int]:
+    """
+    Find the submitters and peer reviewers in the fetched data that are
+    missing from the DB.  Those found in the DB are added to the user
+    cache, as another node may have saved them since it was seeded.
+    Assessors of other assessments aren't saved, and graders often aren't
+    in the course roster, so they would never be found, and users missing
+    from Canvas have no ID.
+
+    :param fetched: Data of an assignment that should be saved, so its
+        rubric and submissions were fetched
+    """
+    canvasRubric: CanvasRubric | None = fetched.canvas_rubric
+    canvasSubmissions: List[CanvasSubmission] | None = \
+        fetched.canvas_submissions
+    assert canvasRubric is not None and canvasSubmissions is not None
 
-        LOGGER.debug(f'Assignment ({canvasAssignment.id}) '
-                     f'in course ({canvasCourse.id}) is '
-                     'configured for peer reviews ("assessments")…')
+    userIds: Set[int] = {s.user_id for s in canvasSubmissions
+                         if s.user_id is not None} | \
+        reviewerIds(canvasRubric)
+    return user_cache.lookUp(userIds)
 
-        if len(canvasAssignmentRubric.assessments) == 0:
-            LOGGER.debug(
-                f'Skipping assignment ({canvasAssignment.id}) '
-                f'in course ({canvasCourse.id}): '
-                'No peer reviews ("assessments") were found.')
+
+def assignmentChanged(fetched: AssignmentFetch) -> bool:
+    updatedAt: datetime | None = getattr(
+        fetched.canvas_assignment, 'updated_at_date', None)
+    return fetched.since is None or updatedAt is None or \
+        updatedAt > fetched.since
+
+
+def processCourseAssignments(canvasCourse: CanvasCourse,
+                             full: bool = False,
+                             checkpoints: Checkpoints | None = None) \
+        -> RejectReport:
+    """
+    Save the peer reviewed assignments of a course, as they are fetched
+    by the configured fetch engine.
+
+    Unless `full` is true, assignments synced before are fetched
+    incrementally, starting from their last successful sync.  Once the
+    course has been synced, its roster is only fetched again if the new
+    data refers to unknown users.  With `config.DEMAND_LOADING`, only the
+    unknown users are fetched.
+
+    With `checkpoints`, assignments finished earlier in the run are
+    skipped, and those finished now are recorded.
+
+    With `config.PRUNE_DELETED`, once all of the assignments of the course
+    were listed, those no longer in Canvas are deleted.
+
+    :return: Report of the rows rejected for referring to unknown rows
+    """
+    rejects = RejectReport(canvasCourse.id)
+    listedIds: Set[int] = set()
+    keyIndex: KeyIndex | None = None
+    savedRubricIds: Set[int] = set()
+    courseSaved = False
+    usersSaved = False
+
+    syncedAt: Dict[int, datetime] = {} if full else dict(
+        models.SyncState.objects.filter(course_id=canvasCourse.id)
+        .values_list('assignment_id', 'synced_at'))
+
+    finishedIds: Set[int] = set() if checkpoints is None else \
+        checkpoints.finishedAssignmentIds(canvasCourse.id)
+    if len(finishedIds) > 0:
+        LOGGER.info(f'Skipping {len(finishedIds)} assignment(s) of course '
+                    f'({canvasCourse.id}) finished before resuming')
+
+    # Time waiting for assignments that are still being fetched.
+    fetched: AssignmentFetch
+    for fetched in metrics.timed(
+            fetch_engine.fetchAssignments(canvasCourse, syncedAt,
+                                          finishedIds, listedIds),
+            'waitForFetch', canvasCourse.id):
+        if fetched.canvas_rubric is None or \
+                fetched.canvas_submissions is None:
+            if checkpoints is not None:
+                checkpoints.finishAssignment(canvasCourse.id,
+                                             fetched.canvas_assignment.id)
             continue
 
+        canvasAssignment: CanvasAssignment = fetched.canvas_assignment
         LOGGER.info(f'Assignment ({canvasAssignment.id}) '
                     f'in course ({canvasCourse.id}) has '
                     'peer reviews ("assessments")…')
 
-        course: Optional[models.Course] = None
         if not courseSaved:
-            saveCourseAndUsers(canvasCourse)
+            saveCourse(canvasCourse)
             courseSaved = True
-
-        assignment: models.Assignment = \
-            models.Assignment.fromCanvasAssignment(canvasAssignment)
+            keyIndex = KeyIndex(canvasCourse.id).load()
+
+        # Always looked up, so the users of the assignment that other nodes
+        # saved are added to the user cache in batches before the
+        # assessments are checked.
+        userIds: Set[int] = unknownUserIds(fetched)
+        if config.DEMAND_LOADING:
+            if len(userIds) > 0:
+                LOGGER.debug(f'Saving {len(userIds)} user(s) of '
+                             f'course ({canvasCourse.id})…')
+                saveUsers(fetchUsers(canvasCourse, userIds))
+        elif not usersSaved and (len(syncedAt) == 0 or len(userIds) > 0):
+            LOGGER.debug(f'Saving users of course ({canvasCourse.id})…')
+            saveUsers(fetchUsers(canvasCourse))
+            usersSaved = True
+
+        with metrics.phase('saveAssignment', canvasCourse.id,
+                           canvasAssignment.id):
+            saveAssignment(canvasCourse, fetched, keyIndex, rejects,
+                           savedRubricIds, checkpoints)
+
+    if config.PRUNE_DELETED:
+        with transaction.atomic():
+            pruneAssignments(canvasCourse.id, listedIds)
+
+    return rejects
+
+
+@transaction.atomic
+def saveAssignment(canvasCourse: CanvasCourse, fetched: AssignmentFetch,
+                   keyIndex: KeyIndex, rejects: RejectReport,
+                   savedRubricIds: Set[int],
+                   checkpoints: Checkpoints | None = None) -> int:
+    """
+    Save an assignment with its submissions, rubric, criteria, assessments
+    and comments, and update its sync state, in one transaction.  With
+    `config.PRUNE_DELETED`, its rows no longer in Canvas are then deleted
+    (see `pruneAssignment()`), in the same transaction.  Rows that fail
+    are rolled back to a savepoint and reported, but an unexpected error
+    rolls back the whole assignment, so it's never left half written.
+    Such an error also ends the sync of the course, so rubrics in
+    `savedRubricIds` are never rolled back.
+
+    The assignment is finished in `checkpoints`, if given, in the same
+    transaction, even if some rows were rejected, as resuming the run
+    wouldn't save them either.
+
+    :return: Number of rows that could not be saved
+    """
+    canvasAssignment: CanvasAssignment = fetched.canvas_assignment
+    canvasRubric: CanvasRubric | None = fetched.canvas_rubric
+    canvasSubmissions: List[CanvasSubmission] | None = \
+        fetched.canvas_submissions
+    assert canvasRubric is not None and canvasSubmissions is not None
+
+    assignment: models.Assignment = \
+        models.Assignment.fromCanvasAssignment(canvasAssignment)
+    if assignmentChanged(fetched):
         LOGGER.debug(f'Saving {assignment}…')
-        assignment.save()
+        saveRow(assignment)
+    else:
+        metrics.count(rows_skipped=1)
+        metrics.countRows(models.Assignment._meta.db_table, unchanged=1)
 
-        LOGGER.debug(f'Saving submissions for {assignment}…')
-        saveSubmissions(canvasAssignment)
+    errorCount: int = 0
 
-        LOGGER.debug(f'Saving rubric and criteria for {assignment}…')
-        saveRubricAndCriteria(canvasAssignmentRubric, canvasAssignment)
+    LOGGER.debug(f'Saving submissions for {assignment}…')
+    errorCount += saveSubmissions(canvasSubmissions, keyIndex)
 
-        LOGGER.debug(f'Saving assessments and comments for {assignment}…')
-        saveAssessmentsAndComments(canvasAssignmentRubric.assessments)
+    LOGGER.debug(f'Saving rubric and criteria for {assignment}…')
+    errorCount += saveRubricAndCriteria(canvasRubric, canvasAssignment,
+                                        keyIndex, savedRubricIds)
 
+    LOGGER.debug(f'Saving assessments and comments for {assignment}…')
+    assessmentIds: Set[int] = set()
+    errorCount += saveAssessmentsAndComments(
+        canvasRubric.assessments, keyIndex, rejects, assessmentIds)
 
-def main() -> None:
-    timeStart: datetime = datetime.now(tz=utc)
-    LOGGER.info(f'Start time: {timeStart.isoformat(timespec="milliseconds")}')
+    if config.PRUNE_DELETED:
+        pruneAssignment(fetched, assessmentIds, keyIndex)
+
+    if checkpoints is not None:
+        checkpoints.finishAssignment(canvasCourse.id, assignment.id)
+
+    if errorCount > 0:
+        LOGGER.info(f'Not updating sync state of {assignment}: '
+                    f'{errorCount} row(s) could not be saved.')
+        return errorCount
+
+    models.SyncState(assignment_id=assignment.id,
+                     course_id=canvasCourse.id,
+                     synced_at=fetched.fetched_at).save()
+    metrics.count(rows_written=1)
+    return errorCount
 
-    LOGGER.debug(f'COURSE_IDS_CSV = "{config.COURSE_IDS_CSV}"')
-    LOGGER.info(f'Processing courses: ({", ".join(config.COURSE_IDS)})')
 
-    courseId: str
-    canvasCourse: CanvasCourse
-    for courseId in config.COURSE_IDS:
+@dataclass
+class CourseResult:
+    course_id: str
+    status: str = COURSE_SUCCEEDED
+    error: str | None = None
+    elapsed: timedelta = timedelta()
+    reject_count: int = 0
+
+
+def processCourse(courseId: str, full: bool = False,
+                  checkpoints: Checkpoints | None = None) -> CourseResult:
+    """
+    Process one course, catching any error so that it doesn't stop the
+    other courses.  This runs in a worker thread, which gets its own DB
+    connection from Django.  The connection is closed before returning,
+    so that idle workers don't hold connections open.
+
+    :param courseId: Canvas course ID
+    :param full: Fetch all data, ignoring the state of earlier syncs
+    :param checkpoints: Checkpoints of the run, if any.  The course is
+        skipped if it was finished before, and finished if it succeeds
+        or isn't found.
+    :return: `CourseResult` describing the outcome
+    """
+    result = CourseResult(courseId)
+    timeStart: datetime = datetime.now(tz=utc)
+
+    # The course phase's own time is spent outside the phases in it.
+    with metrics.phase('course', int(courseId)):
         try:
-            canvasCourse = canvas.get_course(courseId)
+            if checkpoints is not None and \
+                    checkpoints.isCourseFinished(int(courseId)):
+                LOGGER.info(f'Skipping course ({courseId}): finished '
+                            'before resuming')
+                result.status = COURSE_SKIPPED
+                return result
+
+            with metrics.phase('fetchCourse'):
+                canvasCourse: CanvasCourse = canvas.get_course(courseId)
+
+            LOGGER.info(f'Checking course ({canvasCourse.id}): '
+                        f'"{canvasCourse.name}"…')
+            rejects: RejectReport = processCourseAssignments(
+                canvasCourse, full, checkpoints)
+            result.reject_count = len(rejects)
+            if len(rejects) > 0:
+                LOGGER.warning(str(rejects))
+            if checkpoints is not None:
+                checkpoints.finishCourse(canvasCourse.id)
         except canvasApiExceptions.ResourceDoesNotExist:
             LOGGER.warning(f'Course ID ({courseId}) not found.')
-            continue
+            result.status = COURSE_NOT_FOUND
+            if checkpoints is not None:
+                checkpoints.finishCourse(int(courseId))
+        except Exception as e:
+            LOGGER.exception(f'Error processing course ({courseId}): {e}')
+            metrics.count(errors=1)
+            result.status = COURSE_FAILED
+            result.error = f'{e.__class__.__name__}: {e}'
+        finally:
+            connections.close_all()
+
+    result.elapsed = datetime.now(tz=utc) - timeStart
+    return result
+
+
+def processQueue(queue: WorkQueue, full: bool,
+                 checkpoints: Checkpoints) -> List[CourseResult]:
+    """
+    Process the courses claimed from a queue, one by one, until there are
+    none left to claim.  This runs in each worker thread.
+
+    If the queue can't be updated, the thread stops.  The lease of a
+    course it couldn't release expires, and the course is claimed again,
+    skipping the assignments finished before.
+    """
+    results: List[CourseResult] = []
+    try:
+        while (item := queue.claim()) is not None:
+            result: CourseResult = processCourse(str(item.course_id), full,
+                                                 checkpoints)
+            results.append(result)
+            queue.complete(item, result.status != COURSE_FAILED)
+    except DatabaseError as e:
+        LOGGER.exception(f'Error updating the work queue: {e}')
+        metrics.count(errors=1)
+    finally:
+        connections.close_all()
+    return results
+
+
+def logCourseResults(results: List[CourseResult]) -> None:
+    LOGGER.info('Course summary:')
+    for result in results:
+        LOGGER.info(f'Course ({result.course_id}): {result.status} '
+                    f'in {result.elapsed}' +
+                    (f'; {result.reject_count} row(s) rejected'
+                     if result.reject_count else '') +
+                    (f'; {result.error}' if result.error else ''))
+
+    statusCounts: Counter = Counter(r.status for r in results)
+    LOGGER.info('Courses ' + ', '.join(
+        f'{status}: {count}' for status, count in statusCounts.items()))
+
+
+def logPhases() -> None:
+    LOGGER.info('Phase summary:')
+    for name, stats in sorted(metrics.byPhase().items(),
+                              key=lambda i: -i[1].seconds):
+        LOGGER.info(f'{name}: {stats.seconds:.3f} s in {stats.count} '
+                    f'run(s); {stats.api_calls} API call(s), '
+                    f'{stats.bytes} byte(s), {stats.retries} retry(ies); '
+                    f'{stats.rows_written} row(s) written, '
+                    f'{stats.rows_skipped} skipped, '
+                    f'{stats.rows_deleted} deleted; {stats.errors} error(s)')
+
+
+def logRowCounts() -> None:
+    LOGGER.info('Row summary:')
+    for table, stats in metrics.rowsByTable().items():
+        LOGGER.info(f'{table}: {stats.inserted} inserted, {stats.updated} '
+                    f'updated, {stats.unchanged} unchanged, {stats.deleted} '
+                    'deleted')
+
+
+def writeRunReport(path: str, results: List[CourseResult], full: bool,
+                   timeStart: datetime, timeEnd: datetime,
+                   checkpoints: Checkpoints) -> None:
+    """
+    Save a JSON report of the run, with the outcome of each course and the
+    statistics of each phase, by course and assignment.
+    """
+    report: dict = {
+        'runId': checkpoints.run.id,
+        'runStartTime': checkpoints.run.started_at.isoformat(),
+        'startTime': timeStart.isoformat(),
+        'endTime': timeEnd.isoformat(),
+        'elapsedSeconds': (timeEnd - timeStart).total_seconds(),
+        'syncMode': 'full' if full else 'incremental',
+        'fetchEngine': config.FETCH_ENGINE,
+        'courses': [{**asdict(r), 'elapsed': r.elapsed.total_seconds()}
+                    for r in results],
+        'canvas': {'retries': canvas_scheduler.retries,
+                   'throttled': canvas_scheduler.throttled},
+        'phases': metrics.report(),
+        'rows': {table: asdict(stats)
+                 for table, stats in metrics.rowsByTable().items()},
+    }
+    if canvas_cache is not None:
+        report['canvas'].update({'cacheHits': canvas_cache.hits,
+                                 'cacheRevalidations':
+                                     canvas_cache.revalidations,
+                                 'cacheMisses': canvas_cache.misses})
+
+    writeFileAtomically(path, json.dumps(report, indent=2) + '\n')
+    LOGGER.info(f'Saved run report to {path}')
+
+
+def writeMetricsTextfile(path: str, results: List[CourseResult],
+                         timeStart: datetime, timeEnd: datetime) -> None:
+    """
+    Save the metrics of the run in the Prometheus text format.
+    """
+    lines: List[str] = metrics.prometheusLines()
+    lines.extend(prometheusGauge(
+        'course_seconds', 'Seconds taken to process the course',
+        [({'course': r.course_id}, r.elapsed.total_seconds())
+         for r in results]))
+    lines.extend(prometheusGauge(
+        'course_status', 'Outcome of the course (1 for the current one)',
+        [({'course': r.course_id, 'status': status},
+          int(r.status == status)) for r in results
+         for status in (COURSE_SUCCEEDED, COURSE_FAILED, COURSE_NOT_FOUND,
+                        COURSE_SKIPPED)]))
+    lines.extend(prometheusGauge(
+        'course_rejects', 'Rows rejected for referring to unknown rows',
+        [({'course': r.course_id}, r.reject_count) for r in results]))
+    lines.extend(prometheusGauge(
+        'table_rows',
+        'Rows of the table inserted, updated, unchanged or deleted',
+        [({'table': table, 'change': change}, getattr(stats, change))
+         for table, stats in metrics.rowsByTable().items()
+         for change in ('inserted', 'updated', 'unchanged', 'deleted')]))
+    lines.extend(prometheusGauge(
+        'run_seconds', 'Seconds taken by the run',
+        [({}, (timeEnd - timeStart).total_seconds())]))
+    lines.extend(prometheusGauge(
+        'run_end_timestamp_seconds', 'Time the run ended',
+        [({}, timeEnd.timestamp())]))
+
+    writeFileAtomically(path, '\n'.join(lines) + '\n')
+    LOGGER.info(f'Saved metrics to {path}')
+
+
+def main(full: bool = False, resume: bool = False, enqueue: bool = False,
+         worker: bool = False) -> None:
+    """
+    :param full: Fetch all data, ignoring the state of earlier syncs
+    :param resume: Resume the last run, if it didn't finish, skipping the
+        courses and assignments it finished
+    :param enqueue: Queue the courses of the run in the DB for nodes
+        running with `worker`, instead of processing them
+    :param worker: Process the courses queued for the last unfinished run,
+        along with any other nodes doing so, until none are left
+    """
+    try:
+        sync(full, resume, enqueue, worker)
+    finally:
+        # The fetch engine is made when this module is loaded, and used
+        # by every course, so it's closed when the run ends.
+        fetch_engine.close()
 
-        LOGGER.info(f'Checking course ({canvasCourse.id}): '
-                    f'"{canvasCourse.name}"…')
-        processCourseAssignments(canvasCourse)
+
+def sync(full: bool, resume: bool, enqueue: bool, worker: bool) -> None:
+    """
+    Run a sync, as described by `main()`.
+    """
+    timeStart: datetime = datetime.now(tz=utc)
+    LOGGER.info(f'Start time: {timeStart.isoformat(timespec="milliseconds")}')
+
+    queue: WorkQueue | None = None
+    if worker and not enqueue:
+        run: models.SyncRun | None = queuedRun()
+        if run is None:
+            LOGGER.info('No run has courses queued; nothing to do')
+            return
+        LOGGER.info(f'Working on the courses queued for {run}')
+        checkpoints: Checkpoints = Checkpoints(run)
+    else:
+        checkpoints = Checkpoints.start(full, resume)
+    full = checkpoints.run.full
+
+    metrics.reset()
+    runCourseIds: List[str] = []
+    if enqueue or not worker:
+        LOGGER.debug(f'COURSE_IDS_CSV = "{config.COURSE_IDS_CSV}"')
+        runCourseIds = courseIds()
+    if enqueue or worker:
+        queue = WorkQueue(checkpoints.run)
+        if enqueue:
+            queue.enqueue(int(c) for c in runCourseIds)
+            if not worker:
+                return
+
+    if queue is None:
+        LOGGER.info(f'Processing courses: ({", ".join(runCourseIds)}) '
+                    f'with {config.COURSE_CONCURRENCY} worker(s)')
+    else:
+        LOGGER.info(f'Processing queued courses as {queue.workerId} '
+                    f'with {config.COURSE_CONCURRENCY} worker(s)')
+    LOGGER.info('Sync mode: ' + ('full' if full else 'incremental'))
+
+    user_cache.seed()
+
+    with ThreadPoolExecutor(max_workers=config.COURSE_CONCURRENCY,
+                            thread_name_prefix='course') as executor:
+        if queue is None:
+            results: List[CourseResult] = list(
+                executor.map(partial(processCourse, full=full,
+                                     checkpoints=checkpoints),
+                             runCourseIds))
+        else:
+            with queue:
+                results = list(chain.from_iterable(executor.map(
+                    lambda _: processQueue(queue, full, checkpoints),
+                    range(config.COURSE_CONCURRENCY))))
+
+    logCourseResults(results)
+
+    failedCount: int = sum(r.status == COURSE_FAILED for r in results)
+    if queue is None and failedCount == 0 or \
+            queue is not None and queue.isFinished():
+        checkpoints.finish()
+    if failedCount > 0:
+        LOGGER.warning(f'{failedCount} course(s) failed; run again with ' +
+                       ('"--resume"' if queue is None else
+                        '"--enqueue --resume"') +
+                       f' to retry them, continuing {checkpoints}')
+
+    LOGGER.info(f'User writes: {user_cache}')
+    LOGGER.info(f'Canvas rate limit scheduler: {canvas_scheduler}')
+    if canvas_cache is not None:
+        LOGGER.info(f'Canvas response cache: {canvas_cache}')
 
     timeEnd: datetime = datetime.now(tz=utc)
     timeElapsed: timedelta = timeEnd - timeStart
 
+    logPhases()
+    logRowCounts()
+    if config.RUN_REPORT_FILE:
+        writeRunReport(config.RUN_REPORT_FILE, results, full, timeStart,
+                       timeEnd, checkpoints)
+    if config.METRICS_TEXTFILE:
+        writeMetricsTextfile(config.METRICS_TEXTFILE, results, timeStart,
+                             timeEnd)
+
     LOGGER.info(f'End time: {timeEnd.isoformat(timespec="milliseconds")}')
     LOGGER.info(f'Elapsed time: {timeElapsed}')
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from peer_review_data.export import (
+    exportCourses,
+    FORMAT_NDJSON,
+    FORMAT_PARQUET,
+    FORMATS,
+    PARQUET_AVAILABLE,
+    SOURCE_DB,
+    SOURCES
+)
+
+
+class Command(BaseCommand):
+    """
+    Django management command used to export the peer review data of the
+    configured courses to files partitioned by table and course.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            'output', help='Directory where the files are written.')
+        parser.add_argument(
+            '--format', dest='formats', action='append', choices=FORMATS,
+            help='Format of the files.  May be given more than once.  '
+                 f'Defaults to "{FORMAT_NDJSON}".  "parquet" requires the '
+                 '"pyarrow" package.')
+        parser.add_argument(
+            '--source', choices=SOURCES, default=SOURCE_DB,
+            help='Export the data saved in the DB, or fetch it from '
+                 f'Canvas without using the DB.  Defaults to "{SOURCE_DB}".')
+
+    def handle(self, *args, **options) -> None:
+        formats: list[str] = options['formats'] or [FORMAT_NDJSON]
+        if FORMAT_PARQUET in formats and not PARQUET_AVAILABLE:
+            raise CommandError('Exporting to Parquet requires the "pyarrow" '
+                               'package: `pip install pyarrow`')
+        exportCourses(options['output'], formats, options['source'])
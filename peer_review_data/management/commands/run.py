@@ -10,5 +10,28 @@ class Command(BaseCommand):
     in the main module.
     """
 
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Fetch and save all data, instead of only what changed '
+                 'in Canvas since the last successful sync.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Resume the last run if it did not finish, e.g., because '
+                 'it failed or was stopped, skipping the courses and '
+                 'assignments it finished.  Otherwise, start a new run.')
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Queue the courses of the run in the DB, to be processed '
+                 'by nodes running with --worker, instead of processing '
+                 'them.  With --resume, the courses that failed are '
+                 'queued again.')
+        parser.add_argument(
+            '--worker', action='store_true',
+            help='Process the courses queued for the last unfinished run, '
+                 'sharing them with the other nodes doing so, until none '
+                 'are left.  With --enqueue, queue the courses first.')
+
     def handle(self, *args, **options) -> None:
-        main()
+        main(full=options['full'], resume=options['resume'],
+             enqueue=options['enqueue'], worker=options['worker'])
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.17 on 2026-10-18 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('assignment',
+                 models.OneToOneField(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     primary_key=True, serialize=False,
+                     to='peer_review_data.assignment')),
+                ('synced_at', models.DateTimeField()),
+                ('course',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                   to='peer_review_data.course')),
+            ],
+            options={
+                'db_table': 'sync_state',
+            },
+        ),
+    ]
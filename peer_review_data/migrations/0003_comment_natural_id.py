@@ -0,0 +1,90 @@
+# Generated by Django 3.2.17 on 2026-10-18 06:36
+
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+from django.db import migrations, models
+from django.db.models import Case, Max, Value, When
+
+# Number of comments rekeyed with each statement
+BATCH_SIZE: int = 1000
+
+
+def naturalId(assessmentId: int, criterionId: int, comments: str) -> int:
+    """
+    Copy of `Comment.naturalId()` when this migration was written.
+    """
+    digest: bytes = hashlib.blake2b(
+        f'{assessmentId}\n{criterionId}\n{comments}'.encode('utf-8'),
+        digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+def rekeyComments(apps, schemaEditor):
+    """
+    Give existing comments IDs derived from their natural keys.  Earlier
+    runs saved a new copy of every comment each time, so all but one copy
+    of each comment are deleted.
+
+    Comments are read in batches of `BATCH_SIZE`, in ID order, and each
+    batch is rekeyed with one `UPDATE … CASE` statement, and its copies
+    deleted with one `DELETE`, so neither memory use nor the number of
+    statements grows with the number of comments.  Only IDs up to the
+    largest one before rekeying are read, so rekeyed comments aren't read
+    again, and copies are found among the comments of the batch and those
+    already rekeyed.
+    """
+    Comment = apps.get_model('peer_review_data', 'Comment')
+
+    maxOldId: int = Comment.objects.aggregate(Max('id'))['id__max'] or 0
+    lastId: int = 0
+    while True:
+        rows: List[Tuple[int, int, int, str]] = list(
+            Comment.objects.filter(id__gt=lastId, id__lte=maxOldId)
+            .order_by('id').values_list(
+                'id', 'assessment_id', 'criterion_id', 'comments')
+            [:BATCH_SIZE])
+        if len(rows) == 0:
+            return
+        lastId = rows[-1][0]
+
+        # Comments that have their new ID already are kept as they are.
+        newIds: Dict[int, int] = {}
+        for oldId, assessmentId, criterionId, comments in rows:
+            newId: int = naturalId(assessmentId, criterionId, comments)
+            if newId != oldId:
+                newIds[oldId] = newId
+
+        existingIds: Set[int] = set(
+            Comment.objects.filter(id__in=set(newIds.values()))
+            .values_list('id', flat=True))
+        keptIds: Dict[int, int] = {}
+        copyIds: List[int] = []
+        for oldId, newId in newIds.items():
+            if newId in existingIds or newId in keptIds:
+                copyIds.append(oldId)
+            else:
+                keptIds[newId] = oldId
+
+        if len(copyIds) > 0:
+            Comment.objects.filter(id__in=copyIds).delete()
+        if len(keptIds) > 0:
+            Comment.objects.filter(id__in=keptIds.values()).update(id=Case(
+                *(When(id=oldId, then=Value(newId))
+                  for newId, oldId in keptIds.items()),
+                output_field=models.BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0002_syncstate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(rekeyComments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.17 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def linkRubrics(apps, schemaEditor):
+    """
+    Link each rubric to the assignment it was saved with.  When a rubric
+    was shared, only the assignment saved last was kept; the next sync
+    links the others.
+    """
+    Rubric = apps.get_model('peer_review_data', 'Rubric')
+    RubricAssignment = apps.get_model('peer_review_data', 'RubricAssignment')
+    RubricAssignment.objects.bulk_create(
+        (RubricAssignment(assignment_id=assignmentId, rubric_id=rubricId)
+         for rubricId, assignmentId in
+         Rubric.objects.values_list('id', 'assignment_id').iterator()),
+        batch_size=1000)
+
+
+def unlinkRubrics(apps, schemaEditor):
+    """
+    Keep one of the assignments of each rubric, which is all the old
+    schema can hold.
+    """
+    Rubric = apps.get_model('peer_review_data', 'Rubric')
+    RubricAssignment = apps.get_model('peer_review_data', 'RubricAssignment')
+    for assignmentId, rubricId in RubricAssignment.objects.values_list(
+            'assignment_id', 'rubric_id').iterator():
+        Rubric.objects.filter(id=rubricId).update(assignment_id=assignmentId)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0003_comment_natural_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RubricAssignment',
+            fields=[
+                ('assignment',
+                 models.OneToOneField(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     primary_key=True, serialize=False,
+                     to='peer_review_data.assignment')),
+                ('rubric',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                   to='peer_review_data.rubric')),
+            ],
+            options={
+                'db_table': 'rubric_assignment',
+            },
+        ),
+        # Nullable while the links are copied, so it can be added back
+        # empty when the migration is reversed.
+        migrations.AlterField(
+            model_name='rubric',
+            name='assignment',
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE,
+                to='peer_review_data.assignment'),
+        ),
+        migrations.RunPython(linkRubrics, unlinkRubrics),
+        migrations.RemoveField(
+            model_name='rubric',
+            name='assignment',
+        ),
+        migrations.AddField(
+            model_name='rubric',
+            name='assignments',
+            field=models.ManyToManyField(
+                related_name='rubrics',
+                through='peer_review_data.RubricAssignment',
+                to='peer_review_data.Assignment'),
+        ),
+    ]
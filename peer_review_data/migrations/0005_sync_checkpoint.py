@@ -0,0 +1,45 @@
+# Generated by Django 3.2.17 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0004_rubric_assignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('full', models.BooleanField()),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'sync_run',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('course_id', models.IntegerField()),
+                ('assignment_id', models.IntegerField(null=True)),
+                ('finished_at', models.DateTimeField()),
+                ('run',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                   to='peer_review_data.syncrun')),
+            ],
+            options={
+                'db_table': 'sync_checkpoint',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='synccheckpoint',
+            index=models.Index(fields=['run', 'course_id'],
+                               name='sync_checkpoint_course'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.17 on 2026-10-18 07:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0005_sync_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkItem',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('course_id', models.IntegerField()),
+                ('status',
+                 models.CharField(default='pending', max_length=16)),
+                ('worker', models.CharField(max_length=255, null=True)),
+                ('lease_expires_at', models.DateTimeField(null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                   to='peer_review_data.syncrun')),
+            ],
+            options={
+                'db_table': 'work_item',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['run', 'status'],
+                               name='work_item_status'),
+        ),
+        migrations.AddConstraint(
+            model_name='workitem',
+            constraint=models.UniqueConstraint(fields=('run', 'course_id'),
+                                               name='work_item_course'),
+        ),
+    ]
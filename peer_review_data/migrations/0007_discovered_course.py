@@ -0,0 +1,27 @@
+# Generated by Django 3.2.17 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0006_work_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscoveredCourse',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('term_id', models.IntegerField(null=True)),
+                ('student_count', models.IntegerField(null=True)),
+                ('assignment_count', models.IntegerField(null=True)),
+                ('discovered_at', models.DateTimeField()),
+                ('checked_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'discovered_course',
+            },
+        ),
+    ]
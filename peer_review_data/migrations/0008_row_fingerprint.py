@@ -0,0 +1,57 @@
+# Generated by Django 3.2.17 on 2026-10-18 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('peer_review_data', '0007_discovered_course'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessment',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='criterion',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='rubric',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='rubricassignment',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+    ]
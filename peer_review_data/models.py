@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
-from typing import Self
+from datetime import datetime
+from typing import List, Self
 
 from django.db import models
+from django.db.models import Field
 
 from canvasData import (
     CanvasAssessment,
@@ -14,17 +17,55 @@ from canvasData import (
     CanvasSubmission,
     CanvasUser
 )
+from utils import fingerprint
 
 LOGGER = logging.getLogger(__name__)
 
+# Name of the field of `Fingerprinted` models holding their fingerprint
+FINGERPRINT_FIELD: str = 'fingerprint'
 
-class Course(models.Model):
+
+def fingerprintField() -> models.CharField:
+    """
+    Field holding a row's fingerprint, declared last in each `Fingerprinted`
+    model, so the fields given to the model's constructor keep their
+    order.
+    """
+    return models.CharField(max_length=32, null=True)
+
+
+class Fingerprinted(models.Model):
+    """
+    Model whose rows hold a fingerprint of their other fields, so that
+    `BulkUpserter` writes only the rows that are new or changed.  Rows
+    saved before fingerprints were kept have none, so they're written once
+    more.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def dataFields(cls) -> List[Field]:
+        """
+        :return: Concrete fields of the model other than its fingerprint
+        """
+        return [f for f in cls._meta.concrete_fields
+                if f.name != FINGERPRINT_FIELD]
+
+    def rowFingerprint(self) -> str:
+        return fingerprint(getattr(self, f.attname)
+                           for f in self.dataFields())
+
+
+class Course(Fingerprinted):
     class Meta:
         db_table = 'course'
 
     id = models.IntegerField(primary_key=True)
     name = models.TextField()
     course_code = models.TextField()
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasCourse(cls, c: CanvasCourse) -> Self:
@@ -34,7 +75,7 @@ class Course(models.Model):
         return f'{self.__class__.__name__} ({self.id}): "{self.course_code}"'
 
 
-class User(models.Model):
+class User(Fingerprinted):
     class Meta:
         db_table = 'user'
 
@@ -42,6 +83,7 @@ class User(models.Model):
     name = models.TextField()
     sortable_name = models.TextField()
     login_id = models.TextField()
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasUser(cls, u: CanvasUser) -> Self:
@@ -51,13 +93,14 @@ class User(models.Model):
         return f'{self.__class__.__name__} ({self.id}): "{self.login_id}"'
 
 
-class Assignment(models.Model):
+class Assignment(Fingerprinted):
     class Meta:
         db_table = 'assignment'
 
     id = models.IntegerField(primary_key=True)
     name = models.TextField()
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasAssignment(cls, a: CanvasAssignment) -> Self:
@@ -67,25 +110,55 @@ class Assignment(models.Model):
         return f'{self.__class__.__name__} ({self.id}): "{self.name}"'
 
 
-class Rubric(models.Model):
+class Rubric(Fingerprinted):
+    """
+    Instructors often use one rubric for several assignments, so a rubric
+    is linked to its assignments through `RubricAssignment`.
+    """
+
     class Meta:
         db_table = 'rubric'
 
     id = models.IntegerField(primary_key=True)
     title = models.TextField()
-    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
+    assignments = models.ManyToManyField(
+        Assignment, through='RubricAssignment', related_name='rubrics')
+    fingerprint = fingerprintField()
+
+    @classmethod
+    def fromCanvasRubric(cls, r: CanvasRubric) -> Self:
+        return cls(r.id, r.title)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.id}): "{self.title}"'
+
+
+class RubricAssignment(Fingerprinted):
+    """
+    Link of an assignment to the rubric it uses.  An assignment uses only
+    one rubric at a time, so the assignment is the key, and the link is
+    updated if the assignment changes rubrics.
+    """
+
+    class Meta:
+        db_table = 'rubric_assignment'
+
+    assignment = models.OneToOneField(Assignment, on_delete=models.CASCADE,
+                                      primary_key=True)
+    rubric = models.ForeignKey(Rubric, on_delete=models.CASCADE)
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasRubricAndAssignment(cls, r: CanvasRubric,
                                       a: CanvasAssignment) -> Self:
-        return cls(r.id, r.title, a.id)
+        return cls(assignment_id=a.id, rubric_id=r.id)
 
     def __str__(self) -> str:
-        return f'{self.__class__.__name__} ({self.id}): "{self.title}" ' \
-               f'({self.assignment})'
+        return f'{self.__class__.__name__} ({self.assignment_id}): ' \
+               f'Rubric ({self.rubric_id})'
 
 
-class Criterion(models.Model):
+class Criterion(Fingerprinted):
     class Meta:
         db_table = 'criterion'
 
@@ -94,6 +167,7 @@ class Criterion(models.Model):
     long_description = models.TextField()
     rubric = models.ForeignKey(Rubric, on_delete=models.CASCADE,
                                related_name='criteria')
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasCriterionAndRubric(
@@ -105,13 +179,14 @@ class Criterion(models.Model):
                f'"{self.description}" ({self.rubric})'
 
 
-class Submission(models.Model):
+class Submission(Fingerprinted):
     class Meta:
         db_table = 'submission'
 
     id = models.IntegerField(primary_key=True)
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasSubmission(cls, s: CanvasSubmission) -> Self:
@@ -122,13 +197,14 @@ class Submission(models.Model):
                f'({self.assignment}; {self.user})'
 
 
-class Assessment(models.Model):
+class Assessment(Fingerprinted):
     class Meta:
         db_table = 'assessment'
 
     id = models.IntegerField(primary_key=True)
     assessor = models.ForeignKey(User, on_delete=models.CASCADE)
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    fingerprint = fingerprintField()
 
     @classmethod
     def fromCanvasAssessment(cls, a: CanvasAssessment) -> Self:
@@ -144,27 +220,172 @@ class Assessment(models.Model):
                f'({self.assessor}; {self.submission})'
 
 
-class Comment(models.Model):
+class Comment(Fingerprinted):
     """
     Strictly speaking, this should be `AssessmentComment`.  This app will
     probably never process any other kind of comment, though, so we'll use
     a short name here for brevity.
+
+    Canvas does not give unique IDs for each comment!  The ID is derived
+    from the comment's natural key (assessment, criterion and text), so
+    saving the same comment again updates the same row.
     """
 
     class Meta:
         db_table = 'comment'
 
-    # Canvas does not give unique IDs for each comment!
-    id = models.AutoField(primary_key=True)
+    id = models.BigIntegerField(primary_key=True)
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE)
     criterion = models.ForeignKey(Criterion, on_delete=models.CASCADE)
     comments = models.TextField()
+    fingerprint = fingerprintField()
+
+    @staticmethod
+    def naturalId(assessmentId: int, criterionId: int, comments: str) -> int:
+        """
+        Hash the natural key of a comment into a positive 63-bit integer.
+        """
+        digest: bytes = hashlib.blake2b(
+            f'{assessmentId}\n{criterionId}\n{comments}'.encode('utf-8'),
+            digest_size=8).digest()
+        return int.from_bytes(digest, 'big') >> 1
 
     @classmethod
     def fromCanvasCommentAndAssessment(
             cls, c: CanvasComment, a: Assessment) -> Self:
-        return cls(None, a.id, c.criterionId, c.comments)
+        return cls(cls.naturalId(a.id, c.criterionId, c.comments),
+                   a.id, c.criterionId, c.comments)
 
     def __str__(self) -> str:
         return f'{self.__class__.__name__} ({self.id}): ' \
                f'({self.assessment}; {self.criterion}; {self.comments})'
+
+
+class SyncState(models.Model):
+    """
+    High-water mark of the last successful sync of an assignment.  Later
+    runs use it to fetch only what changed in Canvas after that time.
+    """
+
+    class Meta:
+        db_table = 'sync_state'
+
+    assignment = models.OneToOneField(Assignment, on_delete=models.CASCADE,
+                                      primary_key=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    synced_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.assignment_id}): ' \
+               f'{self.synced_at.isoformat()}'
+
+
+class SyncRun(models.Model):
+    """
+    A run of the `run` command.  A run that didn't finish can be resumed
+    by the next run, using its checkpoints.
+    """
+
+    class Meta:
+        db_table = 'sync_run'
+
+    id = models.AutoField(primary_key=True)
+    full = models.BooleanField()
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.id}): ' \
+               f'started {self.started_at.isoformat()}'
+
+
+class SyncCheckpoint(models.Model):
+    """
+    A course, or an assignment of a course, finished in a run.  The
+    checkpoint of a course has no assignment.  Course and assignment IDs
+    aren't foreign keys, as courses and assignments without peer reviews
+    are finished without being saved.
+    """
+
+    class Meta:
+        db_table = 'sync_checkpoint'
+        indexes = [models.Index(fields=['run', 'course_id'],
+                                name='sync_checkpoint_course')]
+
+    id = models.AutoField(primary_key=True)
+    run = models.ForeignKey(SyncRun, on_delete=models.CASCADE)
+    course_id = models.IntegerField()
+    assignment_id = models.IntegerField(null=True)
+    finished_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.run_id}): ' \
+               f'course ({self.course_id}), ' \
+               f'assignment ({self.assignment_id})'
+
+
+class WorkItem(models.Model):
+    """
+    A course of a run, queued to be synced by one of the nodes working on
+    the run.  A node claims an item by leasing it, and extends the lease
+    while it works on the course.  Items whose lease expired, because the
+    node holding them stopped, are claimed again by other nodes.
+    """
+
+    PENDING: str = 'pending'
+    LEASED: str = 'leased'
+    DONE: str = 'done'
+    FAILED: str = 'failed'
+
+    class Meta:
+        db_table = 'work_item'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'course_id'],
+                                    name='work_item_course')
+        ]
+        indexes = [models.Index(fields=['run', 'status'],
+                                name='work_item_status')]
+
+    id = models.AutoField(primary_key=True)
+    run = models.ForeignKey(SyncRun, on_delete=models.CASCADE)
+    course_id = models.IntegerField()
+    status = models.CharField(max_length=16, default=PENDING)
+    worker = models.CharField(max_length=255, null=True)
+    lease_expires_at = models.DateTimeField(null=True)
+    attempts = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.id}): ' \
+               f'course ({self.course_id}), {self.status}'
+
+
+class DiscoveredCourse(models.Model):
+    """
+    A course found by listing the courses of a Canvas account, with the
+    number of its peer reviewed assignments that use a rubric, once it's
+    checked.  Later discoveries reuse recent checks, so only new courses
+    are checked again.
+    """
+
+    class Meta:
+        db_table = 'discovered_course'
+
+    id = models.IntegerField(primary_key=True)
+    name = models.TextField()
+    term_id = models.IntegerField(null=True)
+    student_count = models.IntegerField(null=True)
+    assignment_count = models.IntegerField(null=True)
+    discovered_at = models.DateTimeField()
+    checked_at = models.DateTimeField(null=True)
+
+    @classmethod
+    def fromCanvasCourse(cls, c: CanvasCourse,
+                         discoveredAt: datetime) -> Self:
+        return cls(id=c.id, name=getattr(c, 'name', ''),
+                   term_id=getattr(c, 'enrollment_term_id', None),
+                   student_count=getattr(c, 'total_students', None),
+                   discovered_at=discoveredAt)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__} ({self.id}): ' \
+               f'{self.assignment_count} assignment(s)'
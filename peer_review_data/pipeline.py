@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def prefetch(items: Iterable[T], fetch: Callable[[T], R],
+             depth: int) -> Iterator[R]:
+    """
+    Apply `fetch` to each of `items` in background threads, yielding the
+    results in the original order.  While the caller works on one result,
+    up to `depth` of the following items are being fetched or are waiting
+    to be consumed, which bounds the memory used by fetched data.
+
+    Exceptions raised by `fetch` are raised again when the caller reaches
+    the item that caused them.  If the caller stops early, fetches that
+    haven't started yet are cancelled.
+
+    :param items: Items to be fetched, consumed lazily
+    :param fetch: Function called in a worker thread for each item
+    :param depth: Maximum number of results fetched ahead of the caller
+    :return: Iterator of `fetch` results
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, depth),
+                                  thread_name_prefix='prefetch')
+    try:
+        yield from pipelined(items, lambda i: executor.submit(fetch, i),
+                             depth)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def pipelined(items: Iterable[T], submit: Callable[[T], Future],
+              depth: int) -> Iterator[R]:
+    """
+    Like `prefetch()`, but `submit` starts fetching an item by other means,
+    e.g., as a coroutine on an event loop, and returns a future of the
+    result.  If the caller stops early, the futures not yet consumed are
+    cancelled.
+
+    :param items: Items to be fetched, consumed lazily
+    :param submit: Function that starts fetching an item
+    :param depth: Maximum number of results fetched ahead of the caller
+    :return: Iterator of the results of the futures
+    """
+    depth = max(1, depth)
+    pending: Deque[Future] = deque()
+    try:
+        for item in items:
+            pending.append(submit(item))
+            if len(pending) > depth:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import Collection, Dict, Set
+
+from django.apps import apps
+from django.db.models import QuerySet
+
+import config
+from peer_review_data import models
+from peer_review_data.fetch import AssignmentFetch
+from peer_review_data.keyIndex import KeyIndex
+from runMetrics import metrics
+from utils import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+
+def countDeleted(countsByModel: Dict[str, int]) -> int:
+    """
+    Count rows deleted by table, from the counts by model label that
+    `QuerySet.delete()` returns, which include the rows deleted with them.
+
+    :return: Number of rows deleted
+    """
+    deletedCount: int = 0
+    for label, count in countsByModel.items():
+        if count > 0:
+            metrics.countRows(apps.get_model(label)._meta.db_table,
+                              deleted=count)
+            deletedCount += count
+    metrics.count(rows_deleted=deletedCount)
+    return deletedCount
+
+
+def deleteMissing(rows: QuerySet, seenIds: Collection[int]) -> Set[int]:
+    """
+    Delete the rows of a query whose keys weren't seen in Canvas, with the
+    rows that refer to them.  The keys in the DB are read with one query
+    and compared with those seen as sets, so the rows missing, usually
+    none, are deleted with one statement per `config.DB_BATCH_SIZE` keys
+    instead of one per row.
+
+    Nothing is deleted if no keys were seen, as Canvas returning nothing
+    more likely means an error than that everything was deleted.
+
+    :return: Keys of the rows deleted
+    """
+    if len(seenIds) == 0:
+        return set()
+
+    missingIds: Set[int] = set(
+        rows.values_list('pk', flat=True).iterator()).difference(seenIds)
+    deletedCount: int = 0
+    for batch in chunks(missingIds, config.DB_BATCH_SIZE):
+        deletedCount += countDeleted(
+            rows.model.objects.filter(pk__in=batch).delete()[1])
+
+    if deletedCount > 0:
+        LOGGER.info(f'Deleted {len(missingIds)} '
+                    f'{rows.model._meta.db_table} row(s) no longer in '
+                    f'Canvas, and {deletedCount - len(missingIds)} row(s) '
+                    'referring to them')
+    return missingIds
+
+
+@metrics.phase('pruneAssignment')
+def pruneAssignment(fetched: AssignmentFetch, assessmentIds: Set[int],
+                    keyIndex: KeyIndex) -> None:
+    """
+    Delete the submissions and assessments of an assignment that are no
+    longer in Canvas, with their assessments and comments.  Only those
+    fetched in full are compared (see `AssignmentFetch`), so an incremental
+    sync or `config.DEMAND_LOADING` never deletes submissions that simply
+    weren't fetched.
+
+    :param assessmentIds: IDs of all of the assignment's assessments read
+        from Canvas, including those not saved
+    :param keyIndex: Index from which the IDs of submissions deleted are
+        removed
+    """
+    assignmentId: int = fetched.canvas_assignment.id
+    if fetched.all_submissions:
+        assert fetched.canvas_submissions is not None
+        keyIndex.removeSubmissions(deleteMissing(
+            models.Submission.objects.filter(assignment_id=assignmentId),
+            {s.id for s in fetched.canvas_submissions}))
+
+    if fetched.all_assessments:
+        deleteMissing(models.Assessment.objects.filter(
+            submission__assignment_id=assignmentId), assessmentIds)
+
+
+def pruneCriteria(rubricId: int, criterionIds: Set[int],
+                  keyIndex: KeyIndex) -> None:
+    """
+    Delete the criteria of a rubric that are no longer in Canvas, with the
+    comments on them.
+
+    :param criterionIds: IDs of all of the rubric's criteria in Canvas
+    :param keyIndex: Index from which the IDs of criteria deleted are
+        removed, so comments on them are rejected
+    """
+    keyIndex.removeCriteria(deleteMissing(
+        models.Criterion.objects.filter(rubric_id=rubricId), criterionIds))
+
+
+@metrics.phase('pruneAssignments')
+def pruneAssignments(courseId: int, assignmentIds: Set[int]) -> None:
+    """
+    Delete the assignments of a course that are no longer in Canvas, with
+    all of their rows.  Rubrics and their criteria are kept, as other
+    assignments may use them.
+
+    :param assignmentIds: IDs of all of the assignments of the course
+        listed by Canvas, not only those fetched
+    """
+    deleteMissing(models.Assignment.objects.filter(course_id=courseId),
+                  assignmentIds)
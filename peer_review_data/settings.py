@@ -26,6 +26,20 @@ DATABASES: dict[str, dict[str, Any]] = {
     }
 }
 
+# A SQLite DB may be used instead of MySQL, e.g., for benchmarks.
+DB_ENGINE: str = os.getenv('DB_ENGINE', 'mysql').strip().lower()
+if DB_ENGINE == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'peer_review_data.sqlite',
+        'NAME': os.getenv('DB_NAME', 'peer-review-data.sqlite3'),
+        # Course workers write concurrently, so wait for locks (see
+        # `peer_review_data.sqlite`).
+        'OPTIONS': {'timeout': 30},
+        # In a file, instead of in memory, so worker processes of tests
+        # share it, like the nodes of a run do.
+        'TEST': {'NAME': 'test-peer-review-data.sqlite3'}
+    }
+
 DATETIME_FORMAT: str = "N j, Y g:i:s a"
 
 if bool(int(os.getenv('EMAIL_DEBUG', '1'))):
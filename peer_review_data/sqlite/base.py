@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend whose transactions take the write lock of the DB when
+    they begin, instead of at their first write.  A transaction that reads
+    before it writes, like one saving rows with `BulkUpserter`, which loads
+    their fingerprints first, would otherwise fail at once with "database
+    is locked" if another worker is writing, instead of waiting for the
+    lock.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
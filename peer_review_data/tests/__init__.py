@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Dict, List, Type
+
+from canvasapi import Canvas
+from django.db import transaction
+from django.test import TestCase
+
+from benchmarks.fakeCanvas import FakeCanvasServer, SyntheticCanvas
+from canvasData import CanvasCourse
+from peer_review_data import models
+from peer_review_data.userCache import user_cache
+
+# Models of the rows saved by a sync, in the order they're written
+SYNCED_MODELS: List[Type[models.Fingerprinted]] = [
+    models.Course, models.User, models.Assignment, models.Rubric,
+    models.RubricAssignment, models.Criterion, models.Submission,
+    models.Assessment, models.Comment]
+
+
+class Rollback(Exception):
+    pass
+
+
+class FakeCanvasTestCase(TestCase):
+    """
+    Test case with a fake Canvas server (see `benchmarks.fakeCanvas`)
+    serving the data of `fake_canvas`, and a `canvasapi` client of it.  The
+    client doesn't use the server in `config.CANVAS_BASE_URL`, so objects
+    fetched with it, like `course`, make their requests to the fake server.
+    """
+    fake_canvas: SyntheticCanvas = SyntheticCanvas(
+        courses=1, assignments=2, students=5, reviews=2, criteria=2)
+
+    server: FakeCanvasServer
+    canvas: Canvas
+    course: CanvasCourse
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = FakeCanvasServer(cls.fake_canvas)
+        threading.Thread(target=cls.server.serve_forever, daemon=True) \
+            .start()
+        cls.canvas = Canvas(cls.server.url, 'test')
+        cls.course = cls.canvas.get_course(cls.fake_canvas.courseIds[0])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        user_cache.seed()
+
+    def requestCount(self, endpoint: str) -> int:
+        """
+        :return: Number of requests of an endpoint type served since the
+            last call
+        """
+        return int(self.server.stats(reset=True)['requestsByEndpoint']
+                   .get(endpoint, 0))
+
+
+def savedRows() -> Dict[str, list]:
+    """
+    :return: Values of the rows saved by a sync, by model, in key order
+    """
+    return {m.__name__: list(m.objects.order_by('pk').values())
+            for m in SYNCED_MODELS}
+
+
+def rolledBack(function, *args, **kwargs) -> Dict[str, list]:
+    """
+    Call a function that saves rows, then roll back what it saved.
+
+    :return: Rows saved by the function (see `savedRows()`)
+    """
+    rows: Dict[str, list] = {}
+    try:
+        with transaction.atomic():
+            function(*args, **kwargs)
+            rows = savedRows()
+            raise Rollback
+    except Rollback:
+        pass
+    user_cache.seed()
+    return rows
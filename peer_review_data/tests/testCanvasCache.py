@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import shutil
+import tempfile
+
+import requests
+
+from canvasCache import CachingAdapter
+from peer_review_data.tests import FakeCanvasTestCase
+
+
+class CachingAdapterTest(FakeCanvasTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.cacheDir: str = tempfile.mkdtemp()
+        self.adapter = CachingAdapter(self.cacheDir, {'course': 3600})
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.url: str = f'{self.server.url}/api/v1/courses/' \
+                        f'{self.course.id}'
+        self.requestCount('course')
+
+    def tearDown(self) -> None:
+        self.session.close()
+        shutil.rmtree(self.cacheDir)
+
+    def get(self, stream: bool) -> bytes:
+        with self.session.get(self.url, stream=stream) as response:
+            self.assertEqual(response.status_code, 200)
+            return b''.join(response.iter_content(16))
+
+    def testStreamedBodyInFile(self) -> None:
+        body: bytes = self.get(stream=True)
+        self.assertEqual(self.requestCount('course'), 1)
+        self.assertEqual(len(glob.glob(
+            os.path.join(self.cacheDir, '*', '*.body'))), 1)
+
+        self.assertEqual(self.get(stream=True), body)
+        self.assertEqual(self.get(stream=False), body)
+        self.assertEqual(self.requestCount('course'), 0)
+        self.assertEqual((self.adapter.hits, self.adapter.misses), (2, 1))
+
+    def testStreamedHitOfStoredBody(self) -> None:
+        body: bytes = self.get(stream=False)
+        self.assertEqual(glob.glob(
+            os.path.join(self.cacheDir, '*', '*.body')), [])
+
+        self.assertEqual(self.get(stream=True), body)
+        self.assertEqual(self.requestCount('course'), 1)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from django.test import SimpleTestCase
+
+from canvasData import CanvasAssessment, CanvasComment
+
+
+class CanvasRecordTest(SimpleTestCase):
+    def testAssessmentWithoutOptionalKeys(self) -> None:
+        assessment = CanvasAssessment({'id': 1})
+        self.assertIsNone(assessment.assessorId)
+        self.assertFalse(assessment.isPeerReview)
+        self.assertIsNone(assessment.submissionId)
+        self.assertEqual(assessment.comments, [])
+
+    def testComment(self) -> None:
+        comment = CanvasComment({'criterion_id': '_12'})
+        self.assertEqual((comment.criterionId, comment.comments), (12, ''))
+
+        with self.assertRaises(TypeError):
+            CanvasComment({'comments': 'Good'})
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+from typing import Dict, List
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import config
+from canvasStream import loadSpooled, SpooledItems
+from peer_review_data import main
+from peer_review_data.fetch import RestFetchEngine
+from peer_review_data.tests import FakeCanvasTestCase, rolledBack
+
+
+class SpooledItemsTest(SimpleTestCase):
+    data: dict = {'id': 1, 'items': [
+        {'id': 1, 'group': 10, 'text': 'Très bien'},
+        {'id': 2},
+        {'id': 3, 'group': 20, 'text': '[{,}]'}], 'title': 'T'}
+
+    def setUp(self) -> None:
+        self.scannedIds: List[int] = []
+
+    def group(self, item: dict) -> int | None:
+        self.scannedIds.append(item['id'])
+        return item.get('group')
+
+    def load(self, maxLoadedBytes: int) -> tuple:
+        return loadSpooled(
+            io.BytesIO(json.dumps(self.data, ensure_ascii=False)
+                       .encode('utf-8')),
+            maxLoadedBytes, 'items', {'group': self.group})
+
+    def testSpooled(self) -> None:
+        members, items = self.load(0)
+        assert isinstance(items, SpooledItems)
+        self.assertEqual(members, {'id': 1, 'title': 'T'})
+        self.assertEqual(list(items), self.data['items'])
+        self.assertEqual(items[-1], self.data['items'][2])
+        self.assertEqual(items[1:], self.data['items'][1:])
+
+        # Columns are taken once, while scanning, not as items are read.
+        self.assertEqual(self.scannedIds, [1, 2, 3])
+        self.assertEqual(items.values('group'), {10, 20})
+        subset: SpooledItems = items.where('group', {20})
+        self.assertEqual(list(subset), [self.data['items'][2]])
+        self.assertEqual(subset.values('group'), {20})
+        self.assertEqual(self.scannedIds, [1, 2, 3])
+
+    def testLoaded(self) -> None:
+        members, items = self.load(1024)
+        self.assertEqual(members, {'id': 1, 'title': 'T'})
+        self.assertEqual(items, self.data['items'])
+
+
+class SpooledRubricTest(FakeCanvasTestCase):
+    def sync(self) -> None:
+        with mock.patch.object(main, 'fetch_engine', RestFetchEngine()):
+            main.processCourseAssignments(self.course, full=True)
+
+    def testSameRows(self) -> None:
+        for demandLoading in (False, True):
+            with self.subTest(demandLoading=demandLoading), \
+                    mock.patch.object(config, 'DEMAND_LOADING',
+                                      demandLoading):
+                loaded: Dict[str, list] = rolledBack(self.sync)
+                with mock.patch.object(config, 'RUBRIC_STREAM_MIN_BYTES', 0):
+                    spooled: Dict[str, list] = rolledBack(self.sync)
+                self.assertEqual(len(loaded['Assessment']), 20)
+                self.assertEqual(spooled, loaded)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from typing import Set
+
+from django.test import TestCase
+
+from peer_review_data import main, models
+from peer_review_data.keyIndex import KeyIndex, RejectReport
+from peer_review_data.userCache import user_cache
+
+
+class CommentsTest(TestCase):
+    """
+    One peer review with a comment on each of two criteria, saved again
+    as each run of the tool does.
+    """
+
+    def setUp(self) -> None:
+        course = models.Course.objects.create(id=1, name='C',
+                                              course_code='C')
+        for userId in (1, 2):
+            models.User.objects.create(id=userId, name=str(userId),
+                                       sortable_name=str(userId),
+                                       login_id=str(userId))
+        assignment = models.Assignment.objects.create(id=1, name='A',
+                                                      course=course)
+        rubric = models.Rubric.objects.create(id=1, title='R')
+        for criterionId in (1, 2):
+            models.Criterion.objects.create(
+                id=criterionId, description='', long_description='',
+                rubric=rubric)
+        models.Submission.objects.create(id=10, assignment=assignment,
+                                         user_id=1)
+        user_cache.seed()
+        self.keyIndex: KeyIndex = KeyIndex(1)
+        self.keyIndex.addSubmissions([10])
+        self.keyIndex.addCriteria([1, 2])
+
+    def save(self, *comments: str) -> None:
+        assessment: dict = {
+            'id': 100, 'assessor_id': 2, 'assessment_type': 'peer_review',
+            'artifact_type': 'Submission', 'artifact_id': 10,
+            'data': [{'criterion_id': f'_{i + 1}', 'comments': c}
+                     for i, c in enumerate(comments)]}
+        errorCount: int = main.saveAssessmentsAndComments(
+            [assessment], self.keyIndex, RejectReport(1))
+        self.assertEqual(errorCount, 0)
+
+    def savedComments(self) -> Set[str]:
+        return set(models.Comment.objects.values_list('comments', flat=True))
+
+    def testSavedAgain(self) -> None:
+        self.save('Good', 'Clear')
+        self.assertEqual(models.Comment.objects.count(), 2)
+
+        self.save('Good', 'Clear')
+        self.assertEqual(models.Comment.objects.count(), 2)
+        self.assertEqual(self.savedComments(), {'Good', 'Clear'})
+
+        # The edited comment replaces the one it was edited from.
+        self.save('Good', 'Very clear')
+        self.assertEqual(models.Comment.objects.count(), 2)
+        self.assertEqual(self.savedComments(), {'Good', 'Very clear'})
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Set, Tuple
+from unittest import mock
+
+import canvasGraphQL
+from benchmarks.fakeCanvas import SyntheticCanvas
+from canvasData import CanvasRubric, CanvasSubmission
+from canvasGraphQL import CanvasGraphQL, GraphQLError
+from peer_review_data import main
+from peer_review_data.fetch import (
+    AssignmentFetch,
+    FetchEngine,
+    GraphQLFetchEngine,
+    RestFetchEngine
+)
+from peer_review_data.keyIndex import RejectReport
+from peer_review_data.tests import FakeCanvasTestCase, rolledBack, savedRows
+
+
+class StubCanvas(SyntheticCanvas):
+    """
+    Synthetic Canvas whose GraphQL submissions have the quirks of real
+    ones: submissions without a user, assessments without an assessor, and
+    submissions with more assessments than one page.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.userlessIds: Set[int] = set()
+        self.assessorlessIds: Set[int] = set()
+        self.truncatedIds: Set[int] = set()
+
+    def graphql(self, query: str, variables: dict) -> dict:
+        data: dict = super().graphql(query, variables)
+        if 'assignmentSubmissions' not in query:
+            return data
+
+        for submission in data['assignment']['submissionsConnection'][
+                'nodes']:
+            submissionId: int = int(submission['_id'])
+            if submissionId in self.userlessIds:
+                submission['user'] = None
+            if submissionId in self.truncatedIds:
+                submission['rubricAssessmentsConnection']['pageInfo'][
+                    'hasNextPage'] = True
+            for assessment in submission['rubricAssessmentsConnection'][
+                    'nodes']:
+                if int(assessment['_id']) in self.assessorlessIds:
+                    assessment['assessor'] = None
+        return data
+
+
+class GraphQLTest(FakeCanvasTestCase):
+    fake_canvas = StubCanvas(courses=1, assignments=2, students=5, reviews=2,
+                             criteria=2)
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake_canvas.userlessIds.clear()
+        self.fake_canvas.assessorlessIds.clear()
+        self.fake_canvas.truncatedIds.clear()
+        self.client = CanvasGraphQL(self.canvas)
+        self.engine = GraphQLFetchEngine(self.client)
+        self.requestCount('graphql')
+
+    def sync(self, engine: FetchEngine) -> RejectReport:
+        with mock.patch.object(main, 'fetch_engine', engine):
+            return main.processCourseAssignments(self.course, full=True)
+
+    def fetchFirstAssignment(self) -> Tuple[CanvasRubric,
+                                            List[CanvasSubmission],
+                                            AssignmentFetch]:
+        """
+        :return: Rubric and submissions of the course's first assignment,
+            which has assessments, and what was fetched
+        """
+        fetched: AssignmentFetch = self.engine.fetchAssignment(
+            self.course, next(iter(self.engine.getAssignments(self.course))))
+        assert fetched.canvas_rubric is not None and \
+            fetched.canvas_submissions is not None
+        return fetched.canvas_rubric, fetched.canvas_submissions, fetched
+
+    def testNodesFollowCursors(self) -> None:
+        with mock.patch.object(canvasGraphQL, 'PAGE_SIZE', 2):
+            assignmentIds: List[int] = [
+                a.id for a in self.client.getAssignments(self.course.id)]
+            self.assertEqual(self.requestCount('graphql'), 1)
+
+            canvasRubric, canvasSubmissions, _ = self.fetchFirstAssignment()
+            # 5 submissions in pages of 2, after the assignments query
+            self.assertEqual(self.requestCount('graphql'), 4)
+
+        self.assertEqual(assignmentIds, [1, 2])
+        self.assertEqual([s.id for s in canvasSubmissions], [1, 2, 3, 4, 5])
+        self.assertEqual(len(canvasRubric.assessments), 10)
+        self.assertEqual(len({a['id'] for a in canvasRubric.assessments}), 10)
+
+    def testNullUserAndAssessor(self) -> None:
+        self.fake_canvas.userlessIds.add(self.fake_canvas.submissionId(1, 0))
+        self.fake_canvas.assessorlessIds.add(self.fake_canvas.assessmentId(
+            self.fake_canvas.submissionId(1, 1), 0))
+
+        canvasRubric, canvasSubmissions, _ = self.fetchFirstAssignment()
+        self.assertIsNone(canvasSubmissions[0].user_id)
+        self.assertEqual([a['assessor_id'] for a in canvasRubric.assessments
+                          if a['assessor_id'] is None], [None])
+
+        rejects: RejectReport = self.sync(self.engine)
+        rows: Dict[str, list] = savedRows()
+        self.assertEqual(rejects.counts(), {('Assessment', 'assessor'): 1,
+                                            ('Assessment', 'submission'): 2})
+        # The other assessments, and all of the other assignment's, are
+        # saved.
+        self.assertEqual(len(rows['Assessment']), 20 - 3)
+
+    def testAssessmentsTruncated(self) -> None:
+        canvasRubric, _, fetched = self.fetchFirstAssignment()
+        self.assertFalse(canvasRubric.assessments_truncated)
+        self.assertTrue(fetched.all_assessments)
+
+        self.fake_canvas.truncatedIds.add(self.fake_canvas.submissionId(1, 2))
+        canvasRubric, _, fetched = self.fetchFirstAssignment()
+        self.assertTrue(canvasRubric.assessments_truncated)
+        self.assertFalse(fetched.all_assessments)
+        self.assertTrue(fetched.all_submissions)
+
+    def testSavesSameRowsAsRest(self) -> None:
+        restRows: Dict[str, list] = rolledBack(self.sync, RestFetchEngine())
+        graphQLRows: Dict[str, list] = rolledBack(self.sync, self.engine)
+
+        self.assertEqual(len(restRows['Comment']), 2 * 5 * 2 * 2)
+        self.assertEqual(graphQLRows, restRows)
+
+    def testCourseErrorsFailOnlyTheirCourse(self) -> None:
+        assignments: dict = {'assignmentsConnection': {
+            'pageInfo': {'hasNextPage': False, 'endCursor': None},
+            'nodes': [{'_id': '1', 'peerReviews': {'enabled': True},
+                       'rubric': {'_id': '1'}},
+                      {'_id': '2', 'peerReviews': None, 'rubric': None}]}}
+        result: dict = {
+            'data': {'c0': assignments, 'c1': None, 'c2': None},
+            'errors': [{'message': 'Timed out', 'path': ['c1']}]}
+
+        with mock.patch.object(self.canvas, 'graphql',
+                               return_value=result):
+            # Course 3 wasn't found; course 2 failed, so it's left out.
+            self.assertEqual(
+                self.client.getPeerReviewedAssignmentIds([1, 2, 3]),
+                {1: {1}, 3: None})
+
+            result['errors'].append({'message': 'Too complex'})
+            with self.assertRaises(GraphQLError):
+                self.client.getPeerReviewedAssignmentIds([1, 2, 3])
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from peer_review_data import models
+from peer_review_data.keyIndex import KeyIndex
+from peer_review_data.userCache import user_cache
+
+
+class KeyIndexTest(TestCase):
+    def setUp(self) -> None:
+        models.User.objects.create(id=1, name='A', sortable_name='A',
+                                   login_id='a')
+        user_cache.seed()
+        self.keyIndex = KeyIndex(1)
+        self.keyIndex.addSubmissions([10])
+
+    def checkAssessor(self, assessorId: int) -> str | None:
+        return self.keyIndex.checkAssessment(
+            models.Assessment(id=100, assessor_id=assessorId,
+                              submission_id=10))
+
+    def testUserSavedAfterSeed(self) -> None:
+        # Saved by another node, so the user cache doesn't know them
+        models.User.objects.create(id=2, name='B', sortable_name='B',
+                                   login_id='b')
+        self.assertNotIn(2, user_cache)
+
+        self.assertIsNone(self.checkAssessor(1))
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.checkAssessor(2))
+        self.assertIn(2, user_cache)
+
+    def testUnknownUserLookedUpOnce(self) -> None:
+        with self.assertNumQueries(1):
+            self.assertEqual(self.checkAssessor(3), 'assessor')
+            self.assertEqual(self.checkAssessor(3), 'assessor')
+
+    def testLookUp(self) -> None:
+        models.User.objects.create(id=2, name='B', sortable_name='B',
+                                   login_id='b')
+        with self.assertNumQueries(1):
+            self.assertEqual(user_cache.lookUp([1, 2, 3, 4]), {3, 4})
+        self.assertIn(2, user_cache)
+        with self.assertNumQueries(0):
+            self.assertEqual(user_cache.lookUp([1, 2]), set())
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from typing import List, Set
+from unittest import mock
+
+from canvasData import CanvasAssignment
+from peer_review_data import main, models
+from peer_review_data.fetch import AssignmentFetch, RestFetchEngine
+from peer_review_data.keyIndex import KeyIndex
+from peer_review_data.prune import (
+    deleteMissing,
+    pruneAssignment,
+    pruneAssignments
+)
+from peer_review_data.tests import FakeCanvasTestCase
+
+
+class PruneTest(FakeCanvasTestCase):
+    """
+    Rows of the fake course, saved by a full sync, some of which are then
+    missing from what Canvas returned.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        engine: RestFetchEngine = RestFetchEngine()
+        with mock.patch.object(main, 'fetch_engine', engine):
+            main.processCourseAssignments(self.course, full=True)
+        self.canvasAssignment: CanvasAssignment = \
+            next(iter(engine.getAssignments(self.course)))
+        self.keyIndex: KeyIndex = KeyIndex(self.course.id).load()
+
+    def submissionIds(self) -> List[int]:
+        return list(models.Submission.objects.filter(
+            assignment_id=self.canvasAssignment.id)
+            .order_by('id').values_list('id', flat=True))
+
+    def assessmentIds(self) -> List[int]:
+        return list(models.Assessment.objects.filter(
+            submission__assignment_id=self.canvasAssignment.id)
+            .order_by('id').values_list('id', flat=True))
+
+    def testDeleteMissing(self) -> None:
+        submissionIds: List[int] = self.submissionIds()
+        rows = models.Submission.objects.filter(
+            assignment_id=self.canvasAssignment.id)
+        assessmentCount: int = models.Assessment.objects.count()
+
+        self.assertEqual(deleteMissing(rows, []), set())
+        self.assertEqual(self.submissionIds(), submissionIds)
+
+        self.assertEqual(deleteMissing(rows, submissionIds[1:]),
+                         {submissionIds[0]})
+        self.assertEqual(self.submissionIds(), submissionIds[1:])
+        # The peer reviews of the submission are deleted with it.
+        self.assertEqual(models.Assessment.objects.count(),
+                         assessmentCount - 2)
+        self.assertFalse(models.Comment.objects.filter(
+            assessment__submission_id=submissionIds[0]).exists())
+
+    def testPruneAssessmentsOnly(self) -> None:
+        submissionIds: List[int] = self.submissionIds()
+        assessmentIds: List[int] = self.assessmentIds()
+        # As an incremental sync fetches them: only some submissions, but
+        # all of their assessments
+        fetched = AssignmentFetch(
+            self.canvasAssignment, canvas_submissions=[],
+            all_submissions=False, all_assessments=True)
+
+        pruneAssignment(fetched, set(assessmentIds[1:]), self.keyIndex)
+        self.assertEqual(self.submissionIds(), submissionIds)
+        self.assertEqual(self.assessmentIds(), assessmentIds[1:])
+        self.assertTrue(set(submissionIds) <= self.keyIndex.submissionIds)
+
+    def testPruneAssignments(self) -> None:
+        assignmentIds: Set[int] = set(
+            models.Assignment.objects.values_list('id', flat=True))
+        self.assertEqual(len(assignmentIds), 2)
+
+        pruneAssignments(self.course.id, {self.canvasAssignment.id})
+        self.assertEqual(
+            list(models.Assignment.objects.values_list('id', flat=True)),
+            [self.canvasAssignment.id])
+        self.assertFalse(models.Submission.objects.exclude(
+            assignment_id=self.canvasAssignment.id).exists())
+        # Rubrics may be used by other assignments, so they're kept.
+        self.assertEqual(models.Rubric.objects.count(), 2)
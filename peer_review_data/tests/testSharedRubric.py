@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Tuple
+from unittest import mock
+
+import requests
+
+from benchmarks.fakeCanvas import SyntheticCanvas
+from canvasAsync import CanvasAsync, HTTPX_AVAILABLE
+from canvasGraphQL import CanvasGraphQL
+from canvasRateLimit import RateLimitScheduler
+from peer_review_data import main
+from peer_review_data.fetch import (
+    AsyncFetchEngine,
+    FetchEngine,
+    GraphQLFetchEngine,
+    RestFetchEngine
+)
+from peer_review_data.keyIndex import RejectReport
+from peer_review_data.tests import FakeCanvasTestCase, rolledBack
+
+
+class SharedRubricTest(FakeCanvasTestCase):
+    """
+    Two assignments that share one rubric, which Canvas returns with the
+    assessments of both.
+    """
+    fake_canvas = SyntheticCanvas(courses=1, assignments=2, students=5,
+                                  reviews=2, criteria=2,
+                                  assignmentsPerRubric=2)
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.rejects: List[RejectReport] = []
+        self.requestCount('rubric')
+
+    def sync(self, engine: FetchEngine) -> None:
+        with mock.patch.object(main, 'fetch_engine', engine):
+            self.rejects.append(
+                main.processCourseAssignments(self.course, full=True))
+
+    def syncedRows(self, engine: FetchEngine) -> Dict[str, list]:
+        rows: Dict[str, list] = rolledBack(self.sync, engine)
+        self.assertEqual(self.rejects.pop().counts(), {})
+        return rows
+
+    def testIncludeIsOneString(self) -> None:
+        url: str = f'{self.server.url}/api/v1/courses/{self.course.id}/' \
+                   f'rubrics/1'
+        queries: List[Tuple[List[Tuple[str, str]], int]] = [
+            ([('include', 'assessments')], 200),
+            ([('include', 'assignment_associations')], 200),
+            ([('include[]', 'assessments')], 400),
+            ([('include', 'assessments'),
+              ('include', 'assignment_associations')], 400)]
+        for query, status in queries:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    requests.get(url, params=query).status_code, status)
+
+    def testEachAssignmentGetsItsAssessments(self) -> None:
+        restRows: Dict[str, list] = self.syncedRows(RestFetchEngine())
+        # The rubric is fetched once, with its associations.
+        self.assertEqual(self.requestCount('rubric'), 2)
+        self.assertEqual(len(restRows['Rubric']), 1)
+        self.assertEqual(
+            [(r['assignment_id'], r['rubric_id'])
+             for r in restRows['RubricAssignment']], [(1, 1), (2, 1)])
+        # None of an assignment's assessments were rejected as being of
+        # the other assignment's submissions.
+        self.assertEqual(len(restRows['Assessment']), 2 * 5 * 2)
+
+        graphQLRows: Dict[str, list] = self.syncedRows(
+            GraphQLFetchEngine(CanvasGraphQL(self.canvas)))
+        self.assertEqual(graphQLRows, restRows)
+
+        if HTTPX_AVAILABLE:
+            engine = AsyncFetchEngine(CanvasAsync(
+                self.canvas._Canvas__requester, RateLimitScheduler(4, 0)))
+            try:
+                self.assertEqual(self.syncedRows(engine), restRows)
+            finally:
+                engine.close()
+            self.assertEqual(self.requestCount('rubric'), 2)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.utils.timezone import utc
+
+from peer_review_data import models
+from peer_review_data.checkpoint import Checkpoints
+from peer_review_data.workQueue import MAX_ATTEMPTS, WorkQueue
+
+
+class WorkQueueTest(TestCase):
+    """
+    Two workers sharing the queue of a run.  SQLite doesn't support
+    `SELECT … FOR UPDATE SKIP LOCKED`, so these test the claims that are
+    safe with any DB.
+    """
+
+    def setUp(self) -> None:
+        self.run = models.SyncRun.objects.create(
+            full=True, started_at=datetime.now(tz=utc))
+        self.workers: List[WorkQueue] = []
+        for name in ('a', 'b'):
+            queue: WorkQueue = WorkQueue(self.run)
+            queue.workerId = name
+            self.workers.append(queue)
+        self.workers[0].enqueue([1, 2])
+
+    def expireLeases(self) -> None:
+        models.WorkItem.objects.filter(status=models.WorkItem.LEASED) \
+            .update(lease_expires_at=datetime.now(tz=utc) -
+                    timedelta(seconds=1))
+
+    def item(self, courseId: int) -> models.WorkItem:
+        item: models.WorkItem = models.WorkItem.objects.get(
+            run=self.run, course_id=courseId)
+        return item
+
+    def testWorkersClaimDifferentItems(self) -> None:
+        a, b = self.workers
+        itemA: models.WorkItem | None = a.claim()
+        itemB: models.WorkItem | None = b.claim()
+        assert itemA is not None and itemB is not None
+        self.assertEqual((itemA.course_id, itemB.course_id), (1, 2))
+        self.assertIsNone(a.claim())
+
+        a.complete(itemA, succeeded=True)
+        b.complete(itemB, succeeded=True)
+        self.assertTrue(a.isFinished())
+
+    def testExpiredLeaseClaimedAgain(self) -> None:
+        a, b = self.workers
+        itemA: models.WorkItem | None = a.claim()
+        assert itemA is not None
+        self.expireLeases()
+
+        itemB: models.WorkItem | None = b.claim()
+        assert itemB is not None
+        self.assertEqual((itemB.course_id, itemB.attempts), (1, 2))
+        self.assertEqual(self.item(1).worker, 'b')
+
+        # The worker whose lease expired can't release the item anymore.
+        a.complete(itemA, succeeded=False)
+        self.assertEqual(self.item(1).status, models.WorkItem.LEASED)
+        b.complete(itemB, succeeded=True)
+        self.assertEqual(self.item(1).status, models.WorkItem.DONE)
+
+    def testAttemptsLimit(self) -> None:
+        for attempt in range(MAX_ATTEMPTS):
+            item: models.WorkItem | None = self.workers[attempt % 2].claim()
+            assert item is not None
+            self.assertEqual((item.course_id, item.attempts),
+                             (1, attempt + 1))
+            self.expireLeases()
+
+        item = self.workers[0].claim()
+        assert item is not None
+        self.assertEqual(item.course_id, 2)
+        self.assertEqual(self.item(1).status, models.WorkItem.FAILED)
+
+        self.assertEqual(self.workers[0].enqueue([1, 2]), 1)
+        self.assertEqual((self.item(1).status, self.item(1).attempts),
+                         (models.WorkItem.PENDING, 0))
+
+
+def claimCourses(runId: int, name: str, crash: bool, started,
+                 claims) -> None:
+    """
+    Claim and complete the courses of a run in a worker process, until
+    none is left to claim, and put the IDs of the claimed courses in
+    `claims`.
+
+    :param crash: Whether to stop after the first claim, without completing
+        it, like a node that died
+    :param started: Event that the claims start at
+    """
+    try:
+        queue: WorkQueue = WorkQueue(models.SyncRun.objects.get(id=runId),
+                                     leaseSeconds=1)
+        queue.workerId = name
+        claimedIds: List[int] = []
+        started.wait()
+        while (item := queue.claim()) is not None:
+            claimedIds.append(item.course_id)
+            if crash:
+                break
+            queue.complete(item, succeeded=True)
+        claims.put((name, claimedIds))
+    finally:
+        connections.close_all()
+
+
+class WorkQueueProcessesTest(TransactionTestCase):
+    """
+    Worker processes claiming the courses of a run at the same time, like
+    the nodes of a run do, after a node died holding a course.
+    """
+
+    def setUp(self) -> None:
+        self.run = models.SyncRun.objects.create(
+            full=True, started_at=datetime.now(tz=utc))
+        self.courseIds: List[int] = list(range(1, 41))
+        WorkQueue(self.run).enqueue(self.courseIds)
+
+    def claim(self, names: List[str], crash: bool = False) \
+            -> Dict[str, List[int]]:
+        """
+        :return: IDs of the courses claimed by each worker process
+        """
+        context = multiprocessing.get_context('fork')
+        started = context.Event()
+        claims = context.Queue()
+        # Each process opens its own connection.
+        connections.close_all()
+        processes: list = [
+            context.Process(target=claimCourses,
+                            args=(self.run.id, name, crash, started, claims))
+            for name in names]
+        for process in processes:
+            process.start()
+        started.set()
+        claimedIds: Dict[str, List[int]] = dict(
+            claims.get(timeout=60) for _ in processes)
+        for process in processes:
+            process.join()
+        return claimedIds
+
+    def testEachCourseClaimedOnce(self) -> None:
+        crashed: Dict[str, List[int]] = self.claim(['dead'], crash=True)
+        self.assertEqual(crashed, {'dead': [1]})
+
+        names: List[str] = ['a', 'b', 'c', 'd']
+        claims: Counter = Counter()
+        for claimedIds in self.claim(names).values():
+            claims.update(claimedIds)
+        # The course of the dead node is claimed again once its lease
+        # expired.
+        time.sleep(1.1)
+        for claimedIds in self.claim(names).values():
+            claims.update(claimedIds)
+
+        self.assertEqual(claims, Counter(self.courseIds))
+        items: list = list(models.WorkItem.objects.filter(run=self.run)
+                           .values_list('course_id', 'status', 'attempts'))
+        self.assertEqual(
+            sorted(items),
+            [(c, models.WorkItem.DONE, 2 if c == 1 else 1)
+             for c in self.courseIds])
+
+
+class CheckpointsTest(TestCase):
+    def startRun(self, age: timedelta) -> models.SyncRun:
+        run: models.SyncRun = models.SyncRun.objects.create(
+            full=True, started_at=datetime.now(tz=utc) - age)
+        models.SyncCheckpoint.objects.create(
+            run=run, course_id=1, finished_at=run.started_at)
+        WorkQueue(run).enqueue([1])
+        return run
+
+    def testStartKeepsActiveRuns(self) -> None:
+        day: timedelta = timedelta(days=1)
+        abandoned: models.SyncRun = self.startRun(day)
+        finished: models.SyncRun = self.startRun(timedelta())
+        finished.finished_at = datetime.now(tz=utc)
+        finished.save()
+        worked: models.SyncRun = self.startRun(day)
+        queue: WorkQueue = WorkQueue(worked)
+        self.assertIsNotNone(queue.claim())
+        recent: models.SyncRun = self.startRun(timedelta())
+
+        Checkpoints.start(full=True)
+        self.assertEqual(
+            set(models.WorkItem.objects.values_list('run_id', flat=True)),
+            {worked.id, recent.id})
+        self.assertEqual(
+            set(models.SyncCheckpoint.objects
+                .values_list('run_id', flat=True)),
+            {worked.id, recent.id})
+        self.assertTrue(models.SyncRun.objects.filter(
+            id__in=[abandoned.id, finished.id]).exists())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from typing import Dict, Iterable, Set
+
+import config
+from peer_review_data import models
+from utils import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+
+class UserCache(object):
+    """
+    Process-wide cache of the fingerprints of users saved in the DB, keyed
+    by Canvas user ID.  Many users are in several of the courses synced, so
+    this avoids writing a user again when nothing about them changed.
+
+    It's shared by all course workers, so access is synchronized.
+    """
+
+    def __init__(self):
+        self.writeCount: int = 0
+        self.skipCount: int = 0
+        self.__fingerprints: Dict[int, str | None] = {}
+        self.__lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}: ' \
+               f'{len(self.__fingerprints)} user(s) known, ' \
+               f'{self.writeCount} write(s), ' \
+               f'{self.skipCount} unchanged write(s) skipped'
+
+    def __contains__(self, userId: int) -> bool:
+        with self.__lock:
+            return userId in self.__fingerprints
+
+    def seed(self) -> None:
+        """
+        Load the fingerprints of all users in the DB, forgetting those
+        known before, and start counting writes again.  Users saved before
+        fingerprints were kept are known, but have none, so they're written
+        again.
+        """
+        fingerprints: Dict[int, str | None] = dict(
+            models.User.objects.values_list('id', models.FINGERPRINT_FIELD)
+            .iterator())
+        with self.__lock:
+            self.__fingerprints = fingerprints
+            self.writeCount = 0
+            self.skipCount = 0
+        LOGGER.debug(f'Loaded fingerprints of {len(fingerprints)} user(s)')
+
+    def lookUp(self, userIds: Iterable[int]) -> Set[int]:
+        """
+        Look for the users that aren't known in the DB, with one query per
+        `config.DB_BATCH_SIZE` users, and add those found, e.g., because
+        another node saved them after the cache was seeded.
+
+        :return: IDs of the users that aren't in the DB
+        """
+        with self.__lock:
+            missingIds: Set[int] = {
+                u for u in userIds if u not in self.__fingerprints}
+        if len(missingIds) == 0:
+            return missingIds
+
+        fingerprints: Dict[int, str | None] = {}
+        for batch in chunks(missingIds, config.DB_BATCH_SIZE):
+            fingerprints.update(
+                models.User.objects.filter(id__in=batch)
+                .values_list('id', models.FINGERPRINT_FIELD))
+        with self.__lock:
+            for userId, userFingerprint in fingerprints.items():
+                self.__fingerprints.setdefault(userId, userFingerprint)
+        return missingIds.difference(fingerprints)
+
+    def changed(self, user: models.User) -> bool:
+        """
+        Tell whether the user is new or differs from the user saved in the
+        DB, counting the users found unchanged.
+        """
+        userFingerprint: str = user.rowFingerprint()
+        with self.__lock:
+            if self.__fingerprints.get(user.id) == userFingerprint:
+                self.skipCount += 1
+                return False
+        return True
+
+    def saved(self, users: Iterable[models.User]) -> None:
+        """
+        Record users that were written to the DB.
+        """
+        fingerprints: Dict[int, str] = {
+            u.id: u.rowFingerprint() for u in users}
+        with self.__lock:
+            self.__fingerprints.update(fingerprints)
+            self.writeCount += len(fingerprints)
+
+
+user_cache = UserCache()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Self, Set
+
+from django.db import connection, connections, transaction
+from django.db.models import F, Q, QuerySet
+from django.utils.timezone import utc
+
+import config
+from peer_review_data import models
+
+LOGGER = logging.getLogger(__name__)
+
+# Times a course is claimed before it's failed, e.g., because it makes
+# every node that works on it run out of memory
+MAX_ATTEMPTS: int = 3
+
+
+def workerId() -> str:
+    """
+    :return: ID of this process, unique among the nodes of a run
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def queuedRun() -> models.SyncRun | None:
+    """
+    :return: Last unfinished run with queued courses, if any
+    """
+    run: models.SyncRun | None = models.SyncRun.objects \
+        .filter(finished_at__isnull=True, workitem__isnull=False) \
+        .distinct().order_by('-id').first()
+    return run
+
+
+class WorkQueue(object):
+    """
+    Courses of a run, queued in the DB, so that several nodes can share
+    the work of the run.  Each course is worked on by one node at a time.
+
+    Items are claimed with `SELECT … FOR UPDATE SKIP LOCKED` where the DB
+    supports it, so nodes don't wait for each other, and with an `UPDATE`
+    that only succeeds if no other node claimed the item first, so claims
+    are safe with any DB.
+
+    While the queue is open, a thread extends the leases of the items this
+    node holds every third of `config.WORK_LEASE_SECONDS`.  Items whose
+    lease expired are claimed again, up to `MAX_ATTEMPTS` times.  Courses
+    claimed again skip the assignments finished before, like a resumed run
+    (see `Checkpoints`).
+
+    Use as a context manager to open and close the queue.
+    """
+
+    def __init__(self, run: models.SyncRun,
+                 leaseSeconds: int = config.WORK_LEASE_SECONDS):
+        self.run: models.SyncRun = run
+        self.lease: timedelta = timedelta(seconds=leaseSeconds)
+        self.workerId: str = workerId()
+        self.__stopped = threading.Event()
+        self.__heartbeat: threading.Thread | None = None
+
+    def __enter__(self) -> Self:
+        self.open()
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self.__stopped.clear()
+        self.__heartbeat = threading.Thread(
+            target=self.__beat, name='heartbeat', daemon=True)
+        self.__heartbeat.start()
+
+    def close(self) -> None:
+        self.__stopped.set()
+        if self.__heartbeat is not None:
+            self.__heartbeat.join()
+            self.__heartbeat = None
+
+    def __items(self) -> QuerySet:
+        return models.WorkItem.objects.filter(run=self.run)
+
+    def __beat(self) -> None:
+        try:
+            while not self.__stopped.wait(self.lease.total_seconds() / 3):
+                try:
+                    self.__items().filter(
+                        status=models.WorkItem.LEASED, worker=self.workerId) \
+                        .update(lease_expires_at=datetime.now(tz=utc) +
+                                self.lease)
+                except Exception as e:
+                    LOGGER.warning(f'Error extending leases of {self.run}: '
+                                   f'{e}')
+        finally:
+            connections.close_all()
+
+    def enqueue(self, courseIds: Iterable[int]) -> int:
+        """
+        Queue the courses that aren't queued yet, and queue the failed
+        courses again.
+
+        :return: Number of courses queued
+        """
+        queuedIds: Set[int] = set(
+            self.__items().values_list('course_id', flat=True))
+        newItems: list = [
+            models.WorkItem(run=self.run, course_id=courseId)
+            for courseId in dict.fromkeys(courseIds)
+            if courseId not in queuedIds]
+        models.WorkItem.objects.bulk_create(newItems, ignore_conflicts=True)
+
+        retriedCount: int = self.__items() \
+            .filter(status=models.WorkItem.FAILED) \
+            .update(status=models.WorkItem.PENDING, worker=None,
+                    lease_expires_at=None, attempts=0)
+        LOGGER.info(f'Queued {len(newItems)} course(s) of {self.run}' +
+                    (f', and {retriedCount} failed course(s) again'
+                     if retriedCount > 0 else ''))
+        return len(newItems) + retriedCount
+
+    def claim(self) -> models.WorkItem | None:
+        """
+        Lease the first item that's pending, or whose lease expired.
+
+        :return: The item, or `None` if there's none left to claim
+        """
+        while True:
+            now: datetime = datetime.now(tz=utc)
+            self.__failExhausted(now)
+            with transaction.atomic():
+                item: models.WorkItem | None = self.__items() \
+                    .select_for_update(
+                        skip_locked=connection.features
+                        .has_select_for_update_skip_locked) \
+                    .filter(Q(status=models.WorkItem.PENDING) |
+                            Q(status=models.WorkItem.LEASED,
+                              lease_expires_at__lt=now)) \
+                    .order_by('id').first()
+                if item is None:
+                    return None
+
+                leaseExpiresAt: datetime = now + self.lease
+                # Only one node claims the item, even if the DB didn't lock
+                # it, as each claim counts an attempt.
+                claimedCount: int = models.WorkItem.objects \
+                    .filter(id=item.id, attempts=item.attempts) \
+                    .update(status=models.WorkItem.LEASED,
+                            worker=self.workerId,
+                            lease_expires_at=leaseExpiresAt,
+                            attempts=F('attempts') + 1)
+
+            if claimedCount == 1:
+                if item.status == models.WorkItem.LEASED:
+                    LOGGER.warning(f'Claiming course ({item.course_id}) '
+                                   f'again, as the lease of {item.worker} '
+                                   'expired')
+                item.status = models.WorkItem.LEASED
+                item.worker = self.workerId
+                item.lease_expires_at = leaseExpiresAt
+                item.attempts += 1
+                return item
+
+    def __failExhausted(self, now: datetime) -> None:
+        failedCount: int = self.__items() \
+            .filter(status=models.WorkItem.LEASED, lease_expires_at__lt=now,
+                    attempts__gte=MAX_ATTEMPTS) \
+            .update(status=models.WorkItem.FAILED, lease_expires_at=None)
+        if failedCount > 0:
+            LOGGER.warning(f'Failed {failedCount} course(s) whose lease '
+                           f'expired {MAX_ATTEMPTS} time(s)')
+
+    def complete(self, item: models.WorkItem, succeeded: bool) -> None:
+        """
+        Release an item, as done or failed.  If another node claimed the
+        item after its lease expired, it's left to that node.
+        """
+        releasedCount: int = models.WorkItem.objects \
+            .filter(id=item.id, worker=self.workerId,
+                    status=models.WorkItem.LEASED) \
+            .update(status=models.WorkItem.DONE if succeeded
+                    else models.WorkItem.FAILED, lease_expires_at=None)
+        if releasedCount == 0:
+            LOGGER.warning(f'Course ({item.course_id}) was claimed by '
+                           'another node, after its lease expired')
+
+    def isFinished(self) -> bool:
+        """
+        :return: Whether all of the courses of the run are done
+        """
+        return not self.__items().exclude(
+            status=models.WorkItem.DONE).exists()
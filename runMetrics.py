@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+from canvasRateLimit import RateLimitScheduler
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Phase of work done outside of any phase started explicitly
+PHASE_OTHER: str = 'other'
+
+PROMETHEUS_PREFIX: str = 'peer_review_data_'
+
+
+@dataclass
+class PhaseStats:
+    """
+    Time and counts of one phase.  `seconds` doesn't include the time of
+    phases nested in it.
+    """
+    seconds: float = 0.0
+    count: int = 0
+    api_calls: int = 0
+    bytes: int = 0
+    retries: int = 0
+    rows_written: int = 0
+    rows_skipped: int = 0
+    rows_deleted: int = 0
+    errors: int = 0
+
+    def add(self, **counts) -> None:
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+@dataclass
+class RowStats:
+    """
+    Rows of one table written, found unchanged and not written (see
+    `models.Fingerprinted`), or deleted as they're no longer in Canvas.
+    """
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+    def add(self, **counts) -> None:
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+# Name and help text of the Prometheus metric of each statistic
+PROMETHEUS_METRICS: Dict[str, Tuple[str, str]] = {
+    'seconds': ('phase_seconds',
+                'Seconds spent in the phase, not counting nested phases'),
+    'count': ('phase_count', 'Times the phase ran'),
+    'api_calls': ('api_requests', 'Canvas API requests made'),
+    'bytes': ('api_bytes', 'Bytes of Canvas API responses received'),
+    'retries': ('api_retries', 'Canvas API requests retried'),
+    'rows_written': ('rows_written', 'DB rows written'),
+    'rows_skipped': ('rows_skipped', 'DB rows not written, as unchanged or '
+                                     'referring to rows not saved'),
+    'rows_deleted': ('rows_deleted', 'DB rows deleted'),
+    'errors': ('errors', 'Errors, including rows that could not be saved '
+                         'and failed API requests'),
+}
+
+# Course ID, assignment ID and name of a phase
+PhaseKey = Tuple[int | None, int | None, str]
+
+
+@dataclass
+class _Frame:
+    key: PhaseKey
+    start: float
+    child_seconds: float = 0.0
+
+
+class Metrics(object):
+    """
+    Timers and counters of a run, by course, assignment and phase.
+
+    Phases are started with `phase()` in the thread doing the work.  Counts
+    are added to the innermost phase running in the calling thread, so code
+    that counts, like `MetricsAdapter`, doesn't need to know which course
+    or assignment it's working for.  Nested phases inherit the course and
+    assignment of the enclosing phase, unless they are given.
+
+    Phases run in different threads overlap, so the total time of all
+    phases may be more than the time of the run.
+
+    The phases running are kept in a context variable, so phases also
+    work in `asyncio` tasks, each of which has its own context.
+    """
+
+    def __init__(self):
+        self.__stats: Dict[PhaseKey, PhaseStats] = {}
+        self.__rows: Dict[str, RowStats] = {}
+        self.__lock = threading.Lock()
+        self.__frames: ContextVar[Tuple[_Frame, ...]] = ContextVar(
+            f'{self.__class__.__name__}Frames', default=())
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__stats = {}
+            self.__rows = {}
+
+    def __add(self, key: PhaseKey, **counts) -> None:
+        with self.__lock:
+            self.__stats.setdefault(key, PhaseStats()).add(**counts)
+
+    @contextmanager
+    def phase(self, name: str, courseId: int | None = None,
+              assignmentId: int | None = None) -> Iterator[None]:
+        frames: Tuple[_Frame, ...] = self.__frames.get()
+        if len(frames) > 0:
+            parentCourseId, parentAssignmentId, _ = frames[-1].key
+            if courseId is None:
+                courseId = parentCourseId
+            if assignmentId is None and courseId == parentCourseId:
+                assignmentId = parentAssignmentId
+
+        frame = _Frame((courseId, assignmentId, name), time.perf_counter())
+        token = self.__frames.set(frames + (frame,))
+        try:
+            yield
+        finally:
+            self.__frames.reset(token)
+            elapsed: float = time.perf_counter() - frame.start
+            if len(frames) > 0:
+                frames[-1].child_seconds += elapsed
+            self.__add(frame.key, seconds=elapsed - frame.child_seconds,
+                       count=1)
+
+    def timed(self, items: Iterable[T], name: str,
+              courseId: int | None = None,
+              assignmentId: int | None = None) -> Iterator[T]:
+        """
+        Iterate over `items`, timing the production of each item as a
+        phase, e.g., to time lazily fetched pages of a Canvas list.
+        """
+        iterator: Iterator[T] = iter(items)
+        while True:
+            with self.phase(name, courseId, assignmentId):
+                try:
+                    item: T = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, **counts: int) -> None:
+        """
+        Add counts (see `PhaseStats`) to the current phase of the calling
+        thread or task.
+        """
+        frames: Tuple[_Frame, ...] = self.__frames.get()
+        self.__add(frames[-1].key if len(frames) > 0
+                   else (None, None, PHASE_OTHER), **counts)
+
+    def countRows(self, table: str, **counts: int) -> None:
+        """
+        Add counts (see `RowStats`) to the rows of a table.
+        """
+        with self.__lock:
+            self.__rows.setdefault(table, RowStats()).add(**counts)
+
+    def rowsByTable(self) -> Dict[str, RowStats]:
+        with self.__lock:
+            return {k: RowStats(**asdict(v))
+                    for k, v in sorted(self.__rows.items())}
+
+    def stats(self) -> Dict[PhaseKey, PhaseStats]:
+        with self.__lock:
+            return {k: PhaseStats(**asdict(v))
+                    for k, v in self.__stats.items()}
+
+    def byPhase(self) -> Dict[str, PhaseStats]:
+        totals: Dict[str, PhaseStats] = {}
+        for (_, _, name), stats in self.stats().items():
+            totals.setdefault(name, PhaseStats()).add(**asdict(stats))
+        return totals
+
+    def report(self) -> List[dict]:
+        """
+        :return: Statistics of each course, assignment and phase, for a
+            JSON run report
+        """
+        return [{'course': courseId, 'assignment': assignmentId,
+                 'phase': name,
+                 **asdict(stats), 'seconds': round(stats.seconds, 6)}
+                for (courseId, assignmentId, name), stats in sorted(
+                    self.stats().items(),
+                    key=lambda i: (i[0][0] or 0, i[0][1] or 0, i[0][2]))]
+
+    def prometheusLines(self) -> List[str]:
+        """
+        Statistics by course and phase, in the Prometheus text format.
+        Assignments aren't used as labels, as there are too many of them;
+        they are in the JSON run report.
+        """
+        byCourse: Dict[Tuple[str, str], PhaseStats] = {}
+        for (courseId, _, name), stats in self.stats().items():
+            byCourse.setdefault(
+                ('' if courseId is None else str(courseId), name),
+                PhaseStats()).add(**asdict(stats))
+
+        lines: List[str] = []
+        for field in fields(PhaseStats):
+            metricName, helpText = PROMETHEUS_METRICS[field.name]
+            lines.extend(prometheusGauge(
+                metricName, helpText,
+                [({'course': courseId, 'phase': name},
+                  getattr(stats, field.name))
+                 for (courseId, name), stats in sorted(byCourse.items())]))
+        return lines
+
+
+def prometheusGauge(name: str, helpText: str,
+                    samples: List[Tuple[Dict[str, str], float]]) \
+        -> List[str]:
+    """
+    Format the samples of a gauge in the Prometheus text format, as read
+    by the node exporter's textfile collector.
+    """
+    def escape(value: str) -> str:
+        return value.replace('\\', r'\\').replace('"', r'\"') \
+            .replace('\n', r'\n')
+
+    fullName: str = PROMETHEUS_PREFIX + name
+    lines: List[str] = [f'# HELP {fullName} {helpText}',
+                        f'# TYPE {fullName} gauge']
+    for labels, value in samples:
+        labelText: str = ','.join(f'{k}="{escape(str(v))}"'
+                                  for k, v in labels.items())
+        lines.append(f'{fullName}{{{labelText}}} {value}'
+                     if labelText else f'{fullName} {value}')
+    return lines
+
+
+class MetricsAdapter(BaseAdapter):
+    """
+    Transport adapter that counts the requests sent by the wrapped adapter,
+    the bytes received, retries and failed requests, in the current phase
+    of `metrics`.
+    """
+
+    def __init__(self, adapter: BaseAdapter, metrics: Metrics,
+                 scheduler: RateLimitScheduler | None = None):
+        """
+        :param adapter: Adapter that sends the requests
+        :param metrics: Where the requests are counted
+        :param scheduler: Scheduler of `adapter`, if any, whose retries
+            are counted
+        """
+        super().__init__()
+        self.adapter: BaseAdapter = adapter
+        self.metrics: Metrics = metrics
+        self.scheduler: RateLimitScheduler | None = scheduler
+
+    def __retries(self) -> int:
+        return 0 if self.scheduler is None else self.scheduler.threadRetries
+
+    def send(self, request: PreparedRequest, stream: bool = False,
+             *args: Any, **kwargs: Any) -> Response:
+        retriesStart: int = self.__retries()
+        try:
+            response: Response = self.adapter.send(request, stream, *args,
+                                                   **kwargs)
+        except Exception:
+            self.metrics.count(api_calls=1, errors=1,
+                               retries=self.__retries() - retriesStart)
+            raise
+
+        # The bodies of streamed responses are read, and counted, by the
+        # caller.
+        self.metrics.count(api_calls=1,
+                           bytes=0 if stream else len(response.content),
+                           retries=self.__retries() - retriesStart,
+                           errors=int(response.status_code >= 400))
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+metrics = Metrics()
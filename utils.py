@@ -1,6 +1,25 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
-from typing import List
+import os
+import tempfile
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar('T')
+
+
+def objectAttributes(d: dict | object) -> dict:
+    """
+    Return a `dict` itself, or the attributes of an `object`, including
+    those held in slots.
+    """
+    if isinstance(d, dict):
+        return d
+    if hasattr(d, '__dict__'):
+        return vars(d)
+    return {k: getattr(d, k) for k in getattr(d, '__slots__', ())
+            if hasattr(d, k)}
 
 
 def dictSkipKeys(d: dict | object, keysToSkip: List[str]) -> dict:
@@ -12,8 +31,8 @@ def dictSkipKeys(d: dict | object, keysToSkip: List[str]) -> dict:
     :param keysToKeep: A `List` of `str` key names to be skipped.
     :return: A `dict` without the specified keys.
     """
-    d = getattr(d, '__dict__', d)
-    return {k: v for k, v in d.items() if k not in keysToSkip}
+    return {k: v for k, v in objectAttributes(d).items()
+            if k not in keysToSkip}
 
 
 def dictKeepKeys(d: dict | object, keysToKeep: List[str]) -> dict:
@@ -25,9 +44,51 @@ def dictKeepKeys(d: dict | object, keysToKeep: List[str]) -> dict:
     :param keysToKeep: A `List` of `str` key names to be kept.
     :return: A `dict` with only the specified keys.
     """
-    d = getattr(d, '__dict__', d)
-    return {k: v for k, v in d.items() if k in keysToKeep}
+    return {k: v for k, v in objectAttributes(d).items() if k in keysToKeep}
 
 
 def canvasJson(o: object) -> str:
     return json.dumps(dictSkipKeys(o, ['_requester']), indent=2, default=str)
+
+
+def fingerprint(values: Iterable) -> str:
+    """
+    Return a short hash of the values given, in order.
+    """
+    return hashlib.blake2b(
+        json.dumps(list(values), default=str).encode('utf-8'),
+        digest_size=16).hexdigest()
+
+
+def chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    Split `items` into lists of at most `size` items.
+
+    :param items: An `Iterable` of items, consumed lazily.
+    :param size: Maximum number of items in each list.
+    :return: An `Iterator` of `List`s of items.
+    """
+    iterator: Iterator[T] = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def writeFileAtomically(path: str, text: str) -> None:
+    """
+    Write `text` to a temporary file in the same directory, then rename it
+    to `path`, so that readers never see a partially written file.
+
+    :param path: Path of the file to be written.
+    :param text: Content of the file.
+    """
+    directory: str = os.path.dirname(os.path.abspath(path))
+    fd, tempPath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # `mkstemp()` makes files only the owner can read.
+        os.chmod(tempPath, 0o644)
+        os.replace(tempPath, path)
+    except BaseException:
+        os.unlink(tempPath)
+        raise